@@ -0,0 +1,206 @@
+# api.py
+# -----------------------------------------
+# Report Rocket – JSON APIs used by report.html
+#
+# Single and batch generation (optionally streamed as NDJSON) and the
+# legacy CSV upload export. Class profiles live in profiles.py.
+# -----------------------------------------
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, url_for, send_from_directory
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+
+from generation import (
+    build_prompt, complete_stream, generate_one, generate_many, resolve_model, target_words,
+    cache_key, cached_report, remember, MAX_BATCH_ROWS, MODEL
+)
+from helpers import wants_stream, wants_fresh, ndjson_response, reserve_reports, refund_reports, int_or_none
+import exports
+import length_control
+import llm_client
+import ratelimit
+
+bp = Blueprint("api", __name__)
+
+
+@bp.route("/generate_report", methods=["POST"])
+@login_required
+def generate_report_api():
+    client = llm_client.get_client()
+    if not client:
+        return jsonify(error="Server missing OPENAI_API_KEY"), 500
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    if not isinstance(data.get("name") or "", str):
+        return jsonify(error="name must be text"), 400
+    try:
+        model = resolve_model(current_user.plan, data.get("tier"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    # Free plan limit: reserve up front, refund if nothing is charged
+    over = reserve_reports(1)
+    if over:
+        return over
+
+    fresh = wants_fresh(data)
+
+    if wants_stream():
+        return ndjson_response(_stream_single(client, data, fresh, current_user.id, current_user.plan, model))
+
+    try:
+        with ratelimit.tenant(current_user.id, current_user.plan):
+            text, cached = generate_one(client, data, fresh=fresh, model=model,
+                                        user_id=current_user.id)
+    except ratelimit.RateLimited as e:
+        refund_reports(1)
+        return jsonify(error=str(e)), 429, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        refund_reports(1)
+        status = 503 if llm_client.is_unavailable(e) else 500
+        return jsonify(error=llm_client.error_message(e)), status
+    # Cache hits are free
+    if cached:
+        refund_reports(1)
+    return jsonify(report=text, cached=cached)
+
+
+def _stream_single(client, data, fresh, user_id, plan=None, model=None):
+    """Forward model tokens as {"delta"} events, then one {"done"} event.
+
+    The "done" report is held to max_words, so it can be shorter than the
+    deltas; clients should show it in place of what they accumulated.
+    """
+    key = cache_key(data, model=model, user_id=user_id)
+    if not fresh:
+        _, hit = cached_report(data, model=model, user_id=user_id)
+        if hit is not None:
+            refund_reports(1, user_id)
+            yield {"delta": hit}
+            yield {"done": True, "report": hit, "cached": True}
+            return
+
+    words = target_words(data)
+    parts = []
+    try:
+        with ratelimit.tenant(user_id, plan):
+            for delta in complete_stream(client, build_prompt(data), words, model):
+                parts.append(delta)
+                yield {"delta": delta}
+        text = length_control.finish(model or MODEL, "".join(parts), words)
+    except Exception as e:
+        refund_reports(1, user_id)
+        yield {"error": llm_client.error_message(e)}
+        return
+    remember(key, data, text, model)
+    yield {"done": True, "report": text, "cached": False}
+
+
+@bp.route("/generate_reports_batch", methods=["POST"])
+@login_required
+def generate_reports_batch_api():
+    """Generate a whole class in one request.
+
+    Body: {"class", "subject", "max_words", "rows": [...], "pack"?, "tier"?}.
+    Completions are fanned out with bounded concurrency; "pack": K puts up
+    to K students in one structured completion. The response lists one
+    entry per row, in input order, carrying either "report" or "error".
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    rows = data.get("rows") or []
+    if not isinstance(rows, list) or not rows:
+        return jsonify(error="No rows to generate"), 400
+    if len(rows) > MAX_BATCH_ROWS:
+        return jsonify(error=f"Too many rows (max {MAX_BATCH_ROWS} per batch)"), 400
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            return jsonify(error=f"Row {i} is not an object"), 400
+        if not isinstance(row.get("name") or "", str):
+            return jsonify(error=f"Row {i}: name must be text"), 400
+
+    client = llm_client.get_client()
+    if not client:
+        return jsonify(error="Server missing OPENAI_API_KEY"), 500
+    try:
+        model = resolve_model(current_user.plan, data.get("tier"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    # Quota is reserved once for the whole batch, not per row
+    over = reserve_reports(len(rows))
+    if over:
+        return over
+
+    header = {k: data.get(k) for k in ("class", "subject", "max_words")}
+    fresh = wants_fresh(data)
+    pack = int_or_none(data.get("pack"))
+
+    if wants_stream():
+        return ndjson_response(_stream_batch(client, rows, header, fresh, current_user.id, pack,
+                                             current_user.plan, model))
+
+    results = [None] * len(rows)
+    charged = 0
+    try:
+        with ratelimit.tenant(current_user.id, current_user.plan):
+            for i, text, err, cached in generate_many(client, rows, header, fresh=fresh, pack=pack,
+                                                      model=model, user_id=current_user.id):
+                if err:
+                    results[i] = {"index": i, "error": err}
+                else:
+                    results[i] = {"index": i, "report": text, "cached": cached}
+                    charged += not cached
+    finally:
+        # Only real completions count against the quota; cache hits are free
+        refund_reports(len(rows) - charged)
+
+    generated = sum(1 for r in results if "report" in r)
+    return jsonify(results=results, generated=generated, failed=len(rows) - generated)
+
+
+def _stream_batch(client, rows, header, fresh, user_id, pack=None, plan=None, model=None):
+    """Emit one event per row as soon as it finishes, then a summary event."""
+    generated = charged = 0
+    try:
+        with ratelimit.tenant(user_id, plan):
+            for i, text, err, cached in generate_many(client, rows, header, fresh=fresh, pack=pack,
+                                                      model=model, user_id=user_id):
+                if err:
+                    yield {"index": i, "error": err}
+                else:
+                    generated += 1
+                    charged += not cached
+                    yield {"index": i, "report": text, "cached": cached}
+    finally:
+        # Refund rows never produced, even if the client disconnected mid-stream
+        refund_reports(len(rows) - charged, user_id)
+    yield {"done": True, "generated": generated, "failed": len(rows) - generated}
+
+
+@bp.route("/save_report", methods=["POST"])
+@login_required
+def save_report():
+    """Legacy upload export; prefer /class_profile/<id>/export.<fmt>."""
+    data = request.get_json(silent=True) or {}
+    class_name = (data.get("class") or "Class").strip()
+    subject    = (data.get("subject") or "Subject").strip()
+    rows       = [r for r in (data.get("rows") or []) if isinstance(r, dict)]
+
+    # Stored once per user and content; the friendly name is only for download
+    stored = exports.store_copy(current_user.id, "csv", exports.csv_chunks(rows))
+    nice = secure_filename(f"{class_name}_{subject}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    return jsonify(url=url_for("api.download_export", filename=stored, name=nice))
+
+
+@bp.route("/download/<path:filename>")
+@login_required
+def download_export(filename):
+    # Only the caller's own directory; send_from_directory rejects traversal
+    name = secure_filename(request.args.get("name") or "") or filename
+    return send_from_directory(exports.user_dir(current_user.id), filename,
+                               as_attachment=True, download_name=name)
@@ -0,0 +1,143 @@
+# assets.py
+# -----------------------------------------
+# Report Rocket – fingerprinted, precompressed static assets
+#
+#   flask build-assets    (render.yaml buildCommand)
+#
+# The build copies every file in ASSETS to static/dist/ under a content-
+# hashed name (site.css -> site.3f9c0a1b2c4d.css), writes .gz and .br
+# variants beside it (.br needs the optional Brotli package) and records
+# the mapping in static/dist/manifest.json.
+#
+# Templates call asset_url('site.css') instead of url_for('static', ...).
+# When the manifest lists the file, that is /assets/<hashed name>, served
+# with the smallest encoding the browser accepts and Cache-Control
+# immutable for ASSET_MAX_AGE: each build of a file is downloaded once.
+# Without a build (local dev) it is the plain /static URL, as before.
+# -----------------------------------------
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import Blueprint, abort, redirect, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+MAX_AGE = int(os.getenv("ASSET_MAX_AGE", str(365 * 24 * 3600)))
+
+# Files under static/ that templates load through asset_url()
+ASSETS = ("site.css", "js/report.js")
+HASH_CHARS = 12
+# (Accept-Encoding token, file suffix), preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_HASHED = re.compile(r"^(?P<stem>.+)\.[0-9a-f]{%d}(?P<ext>\.[^./]+)$" % HASH_CHARS)
+
+bp = Blueprint("assets", __name__)
+
+_manifest = {}   # source name -> hashed name
+_encodings = {}  # hashed name -> [(token, suffix), ...] built for it
+
+
+# =========================================
+# Build
+# =========================================
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build(static_dir=STATIC_DIR):
+    """Rewrite static/dist from ASSETS; returns the new manifest."""
+    dist = os.path.join(static_dir, "dist")
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for name in ASSETS:
+        with open(os.path.join(static_dir, name), "rb") as f:
+            data = f.read()
+        stem, ext = posixpath.splitext(name)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_CHARS]}{ext}"
+        target = os.path.join(dist, hashed)
+        _write(target, data)
+        # mtime=0 keeps the .gz byte-identical across builds of the same file
+        _write(target + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(target + ".br", brotli.compress(data, quality=11))
+        manifest[name] = hashed
+    _write(os.path.join(dist, "manifest.json"), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+# =========================================
+# Lookup
+# =========================================
+def load(dist_dir=DIST_DIR):
+    """Read the manifest; a missing or broken one means plain /static URLs."""
+    global _manifest, _encodings
+    try:
+        with open(os.path.join(dist_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest = {name: hashed for name, hashed in manifest.items()
+                if os.path.isfile(os.path.join(dist_dir, hashed))}
+    _encodings = {hashed: [(token, suffix) for token, suffix in ENCODINGS
+                           if os.path.isfile(os.path.join(dist_dir, hashed + suffix))]
+                  for hashed in manifest.values()}
+    _manifest = manifest
+    return manifest
+
+
+def asset_url(filename, **values):
+    """url_for('static', filename=...) that points at the fingerprinted copy when built."""
+    hashed = _manifest.get(filename)
+    if hashed is None:
+        return url_for("static", filename=filename, **values)
+    return url_for("assets.asset", filename=hashed, **values)
+
+
+# =========================================
+# Serving
+# =========================================
+@bp.route("/assets/<path:filename>")
+def asset(filename):
+    encodings = _encodings.get(filename)
+    if encodings is None:
+        # A page from the previous deploy asking for the old hash: send it
+        # to the current build, uncached, rather than 404 the stylesheet
+        m = _HASHED.match(filename)
+        source = m and m.group("stem") + m.group("ext")
+        if source in _manifest:
+            return redirect(asset_url(source))
+        abort(404)
+
+    path = os.path.join(DIST_DIR, filename)
+    encoding = None
+    for token, suffix in encodings:
+        if request.accept_encodings[token]:
+            encoding, path = token, path + suffix
+            break
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], max_age=MAX_AGE)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    load()
+    app.add_template_global(asset_url)
+    app.register_blueprint(bp)
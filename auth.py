@@ -0,0 +1,92 @@
+# auth.py
+# -----------------------------------------
+# Report Rocket – registration, login and logout
+# -----------------------------------------
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_user, login_required, logout_user
+
+from models import db, User
+from forms import RegistrationForm, LoginForm
+import mailer
+import passwords
+
+bp = Blueprint("auth", __name__)
+
+
+@bp.route("/register", methods=["GET", "POST"])
+def register():
+    form = RegistrationForm()
+
+    # capture ?plan=free|teacher|school from the URL
+    plan = request.args.get("plan", "free")
+
+    if form.validate_on_submit():
+        # block duplicate email
+        if User.query.filter_by(email=form.email.data).first():
+            flash("Email already registered.", "danger")
+            return redirect(url_for("auth.register", plan=plan))
+
+        user = User(email=form.email.data)
+        try:
+            user.set_password(form.password.data)
+        except passwords.Overloaded as e:
+            return _auth_busy(e, "register.html", form=form, plan=plan)
+
+        # Only set plan/limits if those fields exist on your model
+        if hasattr(user, "plan"):
+            user.plan = plan if plan in {"free", "teacher", "school"} else "free"
+        if hasattr(user, "reports_limit"):
+            user.reports_limit = 10 if plan == "free" else None
+        if hasattr(user, "reports_used"):
+            user.reports_used = 0
+
+        db.session.add(user)
+        # Welcome email commits with the user; worker.py delivers it
+        mailer.enqueue(
+            to_email=form.email.data,
+            subject="Welcome to Report Rocket 🚀",
+            html="<p>Your account is ready. Happy reporting!</p>"
+        )
+        db.session.commit()
+
+        flash("Account created — please log in!", "success")
+        return redirect(url_for("auth.login", plan=plan))
+
+    return render_template("register.html", form=form, plan=plan)
+
+
+@bp.route("/login", methods=["GET", "POST"])
+def login():
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        try:
+            ok = user is not None and user.check_password(form.password.data)
+        except passwords.Overloaded as e:
+            return _auth_busy(e, "login.html", form=form)
+        if ok:
+            try:
+                if user.upgrade_password(form.password.data):
+                    db.session.commit()
+            except passwords.Overloaded:
+                pass   # keep the old hash; upgraded on a quieter login
+            login_user(user)
+            flash("Logged in successfully.", "success")
+            next_page = request.args.get("next")
+            return redirect(next_page or url_for("pages.report"))
+        flash("Invalid email or password.", "danger")
+    return render_template("login.html", form=form)
+
+
+def _auth_busy(exc, template, **context):
+    """Shed a login/register while the hashing pool is saturated."""
+    flash(str(exc), "warning")
+    return render_template(template, **context), 503, {"Retry-After": str(exc.retry_after)}
+
+
+@bp.route("/logout")
+@login_required
+def logout():
+    logout_user()
+    flash("You have been logged out.", "info")
+    return redirect(url_for("auth.login"))
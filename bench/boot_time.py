@@ -0,0 +1,113 @@
+# bench/boot_time.py
+# -----------------------------------------
+# How long a worker takes to come up, and what the `flask` CLI costs
+#
+#   python bench/boot_time.py                 # 5 runs of each, medians
+#   python bench/boot_time.py --runs 10 --skip-gunicorn
+#
+# Every measurement is a fresh interpreter against a throwaway SQLite DB:
+#
+#   app_import    import app and build it (create_app(), or the module-level
+#                 `app` on older trees), inside the process
+#   first_request the first GET / on that app (test client)
+#   process       the whole `python -c` run, interpreter start included
+#   flask_cli     `flask db current` end to end (what postDeploy pays)
+#   gunicorn      render.yaml's startCommand until GET / answers 200
+#
+# The OpenAI key points at a dead local port: nothing here may call out.
+# -----------------------------------------
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from loadtest import free_port, render_start_command  # noqa: E402
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app as module
+application = module.create_app() if hasattr(module, "create_app") else module.app
+t1 = time.perf_counter()
+status = application.test_client().get("/").status_code
+t2 = time.perf_counter()
+print(json.dumps({"app_import": t1 - t0, "first_request": t2 - t1, "status": status}))
+"""
+
+
+def timed(cmd, env):
+    t0 = time.perf_counter()
+    out = subprocess.run(cmd, cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+    return time.perf_counter() - t0, out
+
+
+def wait_ok(url, proc, timeout=60):
+    """Poll tightly (loadtest.wait_ready sleeps 250ms) until `url` answers 200."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.02)
+    raise SystemExit("gunicorn did not become ready")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Worker boot and flask CLI timings")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--skip-gunicorn", action="store_true")
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="boot-time-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{work}/boot.db", FLASK_APP="app.py",
+               OPENAI_API_KEY="boot-time", OPENAI_BASE_URL="http://127.0.0.1:9/v1",
+               SECRET_KEY="boot-time", EXPORT_DIR=os.path.join(work, "exports"),
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(work, "metrics"))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    # Warm the bytecode cache so run 1 isn't an outlier
+    timed([sys.executable, "-c", PROBE], env)
+
+    samples = {"app_import": [], "first_request": [], "process": [], "flask_cli": [], "gunicorn": []}
+    for _ in range(args.runs):
+        wall, out = timed([sys.executable, "-c", PROBE], env)
+        probe = json.loads(out.strip().splitlines()[-1])
+        samples["app_import"].append(probe["app_import"])
+        samples["first_request"].append(probe["first_request"])
+        samples["process"].append(wall)
+        samples["flask_cli"].append(timed([sys.executable, "-m", "flask", "db", "current"], env)[0])
+
+        if args.skip_gunicorn:
+            continue
+        port = free_port()
+        t0 = time.perf_counter()
+        server = subprocess.Popen(render_start_command(port), cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ok(f"http://127.0.0.1:{port}/", server)
+            samples["gunicorn"].append(time.perf_counter() - t0)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print(f"{args.runs} run(s), median (min-max) in ms")
+    for name, values in samples.items():
+        if values:
+            print(f"  {name:<14} {1000 * statistics.median(values):7.0f}"
+                  f"  ({1000 * min(values):.0f}-{1000 * max(values):.0f})")
+
+
+if __name__ == "__main__":
+    main()
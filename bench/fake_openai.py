@@ -0,0 +1,419 @@
+# bench/fake_openai.py
+# -----------------------------------------
+# Local stand-in for the OpenAI API (stdlib only)
+#
+#   python bench/fake_openai.py --port 8765
+#   OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python app.py
+#
+# Besides chat completions it emulates the Files and Batch endpoints used
+# by bulk.py: uploads are kept in memory and a batch "runs" every line
+# through the same fake completion once --batch-delay seconds have passed.
+#
+# --latency-jitter spreads completion latency (±fraction of --latency) and
+# --error-rate makes that fraction of completions fail with a 500 or a
+# 429 carrying retry-after-ms (--error-statuses narrows the choice, e.g.
+# 500 only to trip the circuit breaker); --seed makes both reproducible.
+#
+# --overshoot writes that multiple of the requested words (models ignore
+# "up to N words" more often than not); a request's max_tokens still cuts
+# the reply off at ~4 characters per token with finish_reason "length".
+# -----------------------------------------
+import argparse
+import email.parser
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+WORDS = ("shows steady progress and engages well with the class material "
+         "while continuing to build confidence and consistency").split()
+
+
+def fake_report(prompt, max_words=None, overshoot=1.0):
+    """Deterministic report text sized from the "Write up to N words" hint."""
+    if max_words is None:
+        m = re.search(r"up to (\d+) words", prompt or "")
+        max_words = int(m.group(1)) if m else 50
+    m = re.search(r"for student ([^.\n]*)", prompt or "")
+    name = (m.group(1).strip() if m else "") or "The student"
+    count = max(round(int(max_words) * overshoot) - 1, 0)
+    words = [name] + [WORDS[i % len(WORDS)] for i in range(count)]
+    return " ".join(words).rstrip(".") + "."
+
+
+def fake_packed(prompt, drop_every=0, overshoot=1.0):
+    """JSON reply for a packed prompt: one entry per "[sN] Student: Name" block.
+
+    `drop_every` > 0 leaves out every Nth student so callers exercise their
+    per-student fallback.
+    """
+    m = re.search(r"up to (\d+) words", prompt or "")
+    max_words = int(m.group(1)) if m else 50
+    reports = []
+    for n, (sid, name) in enumerate(re.findall(r"^\[(s\d+)\] Student: (.*)$", prompt or "", re.M), 1):
+        if drop_every and n % drop_every == 0:
+            continue
+        reports.append({"id": sid, "report": fake_report(f"for student {name}", max_words, overshoot)})
+    return json.dumps({"reports": reports})
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOpenAI/1.0"
+
+    # ---- plumbing ----
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _read_json(self):
+        try:
+            return json.loads(self._read_body() or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    # ---- routes ----
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            return self._chat_completions(self._read_json())
+        if path.endswith("/files"):
+            return self._upload_file()
+        if path.endswith("/batches"):
+            return self._create_batch(self._read_json())
+        m = re.search(r"/batches/([^/]+)/cancel$", path)
+        if m:
+            return self._cancel_batch(m.group(1))
+        self._not_found()
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        m = re.search(r"/files/([^/]+)(/content)?$", path)
+        if m:
+            return self._get_file(m.group(1), bool(m.group(2)))
+        m = re.search(r"/batches/([^/]+)$", path)
+        if m:
+            return self._get_batch(m.group(1))
+        if path.endswith("/batches"):
+            return self._list_batches(parse_qs(urlsplit(self.path).query))
+        self._not_found()
+
+    def _list_batches(self, query):
+        """Newest first, `limit` per page, continuing `after` a batch id."""
+        ids = list(reversed(list(self.server.batches)))
+        after = (query.get("after") or [None])[0]
+        if after in ids:
+            ids = ids[ids.index(after) + 1:]
+        limit = int((query.get("limit") or ["20"])[0])
+        data = [self.server.batch_view(b) for b in ids[:limit]]
+        self._send_json(200, {"object": "list", "data": data, "has_more": len(ids) > limit,
+                              "first_id": data[0]["id"] if data else None,
+                              "last_id": data[-1]["id"] if data else None})
+
+    def _chat_completions(self, body):
+        self.server.calls += 1
+        delay, error = self.server.next_outcome()
+        if delay:
+            time.sleep(delay)
+        if error == 429:
+            body = json.dumps({"error": {"message": "Rate limit reached (fake)",
+                                         "type": "requests"}}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("retry-after-ms", "200")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if error:
+            return self._send_json(error, {"error": {"message": "The server had an error (fake)",
+                                                     "type": "server_error"}})
+        if body.get("stream"):
+            return self._stream_chat(body, *self.server.completion_text(body))
+        self._send_json(200, self.server.completion(body))
+
+    # ---- files / batches ----
+    def _upload_file(self):
+        # multipart/form-data with "file" and "purpose" parts
+        head = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("latin-1")
+        msg = email.parser.BytesParser(policy=email.policy.default).parsebytes(head + self._read_body())
+        data, filename, purpose = b"", "upload.jsonl", ""
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                data = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+            elif name == "purpose":
+                purpose = part.get_content().strip()
+        self._send_json(200, self.server.add_file(data, filename, purpose))
+
+    def _get_file(self, file_id, content):
+        f = self.server.files.get(file_id)
+        if f is None:
+            return self._send_json(404, {"error": {"message": f"No such file {file_id}"}})
+        if not content:
+            return self._send_json(200, f["meta"])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(f["data"])))
+        self.end_headers()
+        self.wfile.write(f["data"])
+
+    def _create_batch(self, body):
+        if body.get("input_file_id") not in self.server.files:
+            return self._send_json(400, {"error": {"message": "input_file_id not found"}})
+        self._send_json(200, self.server.add_batch(body))
+
+    def _get_batch(self, batch_id):
+        if batch_id not in self.server.batches:
+            return self._send_json(404, {"error": {"message": f"No such batch {batch_id}"}})
+        self.server.maybe_run_batch(batch_id)
+        self._send_json(200, self.server.batch_view(batch_id))
+
+    def _cancel_batch(self, batch_id):
+        b = self.server.batches.get(batch_id)
+        if b is None:
+            return self._send_json(404, {"error": {"message": f"No such batch {batch_id}"}})
+        if b["status"] in ("validating", "in_progress"):
+            b["status"] = "cancelled"
+            b["cancelled_at"] = int(time.time())
+        self._send_json(200, self.server.batch_view(batch_id))
+
+    def _stream_chat(self, body, text, finish_reason="stop"):
+        """Server-sent events in the shape of OpenAI chat.completion.chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        base = {
+            "id": f"chatcmpl-fake-{self.server.calls}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model") or "gpt-4o-mini",
+        }
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            send(json.dumps(dict(base, choices=[{
+                "index": 0, "delta": {"content": piece}, "finish_reason": None}])))
+        send(json.dumps(dict(base, choices=[{
+            "index": 0, "delta": {}, "finish_reason": finish_reason}])))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send(json.dumps(dict(base, choices=[], usage=self.server.usage(body, text))))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency=0.0, verbose=False, pack_drop_every=0,
+                 batch_delay=0.0, batch_fail_every=0, latency_jitter=0.0, error_rate=0.0,
+                 seed=None, overshoot=1.0, error_statuses=(429, 500)):
+        super().__init__(addr, FakeOpenAIHandler)
+        self.overshoot = overshoot
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.rng = random.Random(seed)
+        self.errors = 0
+        self.verbose = verbose
+        self.pack_drop_every = pack_drop_every
+        self.batch_delay = batch_delay
+        self.batch_fail_every = batch_fail_every
+        self.calls = 0
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is normal under load; stay quiet
+        if not self.verbose:
+            return
+        super().handle_error(request, client_address)
+
+    # ---- chat ----
+    def next_outcome(self):
+        """`(seconds to sleep, error status or None)` for the next completion."""
+        with self.lock:
+            delay = self.latency
+            if self.latency_jitter:
+                delay *= 1 + self.rng.uniform(-self.latency_jitter, self.latency_jitter)
+            error = None
+            if self.error_rate and self.rng.random() < self.error_rate:
+                error = self.rng.choice(self.error_statuses)
+                self.errors += 1
+        return max(delay, 0.0), error
+
+    def completion_text(self, body):
+        """`(text, finish_reason)`, cut off at the request's max_tokens."""
+        messages = body.get("messages") or []
+        prompt = messages[-1].get("content", "") if messages else ""
+        fmt = body.get("response_format") or {}
+        if fmt.get("type") == "json_schema":
+            text = fake_packed(prompt, self.pack_drop_every, self.overshoot)
+        else:
+            text = fake_report(prompt, overshoot=self.overshoot)
+        limit = body.get("max_tokens")
+        if limit and len(text) > limit * 4:
+            return text[:limit * 4], "length"
+        return text, "stop"
+
+    def usage(self, body, text):
+        # Roughly tiktoken's ~4 characters per token, plus message framing
+        prompt_tokens = sum(len(m.get("content") or "") // 4 + 4 for m in body.get("messages") or [])
+        completion_tokens = len(text) // 4 + 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def completion(self, body):
+        text, finish_reason = self.completion_text(body)
+        return {
+            "id": f"chatcmpl-fake-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": finish_reason,
+            }],
+            "usage": self.usage(body, text),
+        }
+
+    # ---- files / batches ----
+    def add_file(self, data, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        meta = {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        self.files[file_id] = {"meta": meta, "data": data}
+        return meta
+
+    def add_batch(self, body):
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        self.batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress", "created_at": int(time.time()),
+            "metadata": body.get("metadata") or {},
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        return self.batch_view(batch_id)
+
+    def batch_view(self, batch_id):
+        return dict(self.batches[batch_id])
+
+    def maybe_run_batch(self, batch_id):
+        """Finish an in-progress batch once batch_delay has elapsed."""
+        with self.lock:
+            b = self.batches[batch_id]
+            if b["status"] != "in_progress" or time.time() - b["created_at"] < self.batch_delay:
+                return
+            out, errors = [], []
+            lines = self.files[b["input_file_id"]]["data"].decode("utf-8").splitlines()
+            for n, line in enumerate((l for l in lines if l.strip()), 1):
+                req = json.loads(line)
+                self.calls += 1
+                if self.batch_fail_every and n % self.batch_fail_every == 0:
+                    errors.append({"id": f"batch_req_{n}", "custom_id": req["custom_id"],
+                                   "response": {"status_code": 500, "request_id": f"req_{n}",
+                                                "body": {"error": {"message": "fake failure"}}},
+                                   "error": None})
+                    continue
+                out.append({"id": f"batch_req_{n}", "custom_id": req["custom_id"],
+                            "response": {"status_code": 200, "request_id": f"req_{n}",
+                                         "body": self.completion(req.get("body") or {})},
+                            "error": None})
+            if out:
+                data = "".join(json.dumps(o) + "\n" for o in out).encode("utf-8")
+                b["output_file_id"] = self.add_file(data, f"{batch_id}_output.jsonl", "batch_output")["id"]
+            if errors:
+                data = "".join(json.dumps(e) + "\n" for e in errors).encode("utf-8")
+                b["error_file_id"] = self.add_file(data, f"{batch_id}_error.jsonl", "batch_output")["id"]
+            b["status"] = "completed"
+            b["completed_at"] = int(time.time())
+            b["request_counts"] = {"total": len(out) + len(errors), "completed": len(out),
+                                   "failed": len(errors)}
+
+
+def make_server(host="127.0.0.1", port=8765, latency=0.0, verbose=False, pack_drop_every=0,
+                batch_delay=0.0, batch_fail_every=0, latency_jitter=0.0, error_rate=0.0, seed=None,
+                overshoot=1.0, error_statuses=(429, 500)):
+    """Build (but don't start) a fake server; port=0 picks a free port."""
+    return FakeOpenAIServer((host, port), latency=latency, verbose=verbose,
+                            pack_drop_every=pack_drop_every, batch_delay=batch_delay,
+                            batch_fail_every=batch_fail_every, latency_jitter=latency_jitter,
+                            error_rate=error_rate, seed=seed, overshoot=overshoot,
+                            error_statuses=error_statuses)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake OpenAI API for local runs")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0,
+                    help="seconds to sleep before each completion")
+    ap.add_argument("--pack-drop-every", type=int, default=0,
+                    help="omit every Nth student from packed (JSON schema) replies")
+    ap.add_argument("--batch-delay", type=float, default=0.0,
+                    help="seconds before a submitted batch completes")
+    ap.add_argument("--batch-fail-every", type=int, default=0,
+                    help="fail every Nth line of a batch (written to the error file)")
+    ap.add_argument("--latency-jitter", type=float, default=0.0,
+                    help="vary latency by up to this fraction either way (0.5 = ±50%%)")
+    ap.add_argument("--error-rate", type=float, default=0.0,
+                    help="fraction of completions answered with a 500 or 429")
+    ap.add_argument("--error-statuses", default="429,500",
+                    help="comma-separated statuses --error-rate picks from")
+    ap.add_argument("--seed", type=int, help="seed for jitter and injected errors")
+    ap.add_argument("--overshoot", type=float, default=1.0,
+                    help="write this multiple of the requested words (2 = twice as long)")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.verbose, args.pack_drop_every,
+                         args.batch_delay, args.batch_fail_every, args.latency_jitter,
+                         args.error_rate, args.seed, args.overshoot,
+                         [int(s) for s in args.error_statuses.split(",")])
+    print(f"Fake OpenAI listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
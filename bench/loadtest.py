@@ -0,0 +1,355 @@
+# bench/loadtest.py
+# -----------------------------------------
+# End-to-end load test against a real gunicorn, with stored baselines
+#
+#   python bench/loadtest.py                                  # SQLite, all scenarios
+#   python bench/loadtest.py --save-baseline                  # record bench/baselines/sqlite.json
+#   python bench/loadtest.py --database-url postgresql://localhost/rr_bench
+#   python bench/loadtest.py --scenarios login_storm,export --concurrency 16
+#   python bench/loadtest.py --latency 0.8 --error-rate 0.05 --env LLM_RPM=500
+#
+# Boots the app with the exact gunicorn command from render.yaml (web
+# service startCommand) against bench/fake_openai.py, seeds users, then
+# drives each scenario from --concurrency client threads:
+#
+#   login_storm        GET /login + POST /login with a fresh session
+#   generate_batch     POST /generate_reports_batch, 30 rows, fresh
+#   profile_roundtrip  POST /class_profile/save (40 rows) + GET .../full
+#   export             GET .../export.csv or .xlsx of a 40-row class
+#
+# Prints throughput and p50/p95/p99 per scenario. With a baseline present
+# (bench/baselines/<sqlite|postgresql>.json, or --baseline) it also prints
+# the change and exits 1 when p95 or throughput is worse than --tolerance.
+# Baselines are machine-specific: record them on the box you compare on.
+#
+# The shared LLM limiter is off by default (LLM_RPM=0) so generation
+# numbers measure the app rather than the configured budget; pass
+# --env LLM_RPM=... to include it.
+# -----------------------------------------
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from fake_openai import make_server  # noqa: E402
+
+SCENARIOS = ("login_storm", "generate_batch", "profile_roundtrip", "export")
+PASSWORD = "correct horse battery"
+RATINGS = ("Excellent", "Good", "Satisfactory", "Needs improvement")
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+SEED_SCRIPT = """
+import sys
+from app import create_app
+from models import db, User
+import passwords
+prefix, n = sys.argv[1], int(sys.argv[2])
+app = create_app()
+with app.app_context():
+    db.create_all()
+    hashed = passwords.hash_password(sys.argv[3])
+    db.session.add_all(User(email=f"{prefix}{i}@bench-school.org", plan="teacher",
+                            password_hash=hashed, reports_used=0) for i in range(n))
+    db.session.commit()
+"""
+
+
+# =========================================
+# Server lifecycle
+# =========================================
+def render_start_command(port):
+    """The web service's startCommand from render.yaml, bound to localhost:port."""
+    with open(os.path.join(ROOT, "render.yaml"), encoding="utf-8") as f:
+        m = re.search(r"^\s*startCommand:\s*(gunicorn .+)$", f.read(), re.M)
+    if not m:
+        raise SystemExit("No gunicorn startCommand found in render.yaml")
+    cmd = m.group(1).replace("$PORT", str(port)).replace("0.0.0.0", "127.0.0.1")
+    return shlex.split(cmd)
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base_url, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {proc.returncode}")
+        try:
+            if httpx.get(base_url + "/", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit("gunicorn did not become ready")
+
+
+# =========================================
+# Client helpers
+# =========================================
+def new_session(base_url):
+    return httpx.Client(base_url=base_url, timeout=180, follow_redirects=False)
+
+
+def login(session, email):
+    page = session.get("/login")
+    m = CSRF_RE.search(page.text)
+    data = {"email": email, "password": PASSWORD, "csrf_token": m.group(1) if m else ""}
+    return session.post("/login", data=data)
+
+
+def make_rows(n, tag, rnd):
+    return [{"name": f"Student {tag}-{i:02d}", "gender": rnd.choice(("Female", "Male")),
+             "tests": rnd.choice(RATINGS), "homework": rnd.choice(RATINGS),
+             "organisation": rnd.choice(RATINGS), "participation": rnd.choice(RATINGS),
+             "comments": f"note {tag}-{i}", "report": ""} for i in range(n)]
+
+
+def save_profile(session, class_name, rows):
+    return session.post("/class_profile/save", json={
+        "class": class_name, "subject": "English", "max_words": 60, "rows": rows})
+
+
+# =========================================
+# Scenarios: op(ctx, vu, i) -> "ok" | "shed" | "error"
+# =========================================
+def op_login_storm(ctx, vu, i):
+    with new_session(ctx["base_url"]) as s:
+        r = login(s, ctx["emails"][i % len(ctx["emails"])])
+    if r.status_code == 302 and "/report" in r.headers.get("location", ""):
+        return "ok"
+    return "shed" if r.status_code == 503 else "error"
+
+
+def op_generate_batch(ctx, vu, i):
+    rows = make_rows(30, f"g{vu}-{i}", random.Random(ctx["seed"] + i))
+    r = ctx["sessions"][vu].post("/generate_reports_batch", json={
+        "class": f"Gen {vu}", "subject": "English", "max_words": 60, "rows": rows, "fresh": True})
+    if r.status_code != 200:
+        return "error"
+    return "ok" if r.json().get("failed") == 0 else "error"
+
+
+def op_profile_roundtrip(ctx, vu, i):
+    s = ctx["sessions"][vu]
+    rows = make_rows(40, f"p{vu}", random.Random(ctx["seed"] + i))
+    r = save_profile(s, f"Round {vu}-{i % 5}", rows)
+    if r.status_code not in (200, 201):
+        return "error"
+    full = s.get(f"/class_profile/{r.json()['id']}/full")
+    return "ok" if full.status_code == 200 and len(full.json().get("rows") or []) == 40 else "error"
+
+
+def op_export(ctx, vu, i):
+    fmt = ("csv", "xlsx")[i % 2]
+    with ctx["sessions"][vu].stream("GET", f"/class_profile/{ctx['export_ids'][vu]}/export.{fmt}") as r:
+        size = sum(len(chunk) for chunk in r.iter_bytes())
+    return "ok" if r.status_code == 200 and size > 0 else "error"
+
+
+def setup_export(ctx):
+    ids = []
+    for vu, s in enumerate(ctx["sessions"]):
+        r = save_profile(s, f"Export {vu}", make_rows(40, f"x{vu}", random.Random(ctx["seed"] + vu)))
+        ids.append(r.json()["id"])
+    ctx["export_ids"] = ids
+
+
+OPS = {"login_storm": op_login_storm, "generate_batch": op_generate_batch,
+       "profile_roundtrip": op_profile_roundtrip, "export": op_export}
+SETUP = {"export": setup_export}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run_scenario(name, ctx, iterations, concurrency):
+    if name in SETUP:
+        SETUP[name](ctx)
+    counter = iter(range(iterations))
+    lock = threading.Lock()
+    samples, outcomes = [], {"ok": 0, "shed": 0, "error": 0}
+
+    def virtual_user(vu):
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                outcome = OPS[name](ctx, vu, i)
+            except httpx.HTTPError:
+                outcome = "error"
+            elapsed = time.perf_counter() - t0
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    samples.append(elapsed)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(virtual_user, range(concurrency)))
+    wall = time.perf_counter() - t0
+    return {
+        "ops": iterations, "ok": outcomes["ok"], "shed": outcomes["shed"], "errors": outcomes["error"],
+        "seconds": round(wall, 3), "throughput": round(outcomes["ok"] / wall, 2) if wall else 0.0,
+        "p50_ms": round(1000 * percentile(samples, 50), 1),
+        "p95_ms": round(1000 * percentile(samples, 95), 1),
+        "p99_ms": round(1000 * percentile(samples, 99), 1),
+    }
+
+
+# =========================================
+# Baselines
+# =========================================
+def compare(results, baseline, tolerance):
+    """Print deltas against `baseline`; returns the list of regressions."""
+    regressions = []
+    print(f"\n  vs baseline ({baseline['meta'].get('recorded_at', '?')}), tolerance {tolerance:.0%}")
+    for name, cur in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            print(f"  {name:<18} (no baseline)")
+            continue
+        d_p95 = (cur["p95_ms"] / base["p95_ms"] - 1) if base["p95_ms"] else 0.0
+        d_tput = (cur["throughput"] / base["throughput"] - 1) if base["throughput"] else 0.0
+        bad = d_p95 > tolerance or d_tput < -tolerance or cur["errors"] > base["errors"]
+        print(f"  {name:<18} p95 {d_p95:+7.1%}  throughput {d_tput:+7.1%}  errors {base['errors']}->{cur['errors']}"
+              f"{'  REGRESSION' if bad else ''}")
+        if bad:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test the app under its production gunicorn settings")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--iterations", type=int, default=60, help="operations per scenario")
+    ap.add_argument("--concurrency", type=int, default=8, help="client threads (virtual users)")
+    ap.add_argument("--users", type=int, default=50, help="accounts seeded for the login storm")
+    ap.add_argument("--database-url", help="default: a fresh SQLite file")
+    ap.add_argument("--latency", type=float, default=0.3, help="fake OpenAI seconds per completion")
+    ap.add_argument("--latency-jitter", type=float, default=0.3)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra environment for gunicorn (repeatable)")
+    ap.add_argument("--baseline", help="baseline JSON (default bench/baselines/<db>.json)")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--output", help="also write this run's results to a JSON file")
+    args = ap.parse_args()
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    work = tempfile.mkdtemp(prefix="loadtest-")
+    db_url = args.database_url or f"sqlite:///{work}/loadtest.db"
+    db_kind = "postgresql" if db_url.startswith("postgres") else "sqlite"
+
+    fake = make_server(port=0, latency=args.latency, latency_jitter=args.latency_jitter,
+                       error_rate=args.error_rate, seed=args.seed)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=db_url, OPENAI_API_KEY="fake",
+               OPENAI_BASE_URL=f"http://127.0.0.1:{fake.server_port}/v1",
+               SECRET_KEY="loadtest", LLM_RPM="0", EXPORT_DIR=os.path.join(work, "exports"),
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(work, "metrics"))
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    prefix = f"lt{int(time.time())}-"
+    # Seeding runs outside gunicorn, so it must not write multiprocess metric files
+    seed_env = {k: v for k, v in env.items() if k != "PROMETHEUS_MULTIPROC_DIR"}
+    subprocess.run([sys.executable, "-c", SEED_SCRIPT, prefix, str(args.users), PASSWORD],
+                   cwd=ROOT, env=seed_env, check=True)
+
+    cmd = render_start_command(port)
+    print(f"$ {' '.join(cmd)}\n  database {db_kind}, fake OpenAI latency {args.latency}s "
+          f"±{args.latency_jitter:.0%}, error rate {args.error_rate:.0%}, seed {args.seed}")
+    log_path = os.path.join(work, "gunicorn.log")
+    log = open(log_path, "w", encoding="utf-8")
+    server = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base_url, server)
+        emails = [f"{prefix}{i}@bench-school.org" for i in range(args.users)]
+        sessions = []
+        for vu in range(args.concurrency):
+            s = new_session(base_url)
+            login(s, emails[vu % len(emails)])
+            sessions.append(s)
+        ctx = {"base_url": base_url, "emails": emails, "sessions": sessions, "seed": args.seed}
+
+        results = {"meta": {
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"), "command": cmd, "database": db_kind,
+            "iterations": args.iterations, "concurrency": args.concurrency, "latency": args.latency,
+            "latency_jitter": args.latency_jitter, "error_rate": args.error_rate, "seed": args.seed,
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+        }, "scenarios": {}}
+        print(f"\n  {'scenario':<18} {'ok':>5} {'shed':>5} {'err':>4} {'ops/s':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name in names:
+            r = run_scenario(name, ctx, args.iterations, args.concurrency)
+            results["scenarios"][name] = r
+            print(f"  {name:<18} {r['ok']:>5} {r['shed']:>5} {r['errors']:>4} {r['throughput']:>8.2f} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+        for s in sessions:
+            s.close()
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        fake.shutdown()
+        log.close()
+        print(f"\n  gunicorn log: {log_path}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline_path = args.baseline or os.path.join(ROOT, "bench", "baselines", f"{db_kind}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n  baseline saved to {os.path.relpath(baseline_path, ROOT)}")
+        return
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
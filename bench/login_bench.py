@@ -0,0 +1,98 @@
+# bench/login_bench.py
+# -----------------------------------------
+# Login throughput under a morning burst
+#
+#   python bench/login_bench.py --users 40 --concurrency 8 --logins 400
+#   PASSWORD_HASH_WORKERS=4 python bench/login_bench.py
+#   PASSWORD_HASH_METHOD=pbkdf2:sha256:600000 python bench/login_bench.py
+#   python bench/login_bench.py --old-method pbkdf2:sha256:100000   # rehash path
+#
+# Creates users in a throwaway SQLite DB, then POSTs /login from
+# --concurrency threads (the request threads gunicorn would give us) and
+# prints logins/s, latency percentiles, how many were shed with a 503, and
+# the hashing pool counters. Passwords are pre-hashed with --old-method
+# when given, so the first round also measures rehash-on-login.
+# -----------------------------------------
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "correct horse battery"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Login throughput microbenchmark")
+    ap.add_argument("--users", type=int, default=40)
+    ap.add_argument("--concurrency", type=int, default=8, help="simulated request threads")
+    ap.add_argument("--logins", type=int, default=400)
+    ap.add_argument("--old-method", help="seed hashes with this method to exercise rehash")
+    args = ap.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='login-bench-')}/bench.db")
+    os.environ.setdefault("OPENAI_API_KEY", "")
+
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models import db, User
+    import passwords
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    emails = [f"teacher{i}@bench-school.org" for i in range(args.users)]
+    with app.app_context():
+        db.create_all()
+        seed_method = args.old_method or passwords.METHOD
+        for email in emails:
+            db.session.add(User(email=email, plan="teacher",
+                                password_hash=generate_password_hash(PASSWORD, seed_method)))
+        db.session.commit()
+
+    local = threading.local()
+
+    def one_login(i):
+        c = getattr(local, "client", None)
+        if c is None:
+            c = local.client = app.test_client()
+        t0 = time.perf_counter()
+        r = c.post("/login", data={"email": emails[i % len(emails)], "password": PASSWORD})
+        elapsed = time.perf_counter() - t0
+        c.get("/logout")
+        return r.status_code, elapsed
+
+    print(f"method {passwords.current_prefix()}, pool {passwords.WORKERS} worker(s) "
+          f"+ {passwords.MAX_QUEUE} queued, {args.concurrency} request threads")
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one_login, range(args.logins)))
+    wall = time.perf_counter() - t0
+
+    ok = [t for code, t in results if code == 302]
+    shed = sum(1 for code, _ in results if code == 503)
+    other = len(results) - len(ok) - shed
+    print(f"  {len(ok)} ok, {shed} shed (503), {other} other in {wall:.2f}s "
+          f"-> {len(ok) / wall:.1f} logins/s")
+    print(f"  latency ms  p50 {1000 * percentile(ok, 50):.0f}  p95 {1000 * percentile(ok, 95):.0f}"
+          f"  p99 {1000 * percentile(ok, 99):.0f}  max {1000 * max(ok, default=0):.0f}")
+    print(f"  pool {passwords.snapshot()}")
+    if args.old_method:
+        with app.app_context():
+            left = sum(1 for u in User.query.all() if passwords.needs_rehash(u.password_hash))
+        print(f"  {args.users - left}/{args.users} hashes upgraded to {passwords.current_prefix()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench/packing_bench.py
+# -----------------------------------------
+# Compare pack sizes (students per completion) for a class batch
+#
+#   python bench/packing_bench.py --rows 30 --packs 1,3,5,10 --latency 0.4
+#   python bench/packing_bench.py --drop-every 4      # exercise the fallback
+#
+# Runs generation.generate_many against bench/fake_openai.py with the
+# cache bypassed (fresh=True) and prints completions made, wall time and
+# the estimated tokens saved per report for each pack size. Pass
+# --base-url to point at another OpenAI-compatible endpoint instead.
+# -----------------------------------------
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+RATINGS = ("Excellent", "Good", "Satisfactory", "Needs improvement")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare packed generation sizes")
+    ap.add_argument("--rows", type=int, default=30)
+    ap.add_argument("--packs", default="1,3,5,10", help="comma-separated pack sizes")
+    ap.add_argument("--latency", type=float, default=0.4, help="fake server seconds per call")
+    ap.add_argument("--drop-every", type=int, default=0,
+                    help="fake server omits every Nth packed student")
+    ap.add_argument("--base-url", help="use this endpoint instead of the fake server")
+    args = ap.parse_args()
+
+    server = None
+    if not args.base_url:
+        from fake_openai import make_server
+        server = make_server(port=0, latency=args.latency, pack_drop_every=args.drop_every)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        args.base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='pack-bench-')}/bench.db")
+
+    from openai import OpenAI
+    from app import create_app
+    from models import db
+    import generation
+
+    app = create_app()
+    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"], base_url=args.base_url)
+    header = {"class": "Year 8", "subject": "Geography", "max_words": 60}
+    rows = [{"name": f"Student {i:02d}", "tests": RATINGS[i % 4], "homework": RATINGS[(i + 1) % 4],
+             "organisation": RATINGS[(i + 2) % 4], "participation": RATINGS[(i + 3) % 4],
+             "comments": f"note {i}"} for i in range(args.rows)]
+
+    print(f"{args.rows} rows, concurrency {generation.GENERATION_CONCURRENCY}")
+    print(f"  {'pack':>4} {'calls':>6} {'fallbacks':>9} {'seconds':>8} {'saved tok/report':>17} {'errors':>6}")
+    with app.app_context():
+        db.create_all()
+        for pack in (int(p) for p in args.packs.split(",")):
+            with generation._pack_lock:
+                for k in generation.pack_stats:
+                    generation.pack_stats[k] = 0
+            calls_before = server.calls if server else 0
+            t0 = time.perf_counter()
+            results = list(generation.generate_many(client, rows, header, fresh=True, pack=pack))
+            elapsed = time.perf_counter() - t0
+            stats = generation.pack_snapshot()
+            calls = server.calls - calls_before if server else "-"
+            saved = stats["tokens_saved_per_report"]
+            errors = sum(1 for r in results if r[2])
+            print(f"  {pack:>4} {calls:>6} {stats['fallbacks']:>9} {elapsed:>8.2f} "
+                  f"{'-' if saved is None else saved:>17} {errors:>6}")
+
+
+if __name__ == "__main__":
+    main()
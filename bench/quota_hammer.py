@@ -0,0 +1,106 @@
+# bench/quota_hammer.py
+# -----------------------------------------
+# Concurrency check for quota.reserve / quota.refund
+#
+#   python bench/quota_hammer.py --threads 32 --limit 200
+#   DATABASE_URL=postgresql://... python bench/quota_hammer.py
+#
+# Many threads reserve 1..3 reports at once against a single user. The
+# run fails (exit 1) if reports_used ever ends above reports_limit or
+# doesn't equal the sum of successful reservations minus refunds.
+# -----------------------------------------
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hammer quota.reserve from many threads")
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--attempts", type=int, default=50, help="reservations per thread")
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--refund-rate", type=float, default=0.2,
+                    help="fraction of successful reservations refunded")
+    args = ap.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        tmp = tempfile.mkdtemp(prefix="quota-hammer-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/hammer.db"
+
+    from app import create_app
+    from models import db, User
+    import quota
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"hammer-{time.time_ns()}@example.com", plan="free",
+                    reports_used=0, reports_limit=args.limit)
+        user.set_password("hammer")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    totals = {"reserved": 0, "refunded": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    start = threading.Barrier(args.threads)
+
+    def hammer(seed):
+        rnd = random.Random(seed)
+        with app.app_context():
+            start.wait()
+            for _ in range(args.attempts):
+                n = rnd.randint(1, 3)
+                try:
+                    quota.reserve(user_id, n)
+                except quota.QuotaExceeded:
+                    with lock:
+                        totals["rejected"] += 1
+                    continue
+                except Exception:
+                    # e.g. SQLite "database is locked" under heavy contention
+                    db.session.rollback()
+                    with lock:
+                        totals["errors"] += 1
+                    continue
+                refunded = n if rnd.random() < args.refund_rate else 0
+                if refunded:
+                    quota.refund(user_id, refunded)
+                with lock:
+                    totals["reserved"] += n
+                    totals["refunded"] += refunded
+            db.session.remove()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=hammer, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    with app.app_context():
+        used = db.session.get(User, user_id).reports_used
+
+    expected = totals["reserved"] - totals["refunded"]
+    ops = args.threads * args.attempts
+    print(f"{ops} reservations in {elapsed:.2f}s ({ops / elapsed:,.0f}/s) "
+          f"on {os.environ['DATABASE_URL'].split(':', 1)[0]}")
+    print(f"reserved={totals['reserved']} refunded={totals['refunded']} "
+          f"rejected={totals['rejected']} errors={totals['errors']}")
+    print(f"reports_used={used} expected={expected} limit={args.limit}")
+
+    ok = used == expected and used <= args.limit
+    print("OK" if ok else "FAIL: quota invariant violated")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
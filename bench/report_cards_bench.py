@@ -0,0 +1,86 @@
+# bench/report_cards_bench.py
+# -----------------------------------------
+# Render a whole school's report cards and check it fits a time budget
+#
+#   python bench/report_cards_bench.py --students 1000 --budget 60
+#   REPORT_CARD_WORKERS=4 python bench/report_cards_bench.py --format docx
+#
+# Builds synthetic rows with ~120-word reports, streams every card through
+# report_cards.render_cards + exports.zip_chunks (the same path as
+# /class_profile/<id>/report_cards.zip) and counts bytes without keeping
+# the ZIP. Also times the single-process path for comparison. Exits 1
+# when the pooled run exceeds --budget seconds.
+# -----------------------------------------
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import exports
+import report_cards
+
+RATINGS = ("Excellent", "Good", "Satisfactory", "Needs improvement")
+WORDS = ("consistently shows curiosity and works well with classmates while "
+         "building confidence in problem solving and written explanations this term").split()
+
+
+def make_rows(n, seed=7):
+    rnd = random.Random(seed)
+    return [{
+        "name": f"Student {i:04d} Ølsen-O'Brien",
+        "gender": rnd.choice(("Female", "Male")),
+        "tests": rnd.choice(RATINGS),
+        "homework": rnd.choice(RATINGS),
+        "organisation": rnd.choice(RATINGS),
+        "participation": rnd.choice(RATINGS),
+        "report": " ".join(rnd.choice(WORDS) for _ in range(120)).capitalize() + ".",
+    } for i in range(n)]
+
+
+def run(fmt, rows, header, pool):
+    t0 = time.perf_counter()
+    total = 0
+    for chunk in exports.zip_chunks(report_cards.render_cards(fmt, rows, header, pool=pool)):
+        total += len(chunk)
+    return time.perf_counter() - t0, total
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time bulk report-card rendering")
+    ap.add_argument("--students", type=int, default=1000)
+    ap.add_argument("--format", choices=sorted(report_cards.FORMATS), default="pdf")
+    ap.add_argument("--budget", type=float, default=60.0, help="seconds allowed for the pooled run")
+    ap.add_argument("--skip-serial", action="store_true")
+    args = ap.parse_args()
+
+    rows = make_rows(args.students)
+    header = {"class_name": "Year 7", "subject": "Science"}
+    print(f"{args.students} {args.format} cards, {report_cards.CARD_WORKERS} worker(s), "
+          f"batch {report_cards.CARD_BATCH}, {os.cpu_count()} CPU(s)")
+
+    if not args.skip_serial:
+        # Same code path in-process, as a baseline for the pool's speed-up
+        with ThreadPoolExecutor(max_workers=1) as inline:
+            elapsed, size = run(args.format, rows, header, inline)
+        print(f"  single process  {elapsed:7.2f}s  {args.students / elapsed:7.1f} cards/s  "
+              f"{size / 1e6:6.1f} MB")
+
+    pool = report_cards._get_pool()
+    run(args.format, rows[:report_cards.CARD_WORKERS], header, pool)  # start workers
+    elapsed, size = run(args.format, rows, header, pool)
+    print(f"  process pool    {elapsed:7.2f}s  {args.students / elapsed:7.1f} cards/s  "
+          f"{size / 1e6:6.1f} MB")
+    pool.shutdown()
+
+    ok = elapsed <= args.budget
+    print("OK" if ok else f"FAIL: over the {args.budget:.0f}s budget")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench/roster_import.py
+# -----------------------------------------
+# Whole-school roster upload through POST /class_profiles/import
+#
+#   python bench/roster_import.py --students 5000 --classes 40
+#   DATABASE_URL=postgresql://... python bench/roster_import.py
+#
+# Builds one CSV and one XLSX roster (the XLSX through exports.py, so it
+# also checks that exports re-import), uploads each and reports time,
+# SQL statements and the peak Python memory traced during the request
+# next to the file size. Memory should track IMPORT_CHUNK_ROWS, not the
+# number of students.
+# -----------------------------------------
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from save_roundtrips import StatementCounter  # noqa: E402
+
+COLUMNS = (("Name", "name"), ("Gender", "gender"), ("Class tests", "tests"),
+           ("Homework", "homework"), ("Organisation", "organisation"),
+           ("Participation", "participation"), ("Comments", "comments"),
+           ("Class", "class_name"), ("Subject", "subject"))
+RATINGS = ("Low", "ok", "3", "Excellent", "")
+
+
+def roster(students, classes):
+    for i in range(students):
+        yield {"name": f"Student {i}", "gender": "F" if i % 2 else "M",
+               "tests": RATINGS[i % 5], "homework": RATINGS[(i + 1) % 5],
+               "organisation": RATINGS[(i + 2) % 5], "participation": RATINGS[(i + 3) % 5],
+               "comments": "Works hard in class and is keen to improve." if i % 3 else "",
+               "class_name": f"Year {7 + i % 5} / {i % classes}", "subject": "English"}
+
+
+def csv_bytes(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([title for title, _ in COLUMNS])
+    for row in rows:
+        writer.writerow([row[key] for _, key in COLUMNS])
+    return out.getvalue().encode("utf-8")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time and memory of a roster import")
+    ap.add_argument("--students", type=int, default=5000)
+    ap.add_argument("--classes", type=int, default=40)
+    args = ap.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        tmp = tempfile.mkdtemp(prefix="roster-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+
+    from app import create_app
+    from models import db, User
+    import exports
+
+    app = create_app({"WTF_CSRF_ENABLED": False})
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"bench-{time.time_ns()}@bench-school.org", plan="school",
+                    reports_used=0, reports_limit=None)
+        user.set_password("benchpass")
+        db.session.add(user)
+        db.session.commit()
+        email, dialect = user.email, db.engine.dialect.name
+        counter = StatementCounter(db.engine)
+
+    client = app.test_client()
+    client.post("/login", data={"email": email, "password": "benchpass"})
+
+    files = (("roster.csv", csv_bytes(roster(args.students, args.classes))),
+             ("roster.xlsx", b"".join(exports.xlsx_chunks(roster(args.students, args.classes),
+                                                          COLUMNS, "Roster"))))
+    print(f"{args.students} students in {args.classes} classes ({dialect}):")
+    for name, data in files:
+        counter.count = 0
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        r = client.post("/class_profiles/import", content_type="multipart/form-data",
+                        data={"file": (io.BytesIO(data), name)})
+        ms = (time.perf_counter() - t0) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        body = r.get_json()
+        print(f"  {name:<12} {len(data) / 1024:7.0f} KB  {r.status_code}  "
+              f"{body.get('imported', 0):6d} rows  {len(body.get('classes', [])):3d} classes  "
+              f"{counter.count:4d} statements  {ms:8.1f} ms  peak {peak / 1024:6.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
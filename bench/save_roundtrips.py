@@ -0,0 +1,120 @@
+# bench/save_roundtrips.py
+# -----------------------------------------
+# Round trips per class-profile save: lookup-then-write vs upsert
+#
+#   python bench/save_roundtrips.py --iterations 200
+#   DATABASE_URL=postgresql://... python bench/save_roundtrips.py
+#
+# Part 1 compares only the profile header write: the old
+# filter_by(...).first() followed by an INSERT or UPDATE, against the
+# single INSERT ... ON CONFLICT DO UPDATE ... RETURNING in _upsert_profile.
+# Part 2 counts statements for whole /class_profile/save calls on a
+# 40-row class (create, one-cell edit, unchanged re-save).
+# -----------------------------------------
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def legacy_save(db, ClassProfile, user_id, class_name, subject, max_words):
+    existing = (ClassProfile.query
+                .filter_by(user_id=user_id, class_name=class_name, subject=subject)
+                .first())
+    if existing:
+        existing.max_words = max_words
+        existing.version = (existing.version or 1) + 1
+    else:
+        existing = ClassProfile(user_id=user_id, class_name=class_name,
+                                subject=subject, max_words=max_words)
+        db.session.add(existing)
+    db.session.flush()
+    return existing.id
+
+
+def measure(counter, db, fn, iterations):
+    counter.count = 0
+    t0 = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+        db.session.commit()
+    elapsed = time.perf_counter() - t0
+    # COMMIT isn't a cursor execute, so this counts SQL statements only
+    return counter.count / iterations, elapsed / iterations * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Count round trips per profile save")
+    ap.add_argument("--iterations", type=int, default=200)
+    ap.add_argument("--rows", type=int, default=40)
+    args = ap.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        tmp = tempfile.mkdtemp(prefix="save-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+
+    from app import create_app
+    from profiles import _upsert_profile
+    from models import db, User, ClassProfile
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"bench-{time.time_ns()}@example.com", plan="teacher",
+                    reports_used=0, reports_limit=None)
+        user.set_password("benchpass")
+        db.session.add(user)
+        db.session.commit()
+        user_id, email = user.id, user.email
+        counter = StatementCounter(db.engine)
+
+        print(f"Profile header write ({args.iterations} iterations, "
+              f"{db.engine.dialect.name}):")
+        for label, fn in (
+            ("legacy create", lambda i: legacy_save(db, ClassProfile, user_id, f"L{i}", "Math", 50)),
+            ("legacy update", lambda i: legacy_save(db, ClassProfile, user_id, "L0", "Math", 50 + i % 2)),
+            ("upsert create", lambda i: _upsert_profile(user_id, f"U{i}", "Math", 50)),
+            ("upsert update", lambda i: _upsert_profile(user_id, "U0", "Math", 50 + i % 2)),
+        ):
+            stmts, ms = measure(counter, db, fn, args.iterations)
+            print(f"  {label:<14} {stmts:4.1f} statements  {ms:7.3f} ms/save")
+
+    client = app.test_client()
+    client.post("/login", data={"email": email, "password": "benchpass"})
+    rows = [{"name": f"Student {i}", "tests": "Good", "homework": "Ok"} for i in range(args.rows)]
+
+    def save(payload):
+        counter.count = 0
+        t0 = time.perf_counter()
+        r = client.post("/class_profile/save", json=payload)
+        return r, counter.count, (time.perf_counter() - t0) * 1000
+
+    print(f"\n/class_profile/save with {args.rows} rows (includes session + user load):")
+    r, n, ms = save({"class": "Bench", "subject": "Math", "rows": rows})
+    print(f"  create           {n:3d} statements  {ms:7.2f} ms")
+    ids = r.get_json()["row_ids"]
+    edited = [dict(row, id=rid) for row, rid in zip(rows, ids)]
+    edited[7] = dict(edited[7], comments="Much improved")
+    _, n, ms = save({"class": "Bench", "subject": "Math", "rows": edited})
+    print(f"  one-cell edit    {n:3d} statements  {ms:7.2f} ms")
+    _, n, ms = save({"class": "Bench", "subject": "Math", "rows": edited})
+    print(f"  unchanged        {n:3d} statements  {ms:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
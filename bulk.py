@@ -0,0 +1,397 @@
+# bulk.py
+# -----------------------------------------
+# Report Rocket – term-end bulk generation via the OpenAI Batch API
+#
+# Pending rows (a name but no report) from many ClassProfiles are written
+# to one JSONL file, uploaded and submitted as a batch; the results come
+# back within the completion window and are mapped into the rows.
+#
+# Every step is driven by what's already stored on the BulkBatch, so
+# advance() can be re-run at any point (after a crash, from the worker or
+# from `flask bulk poll`) and picks up where the last run stopped:
+#
+#   building   -> upload JSONL (input_file_id) -> create batch -> submitted
+#   submitted  -> poll until OpenAI reports a terminal status -> completed
+#   completed  -> apply output + error files, refund failures -> applied
+#
+# Applying only ever touches items still "pending", so reading the same
+# output twice changes nothing.
+#
+# Quota is charged once per distinct request per owner, in the same
+# transaction that records the batch and its items; refunds for failed
+# requests commit together with the "applied" status.
+# -----------------------------------------
+import json
+import os
+import tempfile
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update, func
+
+from models import db, User, ClassProfile, ClassRow, BulkBatch, BulkItem
+from generation import MODEL, TEMPERATURE, SYSTEM_PROMPT, build_prompt, cache_key, target_words
+import length_control
+import report_cache
+import quota
+import jobs
+
+# The Batch API accepts up to 50,000 requests per input file
+BULK_MAX_REQUESTS = int(os.getenv("BULK_MAX_REQUESTS", "50000"))
+BULK_PLANS = tuple(p.strip() for p in os.getenv("BULK_PLANS", "school").split(",") if p.strip())
+APPLY_CHUNK = 500
+REMOTE_CLOCK_SKEW = 300   # seconds of slack when matching OpenAI's created_at to ours
+
+TERMINAL = ("completed", "failed", "expired", "cancelled")
+ROW_FIELDS = ("name", "gender", "tests", "homework", "organisation", "participation", "comments")
+
+
+# =========================================
+# Collect + submit
+# =========================================
+def pending_rows(user_ids=None, limit=None):
+    """Rows with a name and no report that aren't already in an open batch."""
+    in_flight = (select(BulkItem.row_id)
+                 .join(BulkBatch, BulkBatch.id == BulkItem.batch_id)
+                 .where(BulkItem.status == "pending", BulkBatch.status != "applied"))
+    stmt = (select(ClassRow, ClassProfile.user_id, ClassProfile.class_name,
+                   ClassProfile.subject, ClassProfile.max_words)
+            .join(ClassProfile, ClassProfile.id == ClassRow.profile_id)
+            .where(ClassRow.name != "", ClassRow.report == "",
+                   ClassRow.id.not_in(in_flight))
+            .order_by(ClassProfile.user_id, ClassRow.profile_id, ClassRow.position))
+    if user_ids:
+        stmt = stmt.where(ClassProfile.user_id.in_(user_ids))
+    else:
+        stmt = stmt.join(User, User.id == ClassProfile.user_id).where(User.plan.in_(BULK_PLANS))
+    if limit:
+        stmt = stmt.limit(limit)
+
+    out = []
+    for row, user_id, class_name, subject, max_words in db.session.execute(stmt):
+        snap = {k: getattr(row, k) or "" for k in ROW_FIELDS}
+        snap.update(id=row.id, profile_id=row.profile_id, user_id=user_id,
+                    **{"class": class_name, "subject": subject, "max_words": max_words})
+        out.append(snap)
+    return out
+
+
+def _reserve(misses):
+    """Charge each owner once per distinct request; returns the `(row, key)` pairs kept.
+
+    Rows of one owner that share a prompt ride on a single charge, as
+    duplicates do on the sync and job paths. Requests beyond what an
+    owner has left are dropped with all their rows. Nothing is committed:
+    the charge belongs to the caller's transaction.
+    """
+    by_user = OrderedDict()
+    for r, key in misses:
+        by_user.setdefault(r["user_id"], OrderedDict()).setdefault(key, []).append((r, key))
+    kept = []
+    for user_id, requests in by_user.items():
+        n = len(requests)
+        try:
+            quota.reserve(user_id, n, commit=False)
+        except quota.QuotaExceeded as e:
+            n = e.remaining or 0
+            if n:
+                quota.reserve(user_id, n, commit=False)
+        for pairs in list(requests.values())[:n]:
+            kept.extend(pairs)
+    return kept
+
+
+def create_batch(client, user_ids=None, limit=None):
+    """Queue every pending row (school plans by default) as one Batch API job.
+
+    Cache hits are written straight into the rows and never sent. Returns
+    the BulkBatch, or None when there was nothing to send.
+    """
+    rows = pending_rows(user_ids, limit or BULK_MAX_REQUESTS)
+    if not rows:
+        return None
+
+    keys = [cache_key(r, user_id=r["user_id"]) for r in rows]
+    hits = report_cache.get_many(keys)
+    by_profile = defaultdict(dict)
+    misses = []
+    for r, key in zip(rows, keys):
+        if key in hits:
+            by_profile[r["profile_id"]][r["id"]] = (
+                r["name"], report_cache.personalize(hits[key], r["name"]))
+        else:
+            misses.append((r, key))
+    for profile_id, reports in by_profile.items():
+        jobs.write_reports(profile_id, reports)
+    db.session.commit()
+
+    # Charges, batch and items commit together: a crash can't leave users
+    # paying for rows no batch will ever refund
+    misses = _reserve(misses)
+    if not misses:
+        db.session.rollback()
+        return None
+    batch = BulkBatch(status="building", model=MODEL, total=len(misses))
+    db.session.add(batch)
+    db.session.flush()
+    custom_ids = {}
+    for _, key in misses:
+        custom_ids.setdefault(key, f"bulk{batch.id}-{len(custom_ids) + 1}")
+    batch.requests = len(custom_ids)
+    db.session.execute(BulkItem.__table__.insert(), [
+        {"batch_id": batch.id, "user_id": r["user_id"], "profile_id": r["profile_id"],
+         "row_id": r["id"], "custom_id": custom_ids[key], "cache_key": key,
+         "row_json": r, "status": "pending"}
+        for r, key in misses
+    ])
+    db.session.commit()
+
+    advance(client, batch)
+    return batch
+
+
+def _write_jsonl(batch, fh):
+    """One request line per custom_id, built from its first item."""
+    seen = set()
+    stmt = (select(BulkItem.custom_id, BulkItem.row_json)
+            .where(BulkItem.batch_id == batch.id)
+            .order_by(BulkItem.id)
+            .execution_options(yield_per=APPLY_CHUNK))
+    for custom_id, row in db.session.execute(stmt):
+        if custom_id in seen:
+            continue
+        seen.add(custom_id)
+        line = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": batch.model,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": build_prompt(row)},
+                ],
+                "temperature": TEMPERATURE,
+                **length_control.request_params(target_words(row)),
+            },
+        }
+        fh.write((json.dumps(line) + "\n").encode("utf-8"))
+
+
+def _find_remote(client, batch):
+    """A batch we created but never recorded (crash right after create).
+
+    The listing is newest first and auto-paginates; it is read until it
+    reaches batches older than our own row (less a margin for clock skew).
+    """
+    since = batch.created_at.replace(tzinfo=timezone.utc).timestamp() - REMOTE_CLOCK_SKEW
+    for remote in client.batches.list(limit=100):
+        if remote.created_at < since:
+            break
+        meta = remote.metadata or {}
+        if meta.get("bulk_batch_id") == str(batch.id) and remote.input_file_id == batch.input_file_id:
+            return remote
+    return None
+
+
+def _submit(client, batch):
+    resumed = bool(batch.input_file_id)
+    if not resumed:
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as fh:
+            _write_jsonl(batch, fh)
+            fh.seek(0)
+            uploaded = client.files.create(file=(f"bulk-{batch.id}.jsonl", fh), purpose="batch")
+        batch.input_file_id = uploaded.id
+        db.session.commit()
+
+    # A fresh upload can't have a batch yet; a resumed one might
+    remote = (resumed and _find_remote(client, batch)) or client.batches.create(
+        input_file_id=batch.input_file_id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata={"bulk_batch_id": str(batch.id)},
+    )
+    batch.openai_batch_id = remote.id
+    batch.openai_status = remote.status
+    batch.status = "submitted"
+    batch.submitted_at = datetime.utcnow()
+    db.session.commit()
+
+
+# =========================================
+# Poll + apply
+# =========================================
+def _poll(client, batch):
+    remote = client.batches.retrieve(batch.openai_batch_id)
+    batch.openai_status = remote.status
+    if remote.status in TERMINAL:
+        batch.output_file_id = remote.output_file_id
+        batch.error_file_id = remote.error_file_id
+        if remote.status != "completed":
+            errors = getattr(remote, "errors", None)
+            detail = "; ".join(e.message or "" for e in (getattr(errors, "data", None) or []))
+            batch.error = f"Batch {remote.status}" + (f": {detail}" if detail else "")
+        batch.status = "completed"
+    db.session.commit()
+
+
+def _result(line):
+    """`(custom_id, report, error)` from one output/error file line."""
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None, None, None
+    custom_id = obj.get("custom_id")
+    response = obj.get("response") or {}
+    body = response.get("body") or {}
+    if obj.get("error") or response.get("status_code") != 200:
+        err = obj.get("error") or body.get("error") or {}
+        return custom_id, None, f"AI error: {err.get('message') or 'batch request failed'}"
+    try:
+        text = (body["choices"][0]["message"]["content"] or "").strip()
+    except (KeyError, IndexError, TypeError):
+        return custom_id, None, "AI error: malformed batch response"
+    return custom_id, text or None, None if text else "AI error: empty response"
+
+
+def _apply_chunk(batch, results):
+    """Store `{custom_id: (report, error)}` on this batch's pending items."""
+    items = db.session.execute(
+        select(BulkItem).where(BulkItem.batch_id == batch.id,
+                               BulkItem.custom_id.in_(results),
+                               BulkItem.status == "pending")
+        .order_by(BulkItem.id)
+    ).scalars().all()
+    if not items:
+        return
+
+    to_store, by_profile = {}, defaultdict(dict)
+    done = failed = 0
+    for item in items:
+        text, err = results[item.custom_id]
+        name = (item.row_json or {}).get("name", "")
+        if err:
+            item.status, item.error = "failed", err
+            failed += 1
+            continue
+        # The prompt used the first item's name; duplicates get theirs swapped in
+        neutral = to_store.get(item.cache_key)
+        if neutral is None:
+            try:
+                report = length_control.finish(batch.model, text, target_words(item.row_json or {}))
+            except length_control.EmptyReport as e:
+                item.status, item.error = "failed", f"AI error: {e}"
+                failed += 1
+                continue
+            neutral = to_store[item.cache_key] = report_cache.neutralize(report, name)
+        else:
+            report = report_cache.personalize(neutral, name)
+        item.status, item.report = "done", report
+        by_profile[item.profile_id][item.row_id] = (name, report)
+        done += 1
+
+    for profile_id, reports in by_profile.items():
+        jobs.write_reports(profile_id, reports)
+    db.session.execute(
+        update(BulkBatch).where(BulkBatch.id == batch.id)
+        .values(completed=BulkBatch.completed + done, failed=BulkBatch.failed + failed)
+    )
+    db.session.commit()
+    report_cache.store_many(to_store, batch.model)
+
+
+def _apply_file(client, batch, file_id):
+    results = {}
+    with client.files.with_streaming_response.content(file_id) as resp:
+        for line in resp.iter_lines():
+            if not line.strip():
+                continue
+            custom_id, text, err = _result(line)
+            if custom_id:
+                results[custom_id] = (text, err)
+            if len(results) >= APPLY_CHUNK:
+                _apply_chunk(batch, results)
+                results = {}
+    if results:
+        _apply_chunk(batch, results)
+
+
+def _apply(client, batch):
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            _apply_file(client, batch, file_id)
+
+    # Anything without a result line (expired / cancelled batches) fails
+    leftover = db.session.execute(
+        update(BulkItem)
+        .where(BulkItem.batch_id == batch.id, BulkItem.status == "pending")
+        .values(status="failed", error=batch.error or "No result returned by the batch")
+    ).rowcount or 0
+    # One charge per (owner, request) was taken in _reserve; give back the failed ones
+    failed = (select(BulkItem.user_id, BulkItem.custom_id)
+              .where(BulkItem.batch_id == batch.id, BulkItem.status == "failed")
+              .distinct().subquery())
+    refunds = db.session.execute(
+        select(failed.c.user_id, func.count()).group_by(failed.c.user_id)
+    ).all()
+    for user_id, n in refunds:
+        quota.refund(user_id, n, commit=False)
+    batch.failed += leftover
+    batch.status = "applied"
+    batch.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def advance(client, batch):
+    """Move `batch` as far along as it can go right now; returns its status."""
+    if batch.status == "building":
+        _submit(client, batch)
+    if batch.status == "submitted":
+        _poll(client, batch)
+    if batch.status == "completed":
+        _apply(client, batch)
+    return batch.status
+
+
+def advance_open(client, logger=None):
+    """advance() every batch that isn't applied yet; returns {id: status}."""
+    ids = db.session.execute(
+        select(BulkBatch.id).where(BulkBatch.status != "applied").order_by(BulkBatch.id)
+    ).scalars().all()
+    out = {}
+    for batch_id in ids:
+        batch = db.session.get(BulkBatch, batch_id)
+        try:
+            out[batch_id] = advance(client, batch)
+        except Exception as e:
+            db.session.rollback()
+            out[batch_id] = f"error: {e}"
+            if logger:
+                logger.warning(f"Bulk batch {batch_id} failed to advance: {e}")
+    return out
+
+
+def cancel(client, batch):
+    """Ask OpenAI to stop; finished lines are still applied once it settles."""
+    if batch.status == "submitted":
+        client.batches.cancel(batch.openai_batch_id)
+    elif batch.status == "building":
+        batch.status, batch.error = "completed", "Cancelled before submission"
+        db.session.commit()
+    return advance(client, batch)
+
+
+def batch_to_dict(batch):
+    return {
+        "id": batch.id,
+        "status": batch.status,
+        "openai_batch_id": batch.openai_batch_id,
+        "openai_status": batch.openai_status,
+        "requests": batch.requests,
+        "total": batch.total,
+        "completed": batch.completed,
+        "failed": batch.failed,
+        "error": batch.error,
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+        "finished_at": batch.finished_at.isoformat() if batch.finished_at else None,
+    }
@@ -0,0 +1,117 @@
+# cli.py
+# -----------------------------------------
+# Report Rocket – `flask` commands
+#
+#   flask init-db          create missing tables (postDeploy fallback)
+#   flask build-assets     fingerprint + precompress CSS/JS (buildCommand)
+#   flask sweep-exports    flask send-emails
+#   flask bulk submit|poll|status|cancel
+#
+# `flask db …` comes from Flask-Migrate (see create_app in app.py).
+# -----------------------------------------
+import json
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from models import db, BulkBatch
+import assets
+import bulk
+import exports
+import llm_client
+import mailer
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create any missing tables (for a database without migrations)."""
+    db.create_all()
+    print("Tables ensured via create_all()")
+
+
+@click.command("build-assets")
+def build_assets_command():
+    """Write hashed, gzip/brotli copies of the static assets to static/dist."""
+    for name, hashed in assets.build().items():
+        print(f"{name} -> dist/{hashed}")
+    if assets.brotli is None:
+        print("Brotli not installed; wrote gzip variants only")
+
+
+@click.command("sweep-exports")
+@with_appcontext
+def sweep_exports_command():
+    """Delete expired exports and enforce EXPORT_MAX_BYTES."""
+    print(f"Removed {exports.sweep()} export file(s)")
+
+
+@click.command("send-emails")
+@with_appcontext
+def send_emails_command():
+    """Drain due messages from the email outbox (worker.py does this continuously)."""
+    mailer.requeue_stale()
+    sent = 0
+    while True:
+        handled = mailer.deliver_once()
+        if not handled:
+            break
+        sent += handled
+    print(f"Handled {sent} email(s); outbox now {mailer.counts()}")
+
+
+# =========================================
+# Term-end bulk mode (OpenAI Batch API, see bulk.py)
+# =========================================
+bulk_cli = AppGroup("bulk", help="Offline bulk generation through the OpenAI Batch API.")
+
+
+def _bulk_client():
+    client = llm_client.get_client()
+    if not client:
+        raise click.ClickException("Server missing OPENAI_API_KEY")
+    return client
+
+
+@bulk_cli.command("submit")
+@click.option("--user-id", "user_ids", type=int, multiple=True,
+              help="Only these accounts (default: every account on BULK_PLANS).")
+@click.option("--limit", type=int, default=None, help="Maximum rows in this batch.")
+def bulk_submit_command(user_ids, limit):
+    """Send every pending row as one batch."""
+    batch = bulk.create_batch(_bulk_client(), list(user_ids) or None, limit)
+    if batch is None:
+        print("Nothing to submit")
+    else:
+        print(json.dumps(bulk.batch_to_dict(batch)))
+
+
+@bulk_cli.command("poll")
+def bulk_poll_command():
+    """Advance every open batch (safe to re-run after a crash)."""
+    for batch_id, status in bulk.advance_open(_bulk_client(), current_app.logger).items():
+        print(f"{batch_id}: {status}")
+
+
+@bulk_cli.command("status")
+def bulk_status_command():
+    """Show the 20 most recent batches."""
+    for batch in BulkBatch.query.order_by(BulkBatch.id.desc()).limit(20):
+        print(json.dumps(bulk.batch_to_dict(batch)))
+
+
+@bulk_cli.command("cancel")
+@click.argument("batch_id", type=int)
+def bulk_cancel_command(batch_id):
+    """Cancel a batch; lines that already finished are still applied."""
+    batch = db.session.get(BulkBatch, batch_id)
+    if batch is None:
+        raise click.ClickException(f"No bulk batch {batch_id}")
+    print(f"{batch_id}: {bulk.cancel(_bulk_client(), batch)}")
+
+
+def init_app(app):
+    for command in (init_db_command, build_assets_command, sweep_exports_command,
+                    send_emails_command, bulk_cli):
+        app.cli.add_command(command)
@@ -0,0 +1,248 @@
+# exports.py
+# -----------------------------------------
+# Report Rocket – CSV / XLSX exports
+#
+# Exports are produced as a stream of byte chunks straight from the DB
+# rows, so nothing is buffered whole or written to a temp file. XLSX is a
+# minimal SpreadsheetML package written through zipfile onto an
+# unseekable sink (zipfile falls back to data descriptors).
+#
+# The legacy /save_report upload still writes a file; those copies live
+# under exports/<user_id>/<sha256>.<ext> (so identical content is stored
+# once) and are swept by age and total size.
+# -----------------------------------------
+import csv
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports")
+EXPORT_TTL = int(os.getenv("EXPORT_TTL_SECONDS", str(7 * 24 * 3600)))
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", str(200 * 1024 * 1024)))
+SWEEP_INTERVAL = int(os.getenv("EXPORT_SWEEP_SECONDS", "900"))
+
+CHUNK_ROWS = 200
+
+BASIC_COLUMNS = (("Name", "name"), ("Gender", "gender"), ("Report Generated", "report"))
+FULL_COLUMNS = (("Name", "name"), ("Gender", "gender"), ("Class tests", "tests"),
+                ("Homework", "homework"), ("Organisation", "organisation"),
+                ("Participation", "participation"), ("Comments", "comments"),
+                ("Report Generated", "report"))
+
+MIMETYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _value(row, key):
+    value = row.get(key) if isinstance(row, dict) else getattr(row, key, "")
+    return (value or "").strip()
+
+
+# =========================================
+# CSV
+# =========================================
+def csv_chunks(rows, columns=BASIC_COLUMNS):
+    """Yield UTF-8 CSV bytes, CHUNK_ROWS rows at a time."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow([title for title, _ in columns])
+    for n, row in enumerate(rows, 1):
+        w.writerow([_value(row, key) for _, key in columns])
+        if n % CHUNK_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+# =========================================
+# XLSX
+# =========================================
+_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+# XML 1.0 forbids most control characters, even escaped
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        _XML_HEAD +
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        _XML_HEAD +
+        f'<Relationships xmlns="{_NS_PKG}">'
+        f'<Relationship Id="rId1" Type="{_NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        _XML_HEAD +
+        f'<Relationships xmlns="{_NS_PKG}">'
+        f'<Relationship Id="rId1" Type="{_NS_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file object that hands back what was written."""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _cell(value):
+    text = escape(_ILLEGAL_XML.sub("", value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_chunks(rows, columns=BASIC_COLUMNS, sheet_name="Reports"):
+    """Yield a single-sheet .xlsx as it is compressed."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _STATIC_PARTS.items():
+            zf.writestr(name, xml)
+        zf.writestr("xl/workbook.xml", (
+            _XML_HEAD +
+            f'<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><sheets>'
+            f'<sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/>'
+            '</sheets></workbook>'
+        ))
+        yield sink.drain()
+
+        with zf.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write((_XML_HEAD + f'<worksheet xmlns="{_NS_MAIN}"><sheetData>').encode("utf-8"))
+            sheet.write(('<row r="1">' + "".join(_cell(t) for t, _ in columns)
+                         + '</row>').encode("utf-8"))
+            for n, row in enumerate(rows, 2):
+                sheet.write((f'<row r="{n}">' + "".join(_cell(_value(row, k)) for _, k in columns)
+                             + '</row>').encode("utf-8"))
+                if n % CHUNK_ROWS == 0:
+                    yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def zip_chunks(entries, compression=zipfile.ZIP_STORED):
+    """Yield a ZIP of `(name, bytes)` entries, one member at a time."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=compression) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_chunks(fmt, rows, columns=BASIC_COLUMNS, sheet_name="Reports"):
+    if fmt == "xlsx":
+        return xlsx_chunks(rows, columns, sheet_name)
+    return csv_chunks(rows, columns)
+
+
+# =========================================
+# Per-user, content-addressed export copies
+# =========================================
+def user_dir(user_id):
+    return os.path.join(EXPORT_DIR, str(int(user_id)))
+
+
+def store_copy(user_id, fmt, chunks):
+    """Write chunks to exports/<user>/<sha256>.<fmt>; returns the filename.
+
+    Identical content is stored once: a re-export only refreshes the
+    file's mtime so the sweeper treats it as recent.
+    """
+    data = b"".join(chunks)
+    name = f"{hashlib.sha256(data).hexdigest()}.{fmt}"
+    folder = user_dir(user_id)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    start_sweeper()
+    return name
+
+
+def sweep(now=None, ttl=None, max_bytes=None):
+    """Delete exports older than the TTL, then oldest-first down to the size cap."""
+    now = now or time.time()
+    ttl = EXPORT_TTL if ttl is None else ttl
+    max_bytes = EXPORT_MAX_BYTES if max_bytes is None else max_bytes
+
+    files = []
+    for root, _, names in os.walk(EXPORT_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+    removed = 0
+    total = sum(size for _, size, _ in files)
+    for mtime, size, path in sorted(files):
+        if now - mtime <= ttl and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+            total -= size
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_sweeper(logger=None):
+    """Start the background sweep thread once per process."""
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is not None and _sweeper.is_alive():
+            return
+        def loop():
+            while True:
+                try:
+                    sweep()
+                except Exception as e:
+                    if logger:
+                        logger.warning(f"Export sweep failed: {e}")
+                time.sleep(SWEEP_INTERVAL)
+        _sweeper = threading.Thread(target=loop, name="export-sweeper", daemon=True)
+        _sweeper.start()
@@ -0,0 +1,475 @@
+# generation.py
+# -----------------------------------------
+# Report Rocket – prompt building & OpenAI completions
+# -----------------------------------------
+import contextvars
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import length_control
+import llm_client
+import metrics
+import ratelimit
+import report_cache
+
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.7
+SYSTEM_PROMPT = "You are an experienced school teacher."
+
+# How many completions a single batch request may run at once
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "4"))
+# Upper bound on rows accepted by one batch request
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", "60"))
+# Students per packed completion (1 = one completion per student)
+PACK_SIZE = int(os.getenv("GENERATION_PACK_SIZE", "1"))
+MAX_PACK_SIZE = int(os.getenv("MAX_PACK_SIZE", "10"))
+
+# Model per tier, and the tiers each plan may ask for (the first is its default)
+MODEL_TIERS = {
+    tier.strip(): model.strip()
+    for tier, model in (item.split("=") for item in
+                        os.getenv("LLM_MODEL_TIERS", f"standard={MODEL},premium=gpt-4o").split(",")
+                        if "=" in item)
+}
+PLAN_TIERS = {
+    plan.strip(): [t.strip() for t in tiers.split("|")]
+    for plan, tiers in (item.split("=") for item in
+                        os.getenv("LLM_PLAN_TIERS",
+                                  "free=standard,teacher=standard|premium,school=standard|premium").split(",")
+                        if "=" in item)
+}
+
+
+def resolve_model(plan, tier=None):
+    """Model for a `plan` user, or for the requested `tier` if the plan allows it.
+
+    Raises ValueError for a tier the plan can't use.
+    """
+    allowed = PLAN_TIERS.get(plan) or ["standard"]
+    tier = (tier or allowed[0]).strip()
+    if tier not in allowed or tier not in MODEL_TIERS:
+        raise ValueError(f"Model tier '{tier}' is not available on the {plan or 'free'} plan.")
+    return MODEL_TIERS[tier]
+
+
+def _pick(row, header, key, default=""):
+    """Class-level value from `header`, falling back to the row itself."""
+    value = (header or {}).get(key)
+    if value in (None, ""):
+        value = row.get(key)
+    return default if value in (None, "") else value
+
+
+def build_prompt(row, header=None):
+    """Build the user prompt for one student row.
+
+    `header` carries the class-level fields (class, subject, max_words);
+    anything missing there falls back to the row itself, so a single
+    /generate_report payload can be passed as `row` on its own.
+    """
+    # Default to 50 words unless the client passes something else
+    max_words = str(_pick(row, header, "max_words", 50)).strip()
+
+    return (
+        f"Write up to {max_words} words for student {(row.get('name') or '').strip()}.\n"
+        f"Class: {str(_pick(row, header, 'class')).strip()}; "
+        f"Subject: {str(_pick(row, header, 'subject')).strip()}.\n"
+        f"Performance:\n"
+        f"- Class tests: {row.get('tests', '')}\n"
+        f"- Homework: {row.get('homework', '')}\n"
+        f"- Organisation: {row.get('organisation', '')}\n"
+        f"- Participation: {row.get('participation', '')}\n"
+        f"Teacher notes: {row.get('comments', '')}\n"
+        "Be specific, supportive, and do NOT mention gender."
+    )
+
+
+# =========================================
+# Cache glue (see report_cache.py)
+# =========================================
+def cache_key(row, header=None, model=None, user_id=None):
+    """Key for a row's report within `user_id`'s cache, independent of a swappable name."""
+    name = row.get("name")
+    neutral = build_prompt(dict(row, name=report_cache.STUDENT)
+                           if report_cache.swappable(name) else row, header)
+    return report_cache.make_key(neutral, model or MODEL, TEMPERATURE,
+                                 _pick(row, header, "max_words", 50), scope=user_id)
+
+
+def cached_report(row, header=None, model=None, user_id=None):
+    """Return `(key, report)`; report is None on a cache miss."""
+    key = cache_key(row, header, model, user_id)
+    hit = report_cache.get_many([key]).get(key)
+    return key, (report_cache.personalize(hit, row.get("name")) if hit is not None else None)
+
+
+def remember(key, row, report, model=None):
+    report_cache.store_many({key: report_cache.neutralize(report, row.get("name"))}, model or MODEL)
+
+
+def target_words(row, header=None):
+    """The row's word limit as an int (see length_control.target_words)."""
+    return length_control.target_words(_pick(row, header, "max_words", length_control.DEFAULT_WORDS))
+
+
+def _usage(resp):
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None
+    return (getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0)
+
+
+def _complete_with_usage(client, prompt, words, model=None):
+    model = model or MODEL
+    estimate = ratelimit.estimate_tokens(SYSTEM_PROMPT + prompt)
+    ratelimit.acquire(estimate)
+    with metrics.llm_call(model, "chat") as call:
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=TEMPERATURE,
+            **length_control.request_params(words),
+        )
+        usage = call.usage = _usage(resp)
+    ratelimit.settle(estimate, usage)
+    choice = resp.choices[0]
+    text = length_control.finish(model, choice.message.content, words,
+                                 completion_tokens=usage[1] if usage else None,
+                                 truncated=choice.finish_reason == "length")
+    return text, usage
+
+
+def complete(client, prompt, words=length_control.DEFAULT_WORDS, model=None):
+    """Run one chat completion and return the report text, held to `words` words."""
+    return _complete_with_usage(client, prompt, words, model)[0]
+
+
+def complete_stream(client, prompt, words=length_control.DEFAULT_WORDS, model=None):
+    """Run one streamed chat completion, yielding text deltas as they arrive.
+
+    Stops forwarding once the reply runs past `words` words; the caller
+    should still pass the joined text through length_control.fit(). The
+    call is timed until the stream ends and the limiter is settled with
+    the usage chunk, or an estimate when the stream stopped before it.
+    """
+    model = model or MODEL
+    estimate = ratelimit.estimate_tokens(SYSTEM_PROMPT + prompt)
+    ratelimit.acquire(estimate)
+    parts, usage = [], None
+    with metrics.llm_call(model, "stream") as call:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=TEMPERATURE,
+            stream=True,
+            stream_options={"include_usage": True},
+            **length_control.request_params(words),
+        )
+        seen = 0
+        try:
+            for chunk in stream:
+                usage = _usage(chunk) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+                    seen += len(delta.split())
+                    if seen > words:
+                        break
+        except GeneratorExit:
+            pass   # our own client went away; still time and settle the call
+        finally:
+            # Stop reading from OpenAI if we're done with the reply
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        call.usage = usage
+    # ~4 characters per token, as in ratelimit.estimate_tokens()
+    ratelimit.settle(estimate, usage or (len(SYSTEM_PROMPT + prompt) / 4, len("".join(parts)) / 4))
+
+
+def generate_one(client, row, header=None, fresh=False, model=None, user_id=None):
+    """Generate (or fetch from `user_id`'s cache) one report; returns `(report, cached)`."""
+    key = cache_key(row, header, model, user_id)
+    if not fresh:
+        _, hit = cached_report(row, header, model, user_id)
+        if hit is not None:
+            return hit, True
+    text = complete(client, build_prompt(row, header), target_words(row, header), model)
+    remember(key, row, text, model)
+    return text, False
+
+
+# =========================================
+# Packed prompts: several students per completion
+# =========================================
+PACK_SCHEMA = {
+    "name": "student_reports",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "reports": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "string"}, "report": {"type": "string"}},
+                    "required": ["id", "report"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["reports"],
+        "additionalProperties": False,
+    },
+}
+
+_pack_lock = threading.Lock()
+pack_stats = {"packed_calls": 0, "packed_reports": 0, "fallbacks": 0,
+              "tokens_used": 0, "tokens_baseline": 0}
+
+
+def pack_snapshot():
+    """Packed-mode counters plus the estimated tokens saved per report."""
+    with _pack_lock:
+        out = dict(pack_stats)
+    reports = out["packed_reports"] + out["fallbacks"]
+    out["pack_size"] = PACK_SIZE
+    out["tokens_saved_per_report"] = (
+        round((out["tokens_baseline"] - out["tokens_used"]) / reports, 1) if reports else None)
+    return out
+
+
+def _estimate_tokens(text):
+    # ~4 characters per token for English, plus per-message framing
+    return len(text) / 4 + 4
+
+
+def pack_group(row, header=None):
+    """Rows can only share a completion when these prompt fields match."""
+    return (str(_pick(row, header, "class")).strip(),
+            str(_pick(row, header, "subject")).strip(),
+            str(_pick(row, header, "max_words", 50)).strip())
+
+
+def build_packed_prompt(rows, header=None):
+    """One prompt for several students of the same class; ids are s1..sN."""
+    class_name, subject, max_words = pack_group(rows[0], header)
+    parts = [
+        f"Write one report per student below, each up to {max_words} words.\n"
+        f"Class: {class_name}; Subject: {subject}.\n"
+        "Be specific, supportive, and do NOT mention gender. "
+        "Each report must only discuss its own student.\n"
+        'Return JSON {"reports": [{"id": ..., "report": ...}]} with exactly one entry per id.'
+    ]
+    for n, row in enumerate(rows, 1):
+        parts.append(
+            f"[s{n}] Student: {(row.get('name') or '').strip()}\n"
+            f"- Class tests: {row.get('tests', '')}\n"
+            f"- Homework: {row.get('homework', '')}\n"
+            f"- Organisation: {row.get('organisation', '')}\n"
+            f"- Participation: {row.get('participation', '')}\n"
+            f"Teacher notes: {row.get('comments', '')}"
+        )
+    return "\n\n".join(parts)
+
+
+def parse_packed(content, rows, header=None, model=None):
+    """Validate a packed JSON reply; returns {position: report} for good entries.
+
+    Entries are dropped when the id is unknown or repeated, the text is
+    empty or far over the word limit, or it names another student in the
+    pack; those rows fall back to single completions. Kept entries are
+    held to the word limit like single reports.
+    """
+    try:
+        entries = json.loads(content or "").get("reports")
+    except (ValueError, AttributeError):
+        return {}
+    if not isinstance(entries, list):
+        return {}
+    limit = target_words(rows[0], header)
+    names = [(r.get("name") or "").strip() for r in rows]
+    good, seen = {}, set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        rid, text = entry.get("id"), entry.get("report")
+        if not (isinstance(rid, str) and rid[:1] == "s" and rid[1:].isdigit()):
+            continue
+        pos = int(rid[1:]) - 1
+        if not 0 <= pos < len(rows) or pos in seen or not isinstance(text, str):
+            continue
+        seen.add(pos)
+        text = text.strip()
+        words = len(text.split())
+        if not words or words > limit * 1.5 + 10:
+            continue
+        if any(other and other != names[pos] and other in text
+               for i, other in enumerate(names) if i != pos):
+            continue
+        try:
+            good[pos] = length_control.finish(model or MODEL, text, limit)
+        except length_control.EmptyReport:
+            continue
+    return good
+
+
+def complete_packed(client, rows, header=None, model=None):
+    """One structured completion for `rows`; returns `({position: report}, usage, prompt, raw)`."""
+    model = model or MODEL
+    prompt = build_packed_prompt(rows, header)
+    estimate = ratelimit.estimate_tokens(SYSTEM_PROMPT + prompt)
+    ratelimit.acquire(estimate)
+    with metrics.llm_call(model, "packed") as call:
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=TEMPERATURE,
+            response_format={"type": "json_schema", "json_schema": PACK_SCHEMA},
+            **length_control.request_params(target_words(rows[0], header), len(rows)),
+        )
+        usage = call.usage = _usage(resp)
+    raw = resp.choices[0].message.content or ""
+    ratelimit.settle(estimate, usage)
+    return parse_packed(raw, rows, header, model), usage, prompt, raw
+
+
+def _run_pack(client, rows, header=None, model=None):
+    """Generate a pack; returns `[(report, error)]` aligned with `rows`."""
+    try:
+        reports, usage, prompt, raw = complete_packed(client, rows, header, model)
+    except ratelimit.RateLimited as e:
+        # Falling back row by row would only queue behind the same limit
+        return [(None, llm_client.error_message(e))] * len(rows)
+    except Exception:
+        # Whole call failed (API error, refusal, bad JSON): every row retries alone
+        reports, usage, prompt, raw = {}, None, build_packed_prompt(rows, header), ""
+
+    # Tokens the same rows would cost one completion each, scaled by how
+    # far the estimate was off for the packed call we actually made
+    est_packed = _estimate_tokens(SYSTEM_PROMPT) + _estimate_tokens(prompt) + _estimate_tokens(raw)
+    used = sum(usage) if usage else est_packed
+    scale = used / est_packed if usage else 1.0
+    baseline = 0.0
+    out, fallbacks = [], 0
+    for pos, row in enumerate(rows):
+        text = reports.get(pos)
+        baseline += scale * (_estimate_tokens(SYSTEM_PROMPT)
+                             + _estimate_tokens(build_prompt(row, header))
+                             + _estimate_tokens(text or ""))
+        if text is not None:
+            out.append((text, None))
+            continue
+        fallbacks += 1
+        try:
+            text, single_usage = _complete_with_usage(client, build_prompt(row, header),
+                                                      target_words(row, header), model)
+            used += sum(single_usage) if single_usage else 0
+            out.append((text, None))
+        except Exception as e:
+            out.append((None, llm_client.error_message(e)))
+
+    with _pack_lock:
+        pack_stats["packed_calls"] += 1
+        pack_stats["packed_reports"] += len(reports)
+        pack_stats["fallbacks"] += fallbacks
+        pack_stats["tokens_used"] += int(used)
+        pack_stats["tokens_baseline"] += int(baseline)
+    return out
+
+
+def _plan_calls(rows, groups, header, pack):
+    """Split cache-miss groups into calls: `[[key, ...], ...]`, one list per completion."""
+    if pack <= 1:
+        return [[key] for key in groups]
+    buckets = OrderedDict()
+    for key, idxs in groups.items():
+        buckets.setdefault(pack_group(rows[idxs[0]], header), []).append(key)
+    calls = []
+    for keys in buckets.values():
+        calls.extend(keys[i:i + pack] for i in range(0, len(keys), pack))
+    return calls
+
+
+def _run_call(client, rows, header, keys, groups, model=None):
+    """Worker task: `[(key, report, error)]` for one planned call."""
+    if len(keys) == 1:
+        key = keys[0]
+        row = rows[groups[key][0]]
+        try:
+            return [(key, complete(client, build_prompt(row, header), target_words(row, header), model), None)]
+        except Exception as e:
+            return [(key, None, llm_client.error_message(e))]
+    results = _run_pack(client, [rows[groups[k][0]] for k in keys], header, model)
+    return [(key, text, err) for key, (text, err) in zip(keys, results)]
+
+
+def generate_many(client, rows, header=None, max_workers=None, fresh=False, pack=None, model=None,
+                  user_id=None):
+    """Generate reports for many rows with bounded concurrency.
+
+    Yields `(index, report, error, cached)` tuples in completion order;
+    exactly one of `report` / `error` is set. Cache hits come first, rows
+    that share a cache key cost a single completion, and a failing row
+    never aborts the others. `fresh=True` skips cache lookups (results are
+    still stored). `pack` > 1 puts up to that many students of the same
+    class in one structured completion (default GENERATION_PACK_SIZE).
+    `model` defaults to MODEL (see resolve_model()); cache entries are
+    looked up and stored under `user_id`.
+    """
+    if not rows:
+        return
+    pack = max(1, min(PACK_SIZE if pack is None else int(pack), MAX_PACK_SIZE))
+    keys = [cache_key(row, header, model, user_id) for row in rows]
+    hits = {} if fresh else report_cache.get_many(keys)
+
+    groups = OrderedDict()   # key -> row indices still needing a completion
+    for i, key in enumerate(keys):
+        if key in hits:
+            yield i, report_cache.personalize(hits[key], rows[i].get("name")), None, True
+        else:
+            groups.setdefault(key, []).append(i)
+    if not groups:
+        return
+
+    calls = _plan_calls(rows, groups, header, pack)
+    workers = max(1, min(max_workers or GENERATION_CONCURRENCY, len(calls)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generate")
+    to_store = {}
+    try:
+        # Each task runs in a copy of our context so the rate-limit tenant follows it
+        futures = [pool.submit(contextvars.copy_context().run, _run_call,
+                               client, rows, header, call, groups, model)
+                   for call in calls]
+        for fut in as_completed(futures):
+            for key, text, err in fut.result():
+                first, *dupes = groups[key]
+                if err:
+                    for i in groups[key]:
+                        yield i, None, err, False
+                    continue
+                neutral = report_cache.neutralize(text, rows[first].get("name"))
+                to_store[key] = neutral
+                yield first, text, None, False
+                for i in dupes:
+                    yield i, report_cache.personalize(neutral, rows[i].get("name")), None, True
+    finally:
+        # If the consumer stops early (e.g. a streaming client disconnects),
+        # drop the rows that haven't started yet.
+        pool.shutdown(wait=True, cancel_futures=True)
+        report_cache.store_many(to_store, model or MODEL)
@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+# -----------------------------------------
+# Report Rocket – gunicorn hooks
+#
+# gunicorn reads this file from the working directory on its own; the
+# flags in render.yaml's startCommand still set workers/threads/timeout.
+#
+#   - preload_app: the master runs create_app() once and forks workers from
+#     it, so a worker is serving within milliseconds instead of re-importing
+#     everything. The app holds no connections or threads at that point
+#     (see app.py); post_fork still drops the engine's pool to be sure.
+#     The OpenAI SDK is imported in the master too, so workers share it.
+#   - Prometheus multiprocess mode (see metrics.py): each worker writes its
+#     samples under PROMETHEUS_MULTIPROC_DIR, the directory is emptied when
+#     the master starts, and dead workers' files are retired.
+# -----------------------------------------
+import os
+import shutil
+import tempfile
+
+preload_app = True
+
+# Set in the master before workers fork, so every worker inherits it
+MULTIPROC_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "report-rocket-metrics"))
+
+
+def on_starting(server):
+    shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def when_ready(server):
+    # Import the SDK once in the master; each worker still builds its own client
+    if server.cfg.preload_app:
+        import openai  # noqa: F401
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from models import db
+    with server.app.wsgi().app_context():
+        # Never share a pooled DB connection with the master
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
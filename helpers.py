@@ -0,0 +1,61 @@
+# helpers.py
+# -----------------------------------------
+# Report Rocket – request helpers shared by the blueprints
+# -----------------------------------------
+import json
+
+from flask import request, jsonify, Response, stream_with_context
+from flask_login import current_user
+
+import quota
+
+
+def int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# =========================================
+# Streaming helpers
+# =========================================
+def wants_stream():
+    """True when the caller asked for NDJSON (?stream=1 or Accept header)."""
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return "application/x-ndjson" in (request.headers.get("Accept") or "")
+
+
+def wants_fresh(data):
+    """Explicit "force fresh" flag: bypass the generation cache."""
+    flag = data.get("fresh", request.args.get("fresh", ""))
+    return flag is True or str(flag).lower() in ("1", "true", "yes")
+
+
+def ndjson_response(events):
+    """Stream an iterable of dicts as newline-delimited JSON."""
+    def body():
+        for event in events:
+            yield json.dumps(event) + "\n"
+    return Response(
+        stream_with_context(body()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def reserve_reports(n):
+    """Atomically reserve `n` reports; 402 response on failure, else None."""
+    try:
+        quota.reserve(current_user.id, n)
+    except quota.QuotaExceeded as e:
+        return jsonify({"error": f"Free plan limit reached: {e.remaining} report(s) left, "
+                                 f"{n} requested. Please upgrade to continue generating reports."}), 402
+    return None
+
+
+def refund_reports(n, user_id=None):
+    """Return reserved-but-unused reports (failures, cache hits)."""
+    if n:
+        quota.refund(user_id or current_user.id, n)
@@ -0,0 +1,341 @@
+# jobs.py
+# -----------------------------------------
+# Report Rocket – persistent background generation queue
+#
+# The web tier only inserts a GenerationJob plus one GenerationTask per
+# row; worker.py claims pending tasks, runs the completions and writes the
+# reports back into the ClassProfile rows.
+# -----------------------------------------
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func
+
+from models import db, User, ClassProfile, ClassRow, GenerationJob, GenerationTask
+from generation import generate_many, resolve_model
+import llm_client
+import quota
+import ratelimit
+
+log = logging.getLogger(__name__)
+
+# Tasks stuck in "running" longer than this go back to the queue
+LEASE = timedelta(seconds=int(os.getenv("JOB_LEASE_SECONDS", "600")))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Background jobs may queue behind the LLM rate limit longer than a web request
+LIMIT_MAX_WAIT = float(os.getenv("JOB_LIMIT_MAX_WAIT", "120"))
+
+ROW_FIELDS = ("id", "name", "gender", "tests", "homework", "organisation",
+              "participation", "comments")
+
+
+# =========================================
+# Web tier: submit / poll / cancel
+# =========================================
+def submit_job(user_id, profile, rows, fresh=False):
+    """Queue one task per `(row_index, row)` pair in `rows`.
+
+    The caller has already reserved len(rows) reports (quota.reserve);
+    the worker refunds every task that ends up failed, cached or cancelled.
+    """
+    job = GenerationJob(
+        user_id=user_id,
+        profile_id=profile.id,
+        fresh=bool(fresh),
+        header_json={"class": profile.class_name, "subject": profile.subject,
+                     "max_words": profile.max_words},
+        total=len(rows),
+    )
+    db.session.add(job)
+    db.session.flush()
+    db.session.execute(GenerationTask.__table__.insert(), [
+        {"job_id": job.id, "row_index": i, "status": "pending", "attempts": 0,
+         "cached": False, "row_json": {k: r.get(k, "") for k in ROW_FIELDS}}
+        for i, r in rows
+    ])
+    db.session.commit()
+    return job
+
+
+def job_to_dict(job, include_tasks=False):
+    out = {
+        "id": job.id,
+        "profile_id": job.profile_id,
+        "status": job.status,
+        "total": job.total,
+        "completed": job.completed,
+        "failed": job.failed,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if include_tasks:
+        tasks = db.session.execute(
+            select(GenerationTask.row_index, GenerationTask.status,
+                   GenerationTask.report, GenerationTask.error)
+            .where(GenerationTask.job_id == job.id)
+            .order_by(GenerationTask.row_index)
+        ).all()
+        out["tasks"] = [
+            {"index": t.row_index, "status": t.status, "report": t.report, "error": t.error}
+            for t in tasks
+        ]
+    return out
+
+
+def cancel_job(job):
+    """Cancel pending tasks; rows already running finish but aren't written back."""
+    if job.status in ("done", "cancelled"):
+        return job
+    cancelled = db.session.execute(
+        update(GenerationTask)
+        .where(GenerationTask.job_id == job.id, GenerationTask.status == "pending")
+        .values(status="cancelled")
+    ).rowcount or 0
+    job.status = "cancelled"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    quota.refund(job.user_id, cancelled)
+    return job
+
+
+# =========================================
+# Worker side: claim / run / write back
+# =========================================
+def claim_tasks(limit):
+    """Atomically move up to `limit` pending tasks to "running".
+
+    Postgres uses SELECT … FOR UPDATE SKIP LOCKED so concurrent workers
+    never wait on each other; SQLite (no row locks) falls back to a
+    compare-and-set UPDATE tagged with a per-claim token.
+    """
+    token = str(uuid.uuid4())
+    now = datetime.utcnow()
+    pending = (select(GenerationTask.id)
+               .where(GenerationTask.status == "pending")
+               .order_by(GenerationTask.id)
+               .limit(limit))
+
+    if db.engine.dialect.name == "postgresql":
+        ids = db.session.execute(pending.with_for_update(skip_locked=True)).scalars().all()
+    else:
+        ids = db.session.execute(pending).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return []
+
+    db.session.execute(
+        update(GenerationTask)
+        .where(GenerationTask.id.in_(ids), GenerationTask.status == "pending")
+        .values(status="running", claim_token=token, claimed_at=now,
+                attempts=GenerationTask.attempts + 1)
+    )
+    db.session.commit()
+
+    tasks = db.session.execute(
+        select(GenerationTask).where(GenerationTask.claim_token == token)
+        .order_by(GenerationTask.id)
+    ).scalars().all()
+
+    job_ids = {t.job_id for t in tasks}
+    if job_ids:
+        db.session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id.in_(job_ids), GenerationJob.status == "queued")
+            .values(status="running")
+        )
+        db.session.commit()
+    return tasks
+
+
+def requeue_stale(now=None):
+    """Return expired leases to the queue, or fail them after MAX_ATTEMPTS."""
+    cutoff = (now or datetime.utcnow()) - LEASE
+    stale = (GenerationTask.status == "running") & (GenerationTask.claimed_at < cutoff)
+    give_up = stale & (GenerationTask.attempts >= MAX_ATTEMPTS)
+
+    refunds = db.session.execute(
+        select(GenerationJob.user_id, func.count())
+        .join(GenerationTask, GenerationTask.job_id == GenerationJob.id)
+        .where(give_up)
+        .group_by(GenerationJob.user_id)
+    ).all()
+    failed = db.session.execute(
+        update(GenerationTask)
+        .where(give_up)
+        .values(status="failed", error="Gave up after repeated worker timeouts")
+    ).rowcount or 0
+    requeued = db.session.execute(
+        update(GenerationTask)
+        .where(stale)
+        .values(status="pending", claim_token=None, claimed_at=None)
+    ).rowcount or 0
+    db.session.commit()
+    for user_id, n in refunds:
+        quota.refund(user_id, n)
+    return requeued, failed
+
+
+def run_tasks(client, tasks):
+    """Generate every claimed task, grouped by job so headers are shared."""
+    by_job = {}
+    for t in tasks:
+        by_job.setdefault(t.job_id, []).append(t)
+
+    for job_id, job_tasks in by_job.items():
+        job = db.session.get(GenerationJob, job_id)
+        if job is None or job.status == "cancelled":
+            _finish(job_tasks, "cancelled")
+            if job is not None:
+                quota.refund(job.user_id, len(job_tasks))
+            continue
+        rows = [t.row_json or {} for t in job_tasks]
+        results = {}
+        owner = db.session.get(User, job.user_id)
+        plan = owner.plan if owner else None
+        try:
+            with ratelimit.tenant(job.user_id, plan, max_wait=LIMIT_MAX_WAIT):
+                for i, text, err, cached in generate_many(client, rows, job.header_json or {},
+                                                          fresh=job.fresh, model=resolve_model(plan),
+                                                          user_id=job.user_id):
+                    results[i] = (text, err, cached)
+        except Exception as e:
+            # e.g. RateLimited after LIMIT_MAX_WAIT; don't leave the batch
+            # "running" until its lease expires
+            log.warning("Job %s: generation stopped after %d/%d rows: %s",
+                        job_id, len(results), len(job_tasks), e)
+            _release(job, job_tasks, results, e)
+            continue
+        _record(job, job_tasks, results)
+
+
+def _release(job, tasks, results, exc):
+    """Keep the rows that finished; requeue the rest, or fail them after MAX_ATTEMPTS."""
+    db.session.rollback()
+    finished = [i for i in range(len(tasks)) if i in results]
+    if finished:
+        _record(job, [tasks[i] for i in finished], {n: results[i] for n, i in enumerate(finished)})
+    rest = [t for i, t in enumerate(tasks) if i not in results]
+    retry = [t.id for t in rest if t.attempts < MAX_ATTEMPTS]
+    give_up = [t.id for t in rest if t.attempts >= MAX_ATTEMPTS]
+    if retry:
+        db.session.execute(
+            update(GenerationTask)
+            .where(GenerationTask.id.in_(retry))
+            .values(status="pending", claim_token=None, claimed_at=None)
+        )
+    if give_up:
+        db.session.execute(
+            update(GenerationTask)
+            .where(GenerationTask.id.in_(give_up))
+            .values(status="failed", error=llm_client.error_message(exc))
+        )
+        db.session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job.id)
+            .values(failed=GenerationJob.failed + len(give_up))
+        )
+    db.session.commit()
+    quota.refund(job.user_id, len(give_up))
+    _maybe_complete(job.id)
+
+
+def _finish(tasks, status):
+    db.session.execute(
+        update(GenerationTask)
+        .where(GenerationTask.id.in_([t.id for t in tasks]))
+        .values(status=status)
+    )
+    db.session.commit()
+
+
+def _record(job, tasks, results):
+    """Store task outcomes, write reports into the profile, refund unused quota."""
+    done = []
+    charged = 0
+    for i, task in enumerate(tasks):
+        text, err, cached = results.get(i, (None, "No result", False))
+        if err:
+            task.status, task.error = "failed", err
+        else:
+            task.status, task.report, task.cached = "done", text, cached
+            charged += not cached
+            done.append(task)
+
+    n_failed = len(tasks) - len(done)
+    db.session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job.id)
+        .values(completed=GenerationJob.completed + len(done),
+                failed=GenerationJob.failed + n_failed)
+    )
+    db.session.refresh(job, ["status"])
+    if job.status != "cancelled" and done:
+        _write_back(job.profile_id, done)
+    db.session.commit()
+    # Failures and cache hits are free, same as the synchronous endpoints
+    quota.refund(job.user_id, len(tasks) - charged)
+    _maybe_complete(job.id)
+
+
+def _write_back(profile_id, tasks):
+    """Set `report` on the matching ClassRows (same row id and name).
+
+    Rows the teacher deleted or renamed since the job was queued are left
+    alone; their reports stay available on the task.
+    """
+    write_reports(profile_id, {
+        (t.row_json or {}).get("id"): ((t.row_json or {}).get("name", ""), t.report)
+        for t in tasks
+    })
+
+
+def write_reports(profile_id, reports):
+    """Write `{row_id: (name_at_submit, report)}` into a profile's ClassRows.
+
+    Only rows that still exist with the same name are touched; returns the
+    number written. The caller commits.
+    """
+    reports = {rid: v for rid, v in reports.items() if rid is not None}
+    if not reports:
+        return 0
+    current = db.session.execute(
+        select(ClassRow.id, ClassRow.name)
+        .where(ClassRow.profile_id == profile_id, ClassRow.id.in_(reports))
+    ).all()
+    updates = [{"id": rid, "report": reports[rid][1]}
+               for rid, name in current
+               if (name or "") == (reports[rid][0] or "")]
+    if updates:
+        db.session.execute(update(ClassRow), updates)
+        # Open editors must reload before their next row-level PATCH
+        db.session.execute(
+            update(ClassProfile).where(ClassProfile.id == profile_id)
+            .values(version=ClassProfile.version + 1)
+        )
+    return len(updates)
+
+
+def _maybe_complete(job_id):
+    open_tasks = db.session.execute(
+        select(func.count()).select_from(GenerationTask)
+        .where(GenerationTask.job_id == job_id,
+               GenerationTask.status.in_(("pending", "running")))
+    ).scalar()
+    if not open_tasks:
+        db.session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id,
+                   GenerationJob.status.in_(("queued", "running")))
+            .values(status="done", finished_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+
+def work_once(client, batch_size=8):
+    """Claim and process one batch; returns the number of tasks handled."""
+    tasks = claim_tasks(batch_size)
+    if tasks:
+        run_tasks(client, tasks)
+    return len(tasks)
@@ -0,0 +1,146 @@
+# length_control.py
+# -----------------------------------------
+# Report Rocket – keeping reports to the requested length
+#
+# max_words used to be prompt text only, and completions routinely ran to
+# twice the limit. Every completion now carries:
+#
+#   - max_tokens: max_words * GEN_TOKENS_PER_WORD, plus GEN_TOKEN_HEADROOM
+#     so a report can finish its sentence (packed calls add JSON overhead)
+#   - stop "\n\n": a report is one paragraph
+#
+# and the text is held to the limit on our side with fit(): over-long or
+# cut-off replies are trimmed back to their last full sentence. A reply
+# with no words left to keep raises EmptyReport and is handled like any
+# other failed completion (refunded, retried or reported), never saved.
+# Achieved vs. target length is recorded per model for tuning
+# (/llm/stats "length", and the Prometheus metrics).
+# -----------------------------------------
+import math
+import os
+import re
+import threading
+
+import metrics
+
+DEFAULT_WORDS = 50
+MAX_WORDS = int(os.getenv("GEN_MAX_WORDS", "400"))
+TOKENS_PER_WORD = float(os.getenv("GEN_TOKENS_PER_WORD", "1.4"))
+HEADROOM = float(os.getenv("GEN_TOKEN_HEADROOM", "0.15"))
+PACK_OVERHEAD_TOKENS = 20        # {"id": "sN", "report": "..."} framing per student
+STOP = ["\n\n"]
+# A trim may drop at most this share of the words to end on a sentence
+MIN_KEEP = 0.5
+
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s|$)")
+_WORD = re.compile(r"\w")
+
+_lock = threading.Lock()
+_stats = {}   # model -> counters
+
+
+class EmptyReport(ValueError):
+    """The model's reply had no words in it (or none survived trimming)."""
+
+    def __init__(self):
+        super().__init__("empty response")
+
+
+def target_words(value):
+    """The word limit as an int, defaulted and clamped."""
+    try:
+        words = int(str(value).strip())
+    except (TypeError, ValueError):
+        return DEFAULT_WORDS
+    return max(1, min(words, MAX_WORDS))
+
+
+def max_tokens(words, students=1):
+    """Completion token budget for `students` reports of up to `words` each."""
+    per_report = math.ceil(words * TOKENS_PER_WORD * (1 + HEADROOM)) + 8
+    if students == 1:
+        return per_report
+    return students * (per_report + PACK_OVERHEAD_TOKENS) + 10
+
+
+def request_params(words, students=1):
+    """Extra chat.completions arguments for this length."""
+    params = {"max_tokens": max_tokens(words, students)}
+    if students == 1:
+        params["stop"] = STOP
+    return params
+
+
+def fit(text, words, truncated=False):
+    """`(text, trimmed)`: at most `words` words, ending on a full sentence when we can.
+
+    `truncated` says the model was cut off (finish_reason "length"), so an
+    in-limit reply still loses its unfinished last sentence. Raises
+    EmptyReport when no words are left.
+    """
+    text = (text or "").strip()
+    tokens = text.split()
+    if len(tokens) <= words and not truncated:
+        fitted, trimmed = text, False
+    else:
+        head = " ".join(tokens[:words])
+        ends = [m.end() for m in _SENTENCE_END.finditer(head)]
+        if ends and len(head[:ends[-1]].split()) >= MIN_KEEP * min(words, len(tokens)):
+            fitted = head[:ends[-1]]
+        else:
+            fitted = head.rstrip(",;:-– ") + "."
+        trimmed = True
+    if not _WORD.search(fitted):
+        raise EmptyReport()
+    return fitted, trimmed
+
+
+def record(model, target, raw_words, completion_tokens=None, trimmed=False, truncated=False):
+    """Count one finished report against its target length."""
+    with _lock:
+        s = _stats.setdefault(model, {"reports": 0, "target_words": 0, "raw_words": 0,
+                                      "over_limit": 0, "trimmed": 0, "truncated": 0,
+                                      "completion_tokens": 0, "token_reports": 0})
+        s["reports"] += 1
+        s["target_words"] += target
+        s["raw_words"] += raw_words
+        s["over_limit"] += raw_words > target
+        s["trimmed"] += bool(trimmed)
+        s["truncated"] += bool(truncated)
+        if completion_tokens is not None:
+            s["completion_tokens"] += completion_tokens
+            s["token_reports"] += 1
+    metrics.REPORT_LENGTH.labels(model).observe(raw_words / target if target else 0)
+    if trimmed:
+        metrics.LENGTH_ADJUSTED.labels(model, "trimmed").inc()
+    if truncated:
+        metrics.LENGTH_ADJUSTED.labels(model, "truncated").inc()
+
+
+def finish(model, text, words, completion_tokens=None, truncated=False):
+    """fit() + record() for one report; returns the text to keep (or raises EmptyReport)."""
+    raw_words = len((text or "").split())
+    fitted, trimmed = fit(text, words, truncated)
+    record(model, words, raw_words, completion_tokens, trimmed, truncated)
+    return fitted
+
+
+def snapshot():
+    """Per-model achieved/target ratios and adjustment rates."""
+    with _lock:
+        stats = {m: dict(s) for m, s in _stats.items()}
+    out = {}
+    for model, s in stats.items():
+        n = s["reports"] or 1
+        out[model] = {
+            "reports": s["reports"],
+            "avg_target_words": round(s["target_words"] / n, 1),
+            "avg_raw_words": round(s["raw_words"] / n, 1),
+            "achieved_ratio": round(s["raw_words"] / s["target_words"], 3) if s["target_words"] else None,
+            "over_limit_rate": round(s["over_limit"] / n, 3),
+            "trimmed_rate": round(s["trimmed"] / n, 3),
+            "truncated_rate": round(s["truncated"] / n, 3),
+            "completion_tokens_per_report": (round(s["completion_tokens"] / s["token_reports"], 1)
+                                             if s["token_reports"] else None),
+        }
+    return out
@@ -0,0 +1,340 @@
+# llm_client.py
+# -----------------------------------------
+# Report Rocket – outbound OpenAI transport
+#
+# One pooled httpx client per process, shared by every OpenAI call (web
+# requests, worker, bulk mode). Retries, the overall deadline and the
+# circuit breaker live in ResilientTransport underneath the SDK, whose own
+# retries are switched off so the two never stack.
+#
+#   - keep-alive pool sized by LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE;
+#     HTTP/2 with LLM_HTTP2=1 when the optional `h2` package is installed
+#   - per-attempt timeouts, clipped to what's left of LLM_DEADLINE_SECONDS
+#     (kept well under gunicorn's 120s --timeout)
+#   - 408/429/5xx and connection errors are retried with full-jitter
+#     backoff; Retry-After / retry-after-ms win when the server sends them
+#   - LLM_BREAKER_FAILURES consecutive upstream failures open the breaker
+#     for LLM_BREAKER_COOLDOWN seconds: calls fail at once with a 503, then
+#     a single probe decides whether it closes again
+#
+# get_client() builds the client (and imports the OpenAI SDK, ~0.5s) on
+# first use in each process, so app start-up and a preloading gunicorn
+# master never pay for it or hand a connection pool to forked workers.
+# -----------------------------------------
+import email.utils
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+import httpx
+
+import metrics
+import ratelimit
+
+log = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "45"))
+WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "30"))
+POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "5"))
+DEADLINE = float(os.getenv("LLM_DEADLINE_SECONDS", "90"))
+
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("LLM_HTTP2", "0").lower() in ("1", "true", "yes")
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+MAX_RETRY_AFTER = float(os.getenv("LLM_MAX_RETRY_AFTER", "30"))
+
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# Statuses that say the upstream itself is unhealthy (429 is just us being too fast)
+FAILURE_STATUSES = {500, 502, 503, 504}
+CIRCUIT_HEADER = "x-circuit-open"
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open probe -> closed."""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a request may go out now; at most one probe while half-open."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def retry_in(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    def success(self):
+        with self._lock:
+            if self.state != "closed":
+                log.info("OpenAI circuit closed")
+            self.state, self.consecutive, self.opened_at, self.probing = "closed", 0, None, False
+
+    def failure(self):
+        opened = False
+        with self._lock:
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.threshold:
+                if self.state != "open":
+                    log.warning("OpenAI circuit open after %s failure(s)", self.consecutive)
+                    opened = True
+                self.state, self.opened_at, self.probing = "open", time.monotonic(), False
+        if opened:
+            _count(breaker_opened=1)
+
+    def release_probe(self):
+        """A probe that ended without a verdict (e.g. a 4xx) frees the slot."""
+        with self._lock:
+            self.probing = False
+
+
+_stats_lock = threading.Lock()
+stats = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0, "timeouts": 0,
+         "short_circuited": 0, "breaker_opened": 0}
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for k, v in deltas.items():
+            stats[k] += v
+    for k, v in deltas.items():
+        if v:
+            metrics.LLM_HTTP.labels(k).inc(v)
+
+
+def _retry_after(response):
+    """Seconds the server asked us to wait, if it said so."""
+    ms = response.headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(parsed.timestamp() - time.time(), 0.0) if parsed else None
+
+
+def _backoff(attempt):
+    # Full jitter: spreads retries from many threads/workers apart
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """Retry / deadline / circuit-breaker wrapper around an HTTPTransport."""
+
+    def __init__(self, inner, breaker, max_retries=MAX_RETRIES, deadline=DEADLINE):
+        self.inner = inner
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.deadline = deadline
+
+    def handle_request(self, request):
+        _count(requests=1)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                _count(short_circuited=1)
+                return self._open_response(request)
+
+            remaining = self.deadline - (time.monotonic() - started)
+            timeouts = dict(request.extensions.get("timeout") or {})
+            for k in ("connect", "read", "write", "pool"):
+                current = timeouts.get(k)
+                timeouts[k] = remaining if current is None else min(current, remaining)
+            request.extensions["timeout"] = timeouts
+
+            _count(attempts=1)
+            try:
+                response = self.inner.handle_request(request)
+            except httpx.PoolTimeout:
+                # Our own pool is saturated; not the upstream's fault
+                self.breaker.release_probe()
+                raise
+            except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError) as e:
+                _count(failures=1, timeouts=int(isinstance(e, httpx.TimeoutException)))
+                self.breaker.failure()
+                wait = self._next_wait(attempt, started, None)
+                if wait is None:
+                    raise
+                log.info("OpenAI %s; retry %s in %.2fs", type(e).__name__, attempt + 1, wait)
+            else:
+                status = response.status_code
+                if status in FAILURE_STATUSES:
+                    _count(failures=1)
+                    self.breaker.failure()
+                elif status < 400:
+                    self.breaker.success()
+                else:
+                    self.breaker.release_probe()
+                if status not in RETRY_STATUSES:
+                    return response
+                wait = self._next_wait(attempt, started, _retry_after(response))
+                if wait is None:
+                    return response
+                response.close()
+                log.info("OpenAI %s; retry %s in %.2fs", status, attempt + 1, wait)
+
+            _count(retries=1)
+            time.sleep(wait)
+            attempt += 1
+
+    def _next_wait(self, attempt, started, retry_after):
+        """Seconds to sleep before the next attempt, or None to give up."""
+        if attempt >= self.max_retries:
+            return None
+        wait = _backoff(attempt) if retry_after is None else retry_after
+        if wait > MAX_RETRY_AFTER:
+            return None
+        # Leave at least a second for the attempt itself
+        if time.monotonic() - started + wait + 1 > self.deadline:
+            return None
+        return wait
+
+    def _open_response(self, request):
+        retry_in = int(self.breaker.retry_in()) + 1
+        return httpx.Response(
+            503,
+            headers={CIRCUIT_HEADER: "1", "retry-after": str(retry_in)},
+            json={"error": {
+                "message": f"AI service is temporarily unavailable; try again in {retry_in}s.",
+                "type": "circuit_open",
+            }},
+            request=request,
+        )
+
+    def close(self):
+        self.inner.close()
+
+
+def _http2_available():
+    if not HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  (optional dependency of httpx[http2])
+        return True
+    except ImportError:
+        log.warning("LLM_HTTP2 is set but the 'h2' package isn't installed; using HTTP/1.1")
+        return False
+
+
+breaker = CircuitBreaker()
+_transport = None
+
+
+def build_client(api_key, base_url=None):
+    """OpenAI client on the shared pool, or None without an API key."""
+    global _transport
+    if not api_key:
+        return None
+    from openai import OpenAI
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS,
+                          max_keepalive_connections=MAX_KEEPALIVE,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    _transport = ResilientTransport(
+        httpx.HTTPTransport(limits=limits, http2=_http2_available()), breaker)
+    http_client = httpx.Client(
+        transport=_transport,
+        timeout=httpx.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT,
+                              write=WRITE_TIMEOUT, pool=POOL_TIMEOUT),
+    )
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client,
+                  max_retries=0, timeout=http_client.timeout)
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """This process's OpenAI client, built on first use; None without OPENAI_API_KEY.
+
+    OPENAI_BASE_URL lets us point at a local fake server (see
+    bench/fake_openai.py). A forked child builds its own.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client_pid != os.getpid():
+            _client = build_client(os.getenv("OPENAI_API_KEY", "").strip(),
+                                   os.getenv("OPENAI_BASE_URL", "").strip() or None)
+            _client_pid = os.getpid()
+        return _client
+
+
+def _pool_snapshot():
+    pool = getattr(getattr(_transport, "inner", None), "_pool", None)
+    connections = list(getattr(pool, "connections", None) or [])
+    return {
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive": MAX_KEEPALIVE,
+        "http2": bool(getattr(pool, "_http2", False)),
+        "open": len(connections),
+        "idle": sum(1 for c in connections if c.is_idle()),
+        "waiting": len(getattr(pool, "_requests", None) or []),
+    }
+
+
+def snapshot():
+    """Request / retry / breaker counters and pool occupancy for this process."""
+    with _stats_lock:
+        out = dict(stats)
+    out["breaker"] = {"state": breaker.state, "consecutive_failures": breaker.consecutive,
+                      "retry_in": round(breaker.retry_in(), 1)}
+    out["pool"] = _pool_snapshot()
+    return out
+
+
+def _is_api_status_error(exc):
+    # Only a built client raises SDK errors, so there is nothing to check before the import
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(exc, openai.APIStatusError)
+
+
+def is_unavailable(exc):
+    """True when `exc` is the breaker's fail-fast 503."""
+    return (_is_api_status_error(exc)
+            and exc.response is not None
+            and exc.response.headers.get(CIRCUIT_HEADER) == "1")
+
+
+def error_message(exc):
+    """User-facing text for an OpenAI failure."""
+    if isinstance(exc, ratelimit.RateLimited):
+        return str(exc)
+    if is_unavailable(exc):
+        return exc.body.get("message") if isinstance(exc.body, dict) else str(exc)
+    return f"AI error: {exc}"
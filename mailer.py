@@ -0,0 +1,230 @@
+# mailer.py
+# -----------------------------------------
+# Report Rocket – transactional email outbox
+#
+# Web requests never talk to SendGrid. They call `enqueue(...)`, which adds
+# an EmailOutbox row to the current session, so the email commits (or
+# rolls back) together with whatever triggered it. worker.py then drains
+# the outbox with `deliver_once()`:
+#
+#   - rows are claimed the same way as generation tasks (SKIP LOCKED on
+#     Postgres, compare-and-set on SQLite), so several workers can share it
+#   - identical messages (e.g. the welcome email) go out as one SendGrid
+#     request with a personalization per recipient, over a single client
+#   - 429/5xx/network failures retry with jittered exponential backoff,
+#     other errors and EMAIL_MAX_ATTEMPTS failures mark the row "failed"
+#
+# EMAIL_BACKEND=sendgrid|fake picks the sender; it defaults to sendgrid
+# when SENDGRID_API_KEY is set. The fake sink keeps recent messages in
+# memory and, with EMAIL_SINK_PATH, appends them to a JSONL file.
+# -----------------------------------------
+import json
+import logging
+import os
+import random
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func
+
+from models import db, EmailOutbox
+
+log = logging.getLogger(__name__)
+
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+FROM_EMAIL = os.getenv("FROM_EMAIL", "no-reply@report-rocket.com")
+BACKEND = os.getenv("EMAIL_BACKEND", "sendgrid" if SENDGRID_API_KEY else "fake")
+SINK_PATH = os.getenv("EMAIL_SINK_PATH")
+
+BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "100"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE = float(os.getenv("EMAIL_BACKOFF_SECONDS", "30"))
+BACKOFF_MAX = float(os.getenv("EMAIL_BACKOFF_MAX_SECONDS", "3600"))
+# Rows stuck in "sending" longer than this (worker died mid-send) are retried
+LEASE = timedelta(seconds=int(os.getenv("EMAIL_LEASE_SECONDS", "300")))
+MAX_RECIPIENTS = 1000   # SendGrid's personalizations-per-request limit
+
+
+def enqueue(to_email, subject, html):
+    """Queue an email in the caller's transaction; it is sent after commit."""
+    message = EmailOutbox(to_email=to_email, subject=subject, html=html,
+                          status="queued", attempts=0, next_attempt_at=datetime.utcnow())
+    db.session.add(message)
+    return message
+
+
+# =========================================
+# Senders
+# =========================================
+class SendError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class SendGridSender:
+    """One API client for the life of the process (the SDK is imported here, not at start-up)."""
+
+    def __init__(self, api_key=SENDGRID_API_KEY, from_email=FROM_EMAIL):
+        try:
+            from sendgrid import SendGridAPIClient
+            from sendgrid.helpers.mail import Mail
+            from python_http_client.exceptions import HTTPError
+        except ImportError:
+            SendGridAPIClient = None
+        if not (api_key and SendGridAPIClient):
+            raise RuntimeError("EMAIL_BACKEND=sendgrid needs SENDGRID_API_KEY and the sendgrid package")
+        self.client = SendGridAPIClient(api_key)
+        self.from_email = from_email
+        self._mail, self._http_error = Mail, HTTPError
+
+    def send(self, recipients, subject, html):
+        # is_multiple: one personalization each, so recipients never see each other
+        message = self._mail(from_email=self.from_email, to_emails=list(recipients),
+                             subject=subject, html_content=html, is_multiple=True)
+        try:
+            self.client.send(message)
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            if isinstance(e, self._http_error) and status is not None:
+                body = getattr(e, "body", b"")
+                if isinstance(body, bytes):
+                    body = body.decode("utf-8", "replace")
+                raise SendError(f"SendGrid {status}: {body[:500]}",
+                                retryable=status == 429 or status >= 500) from e
+            raise SendError(f"SendGrid unreachable: {e}") from e
+
+
+class FakeSink:
+    """Local/test sender: remembers what would have been sent."""
+
+    def __init__(self, path=SINK_PATH, keep=1000):
+        self.path = path
+        self.sent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def send(self, recipients, subject, html):
+        record = {"to": list(recipients), "subject": subject, "html": html,
+                  "sent_at": datetime.utcnow().isoformat()}
+        with self._lock:
+            self.sent.append(record)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        log.info("Fake email to %s: %s", ", ".join(recipients), subject)
+
+
+_sender = None
+
+
+def get_sender():
+    global _sender
+    if _sender is None:
+        _sender = SendGridSender() if BACKEND == "sendgrid" else FakeSink()
+    return _sender
+
+
+# =========================================
+# Delivery (worker side)
+# =========================================
+def claim(limit=BATCH_SIZE, now=None):
+    """Atomically move up to `limit` due messages to "sending"."""
+    token = str(uuid.uuid4())
+    now = now or datetime.utcnow()
+    due = (select(EmailOutbox.id)
+           .where(EmailOutbox.status == "queued", EmailOutbox.next_attempt_at <= now)
+           .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+           .limit(limit))
+
+    if db.engine.dialect.name == "postgresql":
+        ids = db.session.execute(due.with_for_update(skip_locked=True)).scalars().all()
+    else:
+        ids = db.session.execute(due).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return []
+
+    db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(ids), EmailOutbox.status == "queued")
+        .values(status="sending", claim_token=token, claimed_at=now,
+                attempts=EmailOutbox.attempts + 1)
+    )
+    db.session.commit()
+    return db.session.execute(
+        select(EmailOutbox).where(EmailOutbox.claim_token == token).order_by(EmailOutbox.id)
+    ).scalars().all()
+
+
+def requeue_stale(now=None):
+    """Return messages whose sender vanished mid-send to the queue."""
+    cutoff = (now or datetime.utcnow()) - LEASE
+    requeued = db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.status == "sending", EmailOutbox.claimed_at < cutoff)
+        .values(status="queued", claim_token=None, claimed_at=None)
+    ).rowcount or 0
+    db.session.commit()
+    return requeued
+
+
+def _backoff(attempts):
+    # Full jitter, so a SendGrid outage doesn't end in a synchronized stampede
+    return random.uniform(BACKOFF_BASE / 2, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1)))
+
+
+def _mark_sent(messages, now):
+    for m in messages:
+        m.status, m.sent_at, m.last_error, m.claim_token = "sent", now, None, None
+
+
+def _mark_failed(messages, error, retryable, now):
+    for m in messages:
+        m.last_error, m.claim_token = str(error)[:2000], None
+        if retryable and m.attempts < MAX_ATTEMPTS:
+            m.status = "queued"
+            m.next_attempt_at = now + timedelta(seconds=_backoff(m.attempts))
+        else:
+            m.status = "failed"
+            log.warning("Giving up on email %s to %s: %s", m.id, m.to_email, error)
+
+
+def _send_group(sender, group, now):
+    first = group[0]
+    try:
+        sender.send([m.to_email for m in group], first.subject, first.html)
+    except SendError as e:
+        if e.retryable or len(group) == 1:
+            _mark_failed(group, e, e.retryable, now)
+            return
+        # One bad address rejects the whole request: find it by sending alone
+        for m in group:
+            _send_group(sender, [m], now)
+        return
+    _mark_sent(group, now)
+
+
+def deliver_once(sender=None, limit=BATCH_SIZE):
+    """Claim and send one batch; returns how many messages were handled."""
+    sender = sender or get_sender()
+    messages = claim(limit)
+    if not messages:
+        return 0
+
+    groups = {}
+    for m in messages:
+        groups.setdefault((m.subject, m.html), []).append(m)
+    for group in groups.values():
+        for i in range(0, len(group), MAX_RECIPIENTS):
+            _send_group(sender, group[i:i + MAX_RECIPIENTS], datetime.utcnow())
+    db.session.commit()
+    return len(messages)
+
+
+def counts():
+    """`{status: n}` across the outbox."""
+    return dict(db.session.execute(
+        select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)
+    ).all())
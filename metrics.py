@@ -0,0 +1,182 @@
+# metrics.py
+# -----------------------------------------
+# Report Rocket – Prometheus instrumentation
+#
+#   GET /metrics   (Bearer METRICS_TOKEN when that is set)
+#
+# What's recorded:
+#   - per-endpoint request latency (until the view returns; streamed
+#     bodies keep flowing afterwards) and SQL queries per request
+#   - every SQL statement's duration, by verb, from engine events
+#   - template render time, from Flask's template signals
+#   - OpenAI call latency / outcome / token usage / errors per model, and
+#     the transport's attempts, retries and breaker trips (llm_client.py)
+#   - achieved report length vs. max_words (length_control.py)
+#   - report and anonymous page cache lookups, quota reservations / refunds
+#
+# Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a
+# fresh directory so every worker's samples are merged on scrape. Without
+# the optional prometheus_client package every metric is a no-op.
+# -----------------------------------------
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                                   Counter, Histogram, generate_latest, multiprocess)
+except ImportError:
+    Counter = Histogram = None
+
+ENABLED = Counter is not None and os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+PREFIX = "report_rocket_"
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+QUERY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _histogram(name, doc, labels, buckets):
+    if not ENABLED:
+        return _Noop()
+    return Histogram(PREFIX + name, doc, labels, buckets=buckets)
+
+
+def _counter(name, doc, labels):
+    if not ENABLED:
+        return _Noop()
+    return Counter(PREFIX + name, doc, labels)
+
+
+HTTP_LATENCY = _histogram("http_request_duration_seconds", "Time until the view returned.",
+                          ["endpoint", "method", "status"], LATENCY_BUCKETS)
+HTTP_QUERIES = _histogram("http_request_db_queries", "SQL statements run per request.",
+                          ["endpoint"], COUNT_BUCKETS)
+DB_QUERY = _histogram("db_query_duration_seconds", "SQL statement duration.",
+                      ["verb"], QUERY_BUCKETS)
+TEMPLATE = _histogram("template_render_seconds", "Jinja template render time.",
+                      ["template"], QUERY_BUCKETS + (2.5,))
+LLM_LATENCY = _histogram("llm_request_duration_seconds", "OpenAI call duration, retries included.",
+                         ["model", "call", "outcome"], LATENCY_BUCKETS)
+LLM_TOKENS = _counter("llm_tokens", "Tokens reported by OpenAI.", ["model", "kind"])
+LLM_ERRORS = _counter("llm_errors", "Failed OpenAI calls by exception type.", ["model", "error"])
+LLM_HTTP = _counter("llm_http_events", "Transport events: attempts, retries, failures, breaker.",
+                    ["event"])
+REPORT_LENGTH = _histogram("report_length_ratio", "Words written / max_words, before trimming.",
+                           ["model"], (.5, .75, .9, 1, 1.1, 1.25, 1.5, 2, 3))
+LENGTH_ADJUSTED = _counter("report_length_adjustments", "Reports trimmed or cut off at max_tokens.",
+                           ["model", "kind"])
+CACHE = _counter("report_cache_events", "Report cache lookups and stores.", ["event"])
+PAGE_CACHE = _counter("page_cache_events", "Anonymous page cache hits, 304s, misses and bypasses.",
+                      ["event"])
+QUOTA = _counter("quota_reports", "Reports reserved, rejected and refunded.", ["event"])
+
+_VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+# =========================================
+# Hooks
+# =========================================
+def init_app(app, db):
+    """Register request, template and SQL instrumentation."""
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = 0
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            endpoint = request.endpoint or "unmatched"
+            HTTP_LATENCY.labels(endpoint, request.method, str(response.status_code)).observe(
+                time.perf_counter() - started)
+            HTTP_QUERIES.labels(endpoint).observe(g.pop("_metrics_queries", 0))
+        return response
+
+    def _template_started(sender, template, context, **extra):
+        g.setdefault("_metrics_templates", []).append(time.perf_counter())
+
+    def _template_done(sender, template, context, **extra):
+        stack = g.get("_metrics_templates")
+        if stack:
+            TEMPLATE.labels(template.name or "string").observe(time.perf_counter() - stack.pop())
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_done, app, weak=False)
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _query_done(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_metrics_started")
+        if not stack:
+            return
+        verb = statement.lstrip()[:6].upper()
+        DB_QUERY.labels(verb if verb in _VERBS else "OTHER").observe(time.perf_counter() - stack.pop())
+        if has_request_context() and "_metrics_queries" in g:
+            g._metrics_queries += 1
+
+
+class _LLMCall:
+    usage = None
+
+
+@contextmanager
+def llm_call(model, call):
+    """Time one OpenAI call; set `.usage = (prompt, completion)` inside the block."""
+    record = _LLMCall()
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        LLM_LATENCY.labels(model, call, "error").observe(time.perf_counter() - started)
+        LLM_ERRORS.labels(model, type(e).__name__).inc()
+        raise
+    LLM_LATENCY.labels(model, call, "ok").observe(time.perf_counter() - started)
+    if record.usage:
+        LLM_TOKENS.labels(model, "prompt").inc(record.usage[0])
+        LLM_TOKENS.labels(model, "completion").inc(record.usage[1])
+
+
+# =========================================
+# Exposition
+# =========================================
+def authorized(auth_header):
+    return not TOKEN or auth_header == f"Bearer {TOKEN}"
+
+
+def render():
+    """`(body, content_type)` for /metrics, merged across workers when multiprocess."""
+    if not ENABLED:
+        return None, None
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
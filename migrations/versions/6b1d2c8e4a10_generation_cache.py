@@ -0,0 +1,35 @@
+"""generation cache
+
+Revision ID: 6b1d2c8e4a10
+Revises: f3455e9ceb51
+Create Date: 2025-09-20 09:12:41.508113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b1d2c8e4a10'
+down_revision = 'f3455e9ceb51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(length=64), nullable=False),
+    sa.Column('report', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key', name=op.f('pk_generation_cache'))
+    )
+    with op.batch_alter_table('generation_cache', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_generation_cache_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generation_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_generation_cache_created_at'))
+
+    op.drop_table('generation_cache')
@@ -0,0 +1,70 @@
+"""generation jobs and tasks
+
+Revision ID: a7c3e91f02d4
+Revises: 6b1d2c8e4a10
+Create Date: 2025-09-24 14:31:07.220954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91f02d4'
+down_revision = '6b1d2c8e4a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('profile_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('fresh', sa.Boolean(), nullable=False),
+    sa.Column('header_json', sa.JSON(), nullable=True),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['profile_id'], ['class_profiles.id'], name=op.f('fk_generation_jobs_profile_id_class_profiles'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_generation_jobs_user_id_users')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_generation_jobs'))
+    )
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_generation_jobs_profile_id'), ['profile_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_generation_jobs_user_id'), ['user_id'], unique=False)
+
+    op.create_table('generation_tasks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('row_index', sa.Integer(), nullable=False),
+    sa.Column('row_json', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('claim_token', sa.String(length=36), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('cached', sa.Boolean(), nullable=False),
+    sa.Column('report', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['generation_jobs.id'], name=op.f('fk_generation_tasks_job_id_generation_jobs'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_generation_tasks'))
+    )
+    with op.batch_alter_table('generation_tasks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_generation_tasks_job_id'), ['job_id'], unique=False)
+        batch_op.create_index('ix_generation_tasks_status_id', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generation_tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_generation_tasks_status_id')
+        batch_op.drop_index(batch_op.f('ix_generation_tasks_job_id'))
+
+    op.drop_table('generation_tasks')
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_generation_jobs_user_id'))
+        batch_op.drop_index(batch_op.f('ix_generation_jobs_profile_id'))
+
+    op.drop_table('generation_jobs')
@@ -0,0 +1,78 @@
+"""bulk batches and items (OpenAI Batch API)
+
+Revision ID: b2d7e5a1c94f
+Revises: f19b7a3d5c28
+Create Date: 2025-10-14 10:12:45.503184
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d7e5a1c94f'
+down_revision = 'f19b7a3d5c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bulk_batches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('model', sa.String(length=64), nullable=False),
+    sa.Column('input_file_id', sa.String(length=64), nullable=True),
+    sa.Column('openai_batch_id', sa.String(length=64), nullable=True),
+    sa.Column('openai_status', sa.String(length=20), nullable=True),
+    sa.Column('output_file_id', sa.String(length=64), nullable=True),
+    sa.Column('error_file_id', sa.String(length=64), nullable=True),
+    sa.Column('requests', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('submitted_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_bulk_batches')),
+    sa.UniqueConstraint('openai_batch_id', name=op.f('uq_bulk_batches_openai_batch_id'))
+    )
+    with op.batch_alter_table('bulk_batches', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_bulk_batches_status'), ['status'], unique=False)
+
+    op.create_table('bulk_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('profile_id', sa.Integer(), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('custom_id', sa.String(length=64), nullable=False),
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('row_json', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('report', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['bulk_batches.id'], name=op.f('fk_bulk_items_batch_id_bulk_batches'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['profile_id'], ['class_profiles.id'], name=op.f('fk_bulk_items_profile_id_class_profiles'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_bulk_items_user_id_users')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_bulk_items'))
+    )
+    with op.batch_alter_table('bulk_items', schema=None) as batch_op:
+        batch_op.create_index('ix_bulk_items_batch_id_custom_id', ['batch_id', 'custom_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_bulk_items_profile_id'), ['profile_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_bulk_items_row_id'), ['row_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_bulk_items_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bulk_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_bulk_items_user_id'))
+        batch_op.drop_index(batch_op.f('ix_bulk_items_row_id'))
+        batch_op.drop_index(batch_op.f('ix_bulk_items_profile_id'))
+        batch_op.drop_index('ix_bulk_items_batch_id_custom_id')
+
+    op.drop_table('bulk_items')
+    with op.batch_alter_table('bulk_batches', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_bulk_batches_status'))
+
+    op.drop_table('bulk_batches')
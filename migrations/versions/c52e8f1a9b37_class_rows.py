@@ -0,0 +1,97 @@
+"""class rows table, backfilled from class_profiles.rows_json
+
+Revision ID: c52e8f1a9b37
+Revises: a7c3e91f02d4
+Create Date: 2025-09-29 11:02:55.671230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e8f1a9b37'
+down_revision = 'a7c3e91f02d4'
+branch_labels = None
+depends_on = None
+
+FIELDS = ('name', 'gender', 'tests', 'homework', 'organisation',
+          'participation', 'comments', 'report')
+LIMITS = {'name': 255, 'gender': 40, 'tests': 20, 'homework': 20,
+          'organisation': 20, 'participation': 20}
+
+class_profiles = sa.table('class_profiles',
+    sa.column('id', sa.Integer()),
+    sa.column('rows_json', sa.JSON()),
+)
+class_rows = sa.table('class_rows',
+    sa.column('profile_id', sa.Integer()),
+    sa.column('position', sa.Integer()),
+    *[sa.column(f, sa.Text()) for f in FIELDS]
+)
+
+
+def _clean(row, field):
+    value = str((row or {}).get(field) or '').strip()
+    limit = LIMITS.get(field)
+    return value[:limit] if limit else value
+
+
+def upgrade():
+    op.create_table('class_rows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('profile_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('gender', sa.String(length=40), nullable=False),
+    sa.Column('tests', sa.String(length=20), nullable=False),
+    sa.Column('homework', sa.String(length=20), nullable=False),
+    sa.Column('organisation', sa.String(length=20), nullable=False),
+    sa.Column('participation', sa.String(length=20), nullable=False),
+    sa.Column('comments', sa.Text(), nullable=False),
+    sa.Column('report', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['profile_id'], ['class_profiles.id'], name=op.f('fk_class_rows_profile_id_class_profiles'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_class_rows'))
+    )
+    with op.batch_alter_table('class_rows', schema=None) as batch_op:
+        batch_op.create_index('ix_class_rows_profile_id_position', ['profile_id', 'position'], unique=False)
+
+    # Backfill one ClassRow per entry of every rows_json blob, in chunks
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.select(class_profiles.c.id, class_profiles.c.rows_json)
+        .where(class_profiles.c.rows_json.isnot(None))
+    )
+    batch = []
+    for profile_id, rows in result:
+        for position, row in enumerate(rows or []):
+            if not isinstance(row, dict):
+                continue
+            batch.append(dict({f: _clean(row, f) for f in FIELDS},
+                              profile_id=profile_id, position=position))
+        if len(batch) >= 1000:
+            conn.execute(class_rows.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(class_rows.insert(), batch)
+
+
+def downgrade():
+    # Fold rows back into rows_json before dropping the table
+    conn = op.get_bind()
+    grouped = {}
+    for row in conn.execute(
+        sa.select(class_rows).order_by(class_rows.c.profile_id, class_rows.c.position)
+    ).mappings():
+        grouped.setdefault(row['profile_id'], []).append({f: row[f] for f in FIELDS})
+    for profile_id, rows in grouped.items():
+        conn.execute(
+            class_profiles.update()
+            .where(class_profiles.c.id == profile_id)
+            .values(rows_json=rows)
+        )
+
+    with op.batch_alter_table('class_rows', schema=None) as batch_op:
+        batch_op.drop_index('ix_class_rows_profile_id_position')
+
+    op.drop_table('class_rows')
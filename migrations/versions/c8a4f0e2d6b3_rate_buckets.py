@@ -0,0 +1,31 @@
+"""rate buckets for the shared LLM limiter
+
+Revision ID: c8a4f0e2d6b3
+Revises: b2d7e5a1c94f
+Create Date: 2025-10-15 09:26:51.774020
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8a4f0e2d6b3'
+down_revision = 'b2d7e5a1c94f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_buckets',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('capacity', sa.Float(), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key', name=op.f('pk_rate_buckets'))
+    )
+
+
+def downgrade():
+    op.drop_table('rate_buckets')
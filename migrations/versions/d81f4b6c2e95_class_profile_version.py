@@ -0,0 +1,26 @@
+"""class profile version counter
+
+Revision ID: d81f4b6c2e95
+Revises: c52e8f1a9b37
+Create Date: 2025-10-02 16:47:13.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f4b6c2e95'
+down_revision = 'c52e8f1a9b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('class_profiles', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('class_profiles', schema=None) as batch_op:
+        batch_op.drop_column('version')
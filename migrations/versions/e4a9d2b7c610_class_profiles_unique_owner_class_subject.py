@@ -0,0 +1,66 @@
+"""unique (user_id, class_name, subject) on class_profiles
+
+Revision ID: e4a9d2b7c610
+Revises: d81f4b6c2e95
+Create Date: 2025-10-06 10:18:32.447190
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9d2b7c610'
+down_revision = 'd81f4b6c2e95'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger('alembic.runtime.migration')
+
+CLASS_NAME_LENGTH = 120
+
+class_profiles = sa.table('class_profiles',
+    sa.column('id', sa.Integer()),
+    sa.column('user_id', sa.Integer()),
+    sa.column('class_name', sa.String()),
+    sa.column('subject', sa.String()),
+)
+
+
+def upgrade():
+    # Concurrent saves may already have produced duplicates. Saves went to
+    # .filter_by(...).first(), i.e. the oldest profile of each
+    # (user_id, class_name, subject) group, so that one stays canonical.
+    # The others are kept, with their rows and jobs, under a renamed class
+    # ("7A (duplicate #42)") so the teacher can still open or delete them.
+    conn = op.get_bind()
+    keep = (sa.select(sa.func.min(class_profiles.c.id))
+            .group_by(class_profiles.c.user_id, class_profiles.c.class_name,
+                      class_profiles.c.subject))
+    dupes = conn.execute(
+        sa.select(class_profiles.c.id, class_profiles.c.user_id, class_profiles.c.class_name,
+                  class_profiles.c.subject)
+        .where(class_profiles.c.id.notin_(keep))
+        .order_by(class_profiles.c.id)
+    ).all()
+    for profile_id, user_id, class_name, subject in dupes:
+        suffix = f" (duplicate #{profile_id})"
+        renamed = class_name[:CLASS_NAME_LENGTH - len(suffix)] + suffix
+        log.warning("class_profiles: renaming duplicate profile %s of user %s (%r / %r) to %r",
+                    profile_id, user_id, class_name, subject, renamed)
+        conn.execute(class_profiles.update().where(class_profiles.c.id == profile_id)
+                     .values(class_name=renamed))
+
+    with op.batch_alter_table('class_profiles', schema=None) as batch_op:
+        batch_op.create_index('ix_class_profiles_user_id_class_name_subject',
+                              ['user_id', 'class_name', 'subject'], unique=True)
+        # The composite index's leading column covers user_id lookups
+        batch_op.drop_index(batch_op.f('ix_class_profiles_user_id'))
+
+
+def downgrade():
+    with op.batch_alter_table('class_profiles', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_class_profiles_user_id'), ['user_id'], unique=False)
+        batch_op.drop_index('ix_class_profiles_user_id_class_name_subject')
@@ -0,0 +1,30 @@
+"""class profile created_at / updated_at
+
+Revision ID: f19b7a3d5c28
+Revises: e4a9d2b7c610
+Create Date: 2025-10-09 13:40:06.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19b7a3d5c28'
+down_revision = 'e4a9d2b7c610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('class_profiles', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False))
+        batch_op.create_index('ix_class_profiles_user_id_created_at', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('class_profiles', schema=None) as batch_op:
+        batch_op.drop_index('ix_class_profiles_user_id_created_at')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
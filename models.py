@@ -3,7 +3,8 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+
+import passwords
 
 # Naming convention helps migrations on Postgres
 convention = {
@@ -16,7 +17,7 @@ convention = {
 db = SQLAlchemy(metadata=MetaData(naming_convention=convention))
 
 class User(db.Model, UserMixin):
-    __tablename__ = "user"   # <-- not "user"
+    __tablename__ = "users"   # <-- not "user"
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -27,18 +28,171 @@ class User(db.Model, UserMixin):
     reports_used = db.Column(db.Integer, default=0, nullable=False)
     reports_limit = db.Column(db.Integer, nullable=True)  # null = unlimited
 
+    # Both hash on passwords.py's bounded pool and may raise passwords.Overloaded
     def set_password(self, raw):
-        self.password_hash = generate_password_hash(raw)
+        self.password_hash = passwords.hash_password(raw)
 
     def check_password(self, raw):
-        return check_password_hash(self.password_hash, raw)
+        return passwords.verify_password(self.password_hash, raw)
+
+    def upgrade_password(self, raw):
+        """After a successful check, re-hash if the hash parameters changed."""
+        new = passwords.rehash_if_needed(self.password_hash, raw)
+        if new:
+            self.password_hash = new
+        return bool(new)
 
 class ClassProfile(db.Model):
     __tablename__ = "class_profiles"
+    # One profile per (user, class, subject); also serves user_id lookups
+    # and is the conflict target of the save upsert.
+    __table_args__ = (
+        db.Index("ix_class_profiles_user_id_class_name_subject",
+                 "user_id", "class_name", "subject", unique=True),
+        # Keyset pagination of a user's profiles, newest first
+        db.Index("ix_class_profiles_user_id_created_at", "user_id", "created_at", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     class_name = db.Column(db.String(120), nullable=False)
     subject = db.Column(db.String(120), nullable=False)
     max_words = db.Column(db.Integer, default=50, nullable=False)  # or 50 if you changed default
-    # JSON storage for rows (if you’re not using a child table)
+    # Bumped on every write; clients send it back to detect conflicting edits
+    version = db.Column(db.Integer, default=1, nullable=False, server_default="1")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False,
+                           server_default=db.func.now())
+    # Drives ETag / Last-Modified on profile fetches; every write path bumps it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           nullable=False, server_default=db.func.now())
+    # Legacy JSON storage for rows; superseded by ClassRow (kept for rollback)
     rows_json = db.Column(db.JSON, nullable=True)
+
+    rows = db.relationship("ClassRow", order_by="ClassRow.position",
+                           cascade="all, delete-orphan", passive_deletes=True)
+
+class ClassRow(db.Model):
+    """One student row of a ClassProfile."""
+    __tablename__ = "class_rows"
+    __table_args__ = (db.Index("ix_class_rows_profile_id_position", "profile_id", "position"),)
+    id = db.Column(db.Integer, primary_key=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey("class_profiles.id", ondelete="CASCADE"),
+                           nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    name = db.Column(db.String(255), nullable=False, default="")
+    gender = db.Column(db.String(40), nullable=False, default="")
+    tests = db.Column(db.String(20), nullable=False, default="")
+    homework = db.Column(db.String(20), nullable=False, default="")
+    organisation = db.Column(db.String(20), nullable=False, default="")
+    participation = db.Column(db.String(20), nullable=False, default="")
+    comments = db.Column(db.Text, nullable=False, default="")
+    report = db.Column(db.Text, nullable=False, default="")
+
+class GenerationCache(db.Model):
+    """Persistent tier of report_cache: one generated report per prompt hash."""
+    __tablename__ = "generation_cache"
+    key = db.Column(db.String(64), primary_key=True)   # sha256 hex
+    model = db.Column(db.String(64), nullable=False)
+    report = db.Column(db.Text, nullable=False)        # with name placeholders
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class GenerationJob(db.Model):
+    """A class-wide generation request processed by worker.py."""
+    __tablename__ = "generation_jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey("class_profiles.id", ondelete="CASCADE"),
+                           nullable=False, index=True)
+    # queued -> running -> done | cancelled
+    status = db.Column(db.String(20), default="queued", nullable=False)
+    fresh = db.Column(db.Boolean, default=False, nullable=False)
+    header_json = db.Column(db.JSON, nullable=True)     # class / subject / max_words
+    total = db.Column(db.Integer, default=0, nullable=False)
+    completed = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class GenerationTask(db.Model):
+    """One student row of a GenerationJob."""
+    __tablename__ = "generation_tasks"
+    __table_args__ = (db.Index("ix_generation_tasks_status_id", "status", "id"),)
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey("generation_jobs.id", ondelete="CASCADE"),
+                       nullable=False, index=True)
+    row_index = db.Column(db.Integer, nullable=False)
+    row_json = db.Column(db.JSON, nullable=False)        # snapshot of the row at submit
+    # pending -> running -> done | failed | cancelled
+    status = db.Column(db.String(20), default="pending", nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    claim_token = db.Column(db.String(36), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    cached = db.Column(db.Boolean, default=False, nullable=False)
+    report = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+class BulkBatch(db.Model):
+    """One OpenAI Batch API submission covering many classes (see bulk.py)."""
+    __tablename__ = "bulk_batches"
+    id = db.Column(db.Integer, primary_key=True)
+    # building -> submitted -> completed -> applied, or failed/expired/cancelled -> applied
+    status = db.Column(db.String(20), default="building", nullable=False, index=True)
+    model = db.Column(db.String(64), nullable=False)
+    input_file_id = db.Column(db.String(64), nullable=True)
+    openai_batch_id = db.Column(db.String(64), nullable=True, unique=True)
+    openai_status = db.Column(db.String(20), nullable=True)
+    output_file_id = db.Column(db.String(64), nullable=True)
+    error_file_id = db.Column(db.String(64), nullable=True)
+    requests = db.Column(db.Integer, default=0, nullable=False)   # lines in the JSONL
+    total = db.Column(db.Integer, default=0, nullable=False)      # rows covered
+    completed = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    submitted_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class BulkItem(db.Model):
+    """One ClassRow in a BulkBatch; rows sharing a cache key share a custom_id."""
+    __tablename__ = "bulk_items"
+    __table_args__ = (db.Index("ix_bulk_items_batch_id_custom_id", "batch_id", "custom_id"),)
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey("bulk_batches.id", ondelete="CASCADE"),
+                         nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey("class_profiles.id", ondelete="CASCADE"),
+                           nullable=False, index=True)
+    row_id = db.Column(db.Integer, nullable=False, index=True)    # ClassRow.id at submit
+    custom_id = db.Column(db.String(64), nullable=False)
+    cache_key = db.Column(db.String(64), nullable=False)
+    row_json = db.Column(db.JSON, nullable=False)                 # snapshot incl. header
+    # pending -> done | failed
+    status = db.Column(db.String(20), default="pending", nullable=False)
+    report = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+class RateBucket(db.Model):
+    """Shared token bucket for outbound LLM calls (see ratelimit.py)."""
+    __tablename__ = "rate_buckets"
+    key = db.Column(db.String(64), primary_key=True)       # "global:rpm", "user:42:tpm", ...
+    tokens = db.Column(db.Float, nullable=False)
+    capacity = db.Column(db.Float, nullable=False)
+    rate = db.Column(db.Float, nullable=False)              # tokens refilled per second
+    updated_at = db.Column(db.Float, nullable=False)        # unix time of the last refill
+
+class EmailOutbox(db.Model):
+    """Queued transactional email, written with the change that triggers it (see mailer.py)."""
+    __tablename__ = "email_outbox"
+    __table_args__ = (db.Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),)
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    # queued -> sending -> sent | failed (back to queued with a later next_attempt_at on retry)
+    status = db.Column(db.String(20), default="queued", nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claim_token = db.Column(db.String(36), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,66 @@
+# ops.py
+# -----------------------------------------
+# Report Rocket – per-worker counters and the Prometheus endpoint
+#
+# Everything here is for operators, not account holders: each endpoint
+# wants the same Bearer METRICS_TOKEN as /metrics (open only when no
+# token is configured, i.e. local dev).
+# -----------------------------------------
+from functools import wraps
+
+from flask import Blueprint, request, jsonify, Response
+
+from generation import pack_snapshot
+import length_control
+import llm_client
+import metrics
+import page_cache
+import passwords
+import ratelimit
+import report_cache
+import user_cache
+
+bp = Blueprint("ops", __name__)
+
+
+def token_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not metrics.authorized(request.headers.get("Authorization")):
+            return jsonify(error="Unauthorized"), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@bp.route("/cache/stats", methods=["GET"])
+@token_required
+def cache_stats():
+    """Hit/miss counters for this worker's generation cache, packed mode and page cache."""
+    return jsonify(dict(report_cache.snapshot(), packing=pack_snapshot(),
+                        pages=page_cache.snapshot()))
+
+
+@bp.route("/llm/stats", methods=["GET"])
+@token_required
+def llm_stats():
+    """Outbound OpenAI pool, retry, circuit-breaker, rate-limit and report length counters for this worker."""
+    return jsonify(dict(llm_client.snapshot(), ratelimit=ratelimit.snapshot(),
+                        length=length_control.snapshot()))
+
+
+@bp.route("/auth/stats", methods=["GET"])
+@token_required
+def auth_stats():
+    """Password-hashing pool and user-loader cache counters for this worker."""
+    return jsonify(dict(passwords.snapshot(), user_cache=user_cache.snapshot()))
+
+
+@bp.route("/metrics", methods=["GET"])
+@token_required
+def metrics_endpoint():
+    """Prometheus exposition (all gunicorn workers when multiprocess mode is on)."""
+    body, content_type = metrics.render()
+    if body is None:
+        return jsonify(error="Metrics are disabled (prometheus_client not installed)"), 503
+    return Response(body, content_type=content_type)
+
@@ -0,0 +1,140 @@
+# page_cache.py
+# -----------------------------------------
+# Report Rocket – full-page cache for anonymous public pages
+#
+# home, pricing, school, terms and privacy render the same bytes for every
+# visitor without a session, and Render's health check polls "/". The
+# first anonymous render of each page is kept in worker memory with a
+# strong ETag ("<DEPLOY_ID>-<sha256 of the body>"). Later anonymous GET /
+# HEAD requests are answered by a WSGI middleware in front of Flask: no
+# request context, session, Flask-Login or Jinja. A matching
+# If-None-Match gets a 304.
+#
+# Requests carrying the session or remember-me cookie always go through
+# Flask. Entries are keyed by scheme, Host and path: school.html renders
+# absolute URLs (canonical link, JSON-LD) from the request, so a forged
+# Host header must only ever get its own copy back, and at most
+# PAGE_CACHE_MAX_ENTRIES copies are kept. The query string is ignored
+# (these views never read it), so ?utm_… links share one entry. The cache starts empty in every new
+# worker, and DEPLOY_ID (Render's RENDER_GIT_COMMIT unless set) changes
+# the ETags with each deploy. Entries expire after PAGE_CACHE_TTL.
+# -----------------------------------------
+import hashlib
+import os
+import threading
+import time
+
+from flask import request, session
+from flask_login import current_user
+from werkzeug.http import parse_cookie, parse_etags, quote_etag
+
+import metrics
+
+ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+TTL = float(os.getenv("PAGE_CACHE_TTL", "600"))
+MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "64"))
+DEPLOY_ID = (os.getenv("DEPLOY_ID") or os.getenv("RENDER_GIT_COMMIT") or "dev")[:12]
+ENDPOINTS = ("pages.home", "pages.pricing", "pages.school", "pages.terms", "pages.privacy")
+# Browsers and shared caches revalidate every time (a 304 costs ~nothing),
+# and never hand the anonymous page to someone who has a session cookie
+CACHE_CONTROL = "public, no-cache"
+
+_ENVIRON_KEY = "report_rocket.page_cache"
+
+_lock = threading.Lock()
+_pages = {}   # (scheme, host, path) -> (expires, etag header, content type, body)
+stats = {"hits": 0, "not_modified": 0, "misses": 0, "stores": 0, "bypassed": 0, "full": 0}
+
+
+def _key(environ):
+    """What the rendered page depends on: the same scheme and host url_for() uses."""
+    host = environ.get("HTTP_HOST") or f"{environ.get('SERVER_NAME')}:{environ.get('SERVER_PORT')}"
+    return environ.get("wsgi.url_scheme"), host.lower(), environ.get("PATH_INFO")
+
+
+def _count(event):
+    with _lock:
+        stats[event] += 1
+    metrics.PAGE_CACHE.labels(event).inc()
+
+
+class PageCacheMiddleware:
+    """Serve cached pages to cookie-less GET/HEAD requests before Flask sees them."""
+
+    def __init__(self, wsgi_app, paths, cookie_names):
+        self.wsgi_app = wsgi_app
+        self.paths = frozenset(paths)
+        self.cookie_names = tuple(cookie_names)
+
+    def __call__(self, environ, start_response):
+        method = environ.get("REQUEST_METHOD")
+        path = environ.get("PATH_INFO")
+        if method not in ("GET", "HEAD") or path not in self.paths:
+            return self.wsgi_app(environ, start_response)
+        if "HTTP_COOKIE" in environ:
+            cookies = parse_cookie(environ)
+            if any(name in cookies for name in self.cookie_names):
+                _count("bypassed")
+                return self.wsgi_app(environ, start_response)
+
+        key = _key(environ)
+        entry = _pages.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            _count("misses")
+            environ[_ENVIRON_KEY] = key
+            return self.wsgi_app(environ, start_response)
+
+        _, etag, content_type, body = entry
+        headers = [("ETag", etag), ("Cache-Control", CACHE_CONTROL), ("Vary", "Cookie")]
+        if parse_etags(environ.get("HTTP_IF_NONE_MATCH")).contains(etag[1:-1]):
+            _count("not_modified")
+            start_response("304 NOT MODIFIED", headers)
+            return []
+        _count("hits")
+        headers += [("Content-Type", content_type), ("Content-Length", str(len(body)))]
+        start_response("200 OK", headers)
+        return [] if method == "HEAD" else [body]
+
+
+def _store(response):
+    """after_request: keep an anonymous miss's rendered page and tag it."""
+    key = request.environ.get(_ENVIRON_KEY)
+    if (key is None or response.status_code != 200 or response.is_streamed
+            or session.modified or current_user.is_authenticated):
+        return response
+    body = response.get_data()
+    tag = f"{DEPLOY_ID}-{hashlib.sha256(body).hexdigest()[:16]}"
+    now = time.monotonic()
+    with _lock:
+        if key not in _pages and len(_pages) >= MAX_ENTRIES:
+            for stale in [k for k, entry in _pages.items() if entry[0] < now]:
+                del _pages[stale]
+        full = key not in _pages and len(_pages) >= MAX_ENTRIES
+        if not full:
+            _pages[key] = (now + TTL, quote_etag(tag), response.content_type, body)
+    _count("full" if full else "stores")
+    response.set_etag(tag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.vary.add("Cookie")
+    return response.make_conditional(request)
+
+
+def clear():
+    with _lock:
+        _pages.clear()
+
+
+def snapshot():
+    with _lock:
+        return dict(stats, entries=len(_pages), max_entries=MAX_ENTRIES, ttl=TTL, deploy_id=DEPLOY_ID, enabled=ENABLED)
+
+
+def init_app(app):
+    """Wrap app.wsgi_app; call after the page blueprint is registered."""
+    if not ENABLED:
+        return
+    paths = [rule.rule for rule in app.url_map.iter_rules() if rule.endpoint in ENDPOINTS]
+    cookie_names = (app.config["SESSION_COOKIE_NAME"],
+                    app.config.get("REMEMBER_COOKIE_NAME", "remember_token"))
+    app.after_request(_store)
+    app.wsgi_app = PageCacheMiddleware(app.wsgi_app, paths, cookie_names)
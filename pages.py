@@ -0,0 +1,51 @@
+# pages.py
+# -----------------------------------------
+# Report Rocket – public pages and the report UI
+# -----------------------------------------
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request
+from flask_login import login_required
+
+bp = Blueprint("pages", __name__)
+
+
+# =========================================
+# Routes – Public pages
+# =========================================
+@bp.route("/")
+def home():
+    return render_template("home.html")
+
+@bp.route("/pricing")
+def pricing():
+    return render_template("pricing.html")
+
+@bp.route("/school", methods=["GET"])
+def school():
+    return render_template("school.html")
+
+@bp.route("/school-trial", methods=["POST"])
+def school_trial():
+    # Simple capture; later store in DB or send a notification email
+    payload = {k: request.form.get(k, "") for k in
+               ("name", "role", "email", "website", "variant")}
+    accepted = bool(request.form.get("terms"))
+    current_app.logger.info("School trial request: %r | accepted terms=%s", payload, accepted)
+    flash("Thanks! We'll be in touch shortly with your trial details.", "success")
+    return redirect(url_for("pages.school"))
+
+@bp.route("/terms")
+def terms():
+    return render_template("terms.html")
+
+@bp.route("/privacy")
+def privacy():
+    return render_template("privacy.html")
+
+
+# =========================================
+# Report UI (template only)
+# =========================================
+@bp.route("/report", methods=["GET"])
+@login_required
+def report():
+    return render_template("report.html")
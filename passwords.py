@@ -0,0 +1,128 @@
+# passwords.py
+# -----------------------------------------
+# Report Rocket – password hashing off the request threads
+#
+# Hashing is deliberately slow, and at 8am every teacher logs in at once.
+# Running it inline lets a login burst occupy every gunicorn thread, so
+# hashes run on a small dedicated pool instead:
+#
+#   - PASSWORD_HASH_WORKERS threads do the work (hashlib's scrypt/pbkdf2
+#     release the GIL, so these really run in parallel)
+#   - at most PASSWORD_HASH_MAX_QUEUE more may wait; beyond that, or after
+#     PASSWORD_HASH_WAIT_SECONDS, callers get Overloaded and the route
+#     answers 503 + Retry-After instead of piling up
+#   - PASSWORD_HASH_METHOD is any Werkzeug method string, e.g.
+#     "scrypt:32768:8:1" or "pbkdf2:sha256:600000"; hashes made with other
+#     parameters are upgraded on the next successful login (needs_rehash)
+# -----------------------------------------
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))
+WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", "10"))
+
+
+class Overloaded(Exception):
+    """Too many hashes queued; try again shortly."""
+
+    def __init__(self, retry_after=2):
+        self.retry_after = retry_after
+        super().__init__("Sign-in is busy right now; please try again in a moment.")
+
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="pwhash")
+_slots = threading.BoundedSemaphore(WORKERS + MAX_QUEUE)
+
+_stats_lock = threading.Lock()
+stats = {"in_flight": 0, "running": 0, "completed": 0, "shed": 0, "timeouts": 0,
+         "rehashed": 0, "wait_seconds": 0.0, "hash_seconds": 0.0}
+_prefix = None
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for k, v in deltas.items():
+            stats[k] += v
+
+
+def _timed(fn, args, submitted):
+    started = time.monotonic()
+    _count(running=1, wait_seconds=started - submitted)
+    try:
+        return fn(*args)
+    finally:
+        _count(running=-1, completed=1, hash_seconds=time.monotonic() - started)
+
+
+def _run(fn, *args):
+    """Run `fn(*args)` on the hashing pool, or raise Overloaded."""
+    if not _slots.acquire(blocking=False):
+        _count(shed=1)
+        raise Overloaded()
+    _count(in_flight=1)
+    try:
+        future = _pool.submit(_timed, fn, args, time.monotonic())
+    except Exception:
+        _release()
+        raise
+    # The slot stays taken until the hash really finishes, even if we stop waiting
+    future.add_done_callback(_release)
+    try:
+        return future.result(timeout=WAIT_SECONDS)
+    except FutureTimeout:
+        future.cancel()
+        _count(timeouts=1)
+        raise Overloaded()
+
+
+def _release(_future=None):
+    _count(in_flight=-1)
+    _slots.release()
+
+
+def hash_password(raw):
+    return _run(generate_password_hash, raw, METHOD, SALT_LENGTH)
+
+
+def verify_password(stored, raw):
+    return bool(stored) and _run(check_password_hash, stored, raw)
+
+
+def current_prefix():
+    """`method:params` that new hashes start with, e.g. "scrypt:32768:8:1"."""
+    global _prefix
+    if _prefix is None:
+        # Werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1"); ask it once
+        _prefix = generate_password_hash("", METHOD, 1).split("$", 1)[0]
+    return _prefix
+
+
+def needs_rehash(stored):
+    return bool(stored) and stored.split("$", 1)[0] != current_prefix()
+
+
+def rehash_if_needed(stored, raw):
+    """A new hash of `raw` if `stored` used other parameters, else None."""
+    if not needs_rehash(stored):
+        return None
+    new = hash_password(raw)
+    _count(rehashed=1)
+    return new
+
+
+def snapshot():
+    with _stats_lock:
+        out = dict(stats)
+    done = out["completed"] or 1
+    out["avg_wait_ms"] = round(1000 * out.pop("wait_seconds") / done, 1)
+    out["avg_hash_ms"] = round(1000 * out.pop("hash_seconds") / done, 1)
+    out["queued"] = max(out["in_flight"] - out["running"], 0)
+    out.update(workers=WORKERS, max_queue=MAX_QUEUE, method=current_prefix())
+    return out
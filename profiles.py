@@ -0,0 +1,599 @@
+# profiles.py
+# -----------------------------------------
+# Report Rocket – saved classes (ClassProfile + rows)
+#
+# Save / patch / list / fetch with optimistic versioning and conditional
+# GETs, CSV/XLSX export and report cards, CSV/XLSX roster import, and the
+# background generation jobs that run over a saved class (see jobs.py /
+# worker.py).
+# -----------------------------------------
+import base64
+import os
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify, url_for, Response, stream_with_context
+from flask_login import login_required, current_user
+from sqlalchemy import select, insert, update, delete, func, or_
+from werkzeug.utils import secure_filename
+
+from models import db, ClassProfile, ClassRow, GenerationJob
+
+from helpers import wants_fresh, reserve_reports, int_or_none
+import exports
+import jobs
+import report_cards
+import roster
+
+bp = Blueprint("profiles", __name__)
+
+
+# =========================================
+# Helpers for ClassProfile rows
+# =========================================
+def _profile_to_dict(profile, include_rows=True):
+    """Return a dict for API responses."""
+    out = {
+        "id": profile.id,
+        "class_name": profile.class_name,
+        "subject": profile.subject,
+        "max_words": profile.max_words,
+        "version": profile.version,
+    }
+    if not include_rows:
+        return out
+
+    out["rows"] = [{
+        "id": r.id,
+        "name": r.name or "",
+        "gender": r.gender or "",
+        "tests": r.tests or "",
+        "homework": r.homework or "",
+        "organisation": r.organisation or "",
+        "participation": r.participation or "",
+        "comments": r.comments or "",
+        "report": r.report or "",
+    } for r in profile.rows]
+    return out
+
+
+ROW_FIELDS = ("name", "gender", "tests", "homework", "organisation",
+              "participation", "comments", "report")
+# Column widths for the short ClassRow fields (longer input is clipped)
+ROW_FIELD_LIMITS = {"name": 255, "gender": 40, "tests": 20, "homework": 20,
+                    "organisation": 20, "participation": 20}
+
+
+def _clean_row(r):
+    """Strip every field and clip short ones to their column width."""
+    out = {}
+    for k in ROW_FIELDS:
+        v = (str(r.get(k) or "")).strip()
+        limit = ROW_FIELD_LIMITS.get(k)
+        out[k] = v[:limit] if limit else v
+    return out
+
+
+def _replace_rows(profile_id, rows, is_new=False):
+    """Write rows to a profile's ClassRows.
+
+    This is a keyed diff: incoming rows match existing ones
+    by "id" (as returned by /class_profile/<id>/full) or, failing that, by
+    position. Only changed rows are written, as one bulk INSERT, one bulk
+    UPDATE and one DELETE; `is_new` skips reading rows that can't exist.
+    Returns the saved row ids in order.
+    """
+    existing = {} if is_new else {
+        r.id: r for r in db.session.execute(
+            select(ClassRow.__table__).where(ClassRow.profile_id == profile_id)
+        ).all()
+    }
+    by_position = {r.position: r.id for r in existing.values()}
+
+    # First claim explicit ids, then fall back to the row at that position
+    incoming = [(pos, _clean_row(r), r.get("id")) for pos, r in enumerate(rows or [])]
+    claimed = {rid for _, _, rid in incoming if rid in existing}
+    matched = []
+    for pos, clean, rid in incoming:
+        if rid not in existing:
+            rid = by_position.get(pos)
+            if rid is None or rid in claimed:
+                rid = None
+            else:
+                claimed.add(rid)
+        matched.append((pos, clean, rid))
+
+    inserts, updates = [], []
+    for pos, clean, rid in matched:
+        if rid is None:
+            inserts.append(dict(clean, profile_id=profile_id, position=pos))
+            continue
+        old = existing[rid]
+        if old.position != pos or any(getattr(old, k) != clean[k] for k in ROW_FIELDS):
+            updates.append(dict(clean, id=rid, position=pos))
+    deletes = [rid for rid in existing if rid not in claimed]
+
+    if deletes:
+        db.session.execute(delete(ClassRow).where(ClassRow.id.in_(deletes)))
+    if updates:
+        db.session.execute(update(ClassRow), updates)
+    new_ids = iter(())
+    if inserts:
+        # Plain executemany + one SELECT: INSERT … RETURNING with ordered
+        # results degrades to one statement per row on SQLite.
+        db.session.execute(insert(ClassRow), inserts)
+        new_ids = iter(db.session.execute(
+            select(ClassRow.id)
+            .where(ClassRow.profile_id == profile_id,
+                   ClassRow.position.in_([r["position"] for r in inserts]))
+            .order_by(ClassRow.position)
+        ).scalars().all())
+
+    # Ids in row order without re-reading the table
+    return [rid if rid is not None else next(new_ids) for _, _, rid in matched]
+
+
+def _upsert_profile(user_id, class_name, subject, max_words, expected=None, keep_max_words=False):
+    """INSERT … ON CONFLICT (user_id, class_name, subject) DO UPDATE … RETURNING.
+
+    One round trip for both the create and the update case (Postgres and
+    SQLite). Returns the profile row, with version == 1 meaning it was
+    just created, or None when `expected` doesn't match the stored
+    version. `keep_max_words` uses `max_words` only for a new profile.
+    """
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+
+    stmt = upsert(ClassProfile).values(
+        user_id=user_id, class_name=class_name, subject=subject,
+        max_words=max_words, version=1,
+    )
+    set_ = {"version": ClassProfile.version + 1, "updated_at": datetime.utcnow()}
+    if not keep_max_words:
+        set_["max_words"] = stmt.excluded.max_words
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ClassProfile.user_id, ClassProfile.class_name, ClassProfile.subject],
+        set_=set_,
+        where=(ClassProfile.version == expected) if expected is not None else None,
+    ).returning(ClassProfile.id, ClassProfile.class_name, ClassProfile.subject,
+                ClassProfile.max_words, ClassProfile.version)
+    return db.session.execute(stmt).first()
+
+
+def _bump_version(cp_id, expected=None):
+    """Atomically increment a profile's version; returns it, or None on conflict.
+
+    With `expected`, the UPDATE only matches if nobody else has written
+    since the client last read the profile (optimistic concurrency).
+    """
+    stmt = update(ClassProfile).where(ClassProfile.id == cp_id)
+    if expected is not None:
+        stmt = stmt.where(ClassProfile.version == expected)
+    return db.session.execute(
+        stmt.values(version=ClassProfile.version + 1)
+        .returning(ClassProfile.version)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def _version_conflict(cp):
+    db.session.rollback()
+    db.session.refresh(cp)
+    return jsonify(error="This class was changed elsewhere; reload before saving.",
+                   version=cp.version), 409
+
+
+# ---------- Class Profiles ----------
+@bp.route("/class_profile/save", methods=["POST"])
+@login_required
+def save_class_profile():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    class_name = str(data.get("class") or "").strip()
+    subject    = str(data.get("subject") or "").strip()
+    max_words  = int_or_none(data.get("max_words") or 50)  # default now 50
+    rows       = data.get("rows") or []
+
+    if not class_name or not subject:
+        return jsonify(error="Class and Subject are required"), 400
+    if max_words is None:
+        return jsonify(error="max_words must be a number"), 400
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        return jsonify(error="rows must be a list of objects"), 400
+
+    # Upsert by (user_id, class_name, subject) in a single statement
+    cp = _upsert_profile(current_user.id, class_name, subject, max_words,
+                         expected=int_or_none(data.get("version")))
+    if cp is None:
+        existing = ClassProfile.query.filter_by(
+            user_id=current_user.id, class_name=class_name, subject=subject).first()
+        return _version_conflict(existing)
+
+    created = cp.version == 1
+    row_ids = _replace_rows(cp.id, rows, is_new=created)
+    db.session.commit()
+    return jsonify(
+        id=cp.id,
+        class_name=cp.class_name,
+        subject=cp.subject,
+        max_words=cp.max_words,
+        version=cp.version,
+        row_ids=row_ids,
+        message="CREATED" if created else "UPDATED"
+    ), 201 if created else 200
+
+
+@bp.route("/class_profile/<int:cp_id>/rows", methods=["PATCH"])
+@login_required
+def patch_class_rows(cp_id):
+    """Apply row-level deltas instead of re-posting the whole class.
+
+    Body: {"version": N, "max_words"?: int, "ops": [
+        {"op": "add", "row": {...}},
+        {"op": "update", "id": row_id, "fields": {...}},
+        {"op": "delete", "id": row_id}]}
+    Returns the new version and the ids of added rows (in op order), or
+    409 if the profile changed since `version`.
+    """
+    cp = ClassProfile.query.filter_by(id=cp_id, user_id=current_user.id).first_or_404()
+    data = request.get_json(silent=True) or {}
+    expected = int_or_none(data.get("version"))
+    ops = data.get("ops") or []
+    if expected is None or not isinstance(ops, list):
+        return jsonify(error="version and ops are required"), 400
+
+    max_words = None
+    if "max_words" in data:
+        max_words = int_or_none(data.get("max_words") or 50)
+        if max_words is None:
+            return jsonify(error="max_words must be a number"), 400
+
+    # Validate every op before claiming a version
+    adds, updates, deletes = [], {}, set()
+    for op in ops:
+        kind = op.get("op") if isinstance(op, dict) else None
+        rid = int_or_none(op.get("id")) if kind in ("update", "delete") else None
+        if kind == "add" and isinstance(op.get("row") or {}, dict):
+            adds.append(_clean_row(op.get("row") or {}))
+        elif kind == "update" and rid is not None and isinstance(op.get("fields") or {}, dict):
+            fields = {k: v for k, v in (op.get("fields") or {}).items() if k in ROW_FIELDS}
+            clean = _clean_row(fields)
+            updates.setdefault(rid, {}).update({k: clean[k] for k in fields})
+        elif kind == "delete" and rid is not None:
+            deletes.add(rid)
+        else:
+            return jsonify(error=f"Bad op: {op!r}"), 400
+
+    # Claim the version first so concurrent patches serialize on this row
+    version = _bump_version(cp.id, expected)
+    if version is None:
+        return _version_conflict(cp)
+
+    if max_words is not None:
+        cp.max_words = max_words
+
+    # Only touch rows that really belong to this profile
+    touched = set(updates) | deletes
+    owned = set(db.session.execute(
+        select(ClassRow.id).where(ClassRow.profile_id == cp.id, ClassRow.id.in_(touched))
+    ).scalars()) if touched else set()
+
+    if deletes & owned:
+        db.session.execute(delete(ClassRow).where(ClassRow.id.in_(deletes & owned)))
+    rows_to_update = [dict(fields, id=rid) for rid, fields in updates.items()
+                      if rid in owned and rid not in deletes and fields]
+    if rows_to_update:
+        db.session.execute(update(ClassRow), rows_to_update)
+
+    added_ids = []
+    if adds:
+        start = db.session.execute(
+            select(func.coalesce(func.max(ClassRow.position), -1))
+            .where(ClassRow.profile_id == cp.id)
+        ).scalar() + 1
+        db.session.execute(
+            insert(ClassRow),
+            [dict(row, profile_id=cp.id, position=start + i) for i, row in enumerate(adds)]
+        )
+        added_ids = db.session.execute(
+            select(ClassRow.id)
+            .where(ClassRow.profile_id == cp.id, ClassRow.position >= start)
+            .order_by(ClassRow.position)
+        ).scalars().all()
+
+    db.session.commit()
+    return jsonify(id=cp.id, version=version, added_ids=added_ids)
+
+
+PROFILE_PAGE_DEFAULT = 100
+PROFILE_PAGE_MAX = 200
+
+
+def _encode_cursor(created_at, cp_id):
+    raw = f"{created_at.isoformat()}|{cp_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        stamp, cp_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(stamp), int(cp_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+@bp.route("/class_profiles", methods=["GET"])
+@login_required
+def list_class_profiles():
+    """Newest-first list of the user's profiles, keyset-paginated.
+
+    ?limit=N (default 100) and ?cursor=… from the previous page's
+    X-Next-Cursor header; the body stays a plain JSON array.
+    """
+    limit = min(max(int_or_none(request.args.get("limit")) or PROFILE_PAGE_DEFAULT, 1),
+                PROFILE_PAGE_MAX)
+    query = (select(ClassProfile.id, ClassProfile.class_name, ClassProfile.subject,
+                    ClassProfile.max_words, ClassProfile.created_at, ClassProfile.updated_at)
+             .where(ClassProfile.user_id == current_user.id)
+             .order_by(ClassProfile.created_at.desc(), ClassProfile.id.desc())
+             .limit(limit + 1))
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        after = _decode_cursor(cursor)
+        if after is None:
+            return jsonify(error="Bad cursor"), 400
+        created_at, cp_id = after
+        query = query.where(or_(
+            ClassProfile.created_at < created_at,
+            (ClassProfile.created_at == created_at) & (ClassProfile.id < cp_id),
+        ))
+
+    rows = db.session.execute(query).all()
+    page, more = rows[:limit], len(rows) > limit
+    resp = jsonify([
+        {"id": r.id, "class_name": r.class_name, "subject": r.subject, "max_words": r.max_words,
+         "updated_at": r.updated_at.isoformat()}
+        for r in page
+    ])
+    if more:
+        next_cursor = _encode_cursor(page[-1].created_at, page[-1].id)
+        resp.headers["X-Next-Cursor"] = next_cursor
+        resp.headers["Link"] = (f'<{url_for("profiles.list_class_profiles", limit=limit, cursor=next_cursor)}>;'
+                                f' rel="next"')
+    return resp
+
+
+def _conditional_profile(cp, variant, build):
+    """Serve `build()` with ETag/Last-Modified from updated_at, or a bare 304.
+
+    The validators are checked before anything is serialized, so an
+    unchanged profile never loads or encodes its rows.
+    """
+    stamp = (cp.updated_at or datetime(1970, 1, 1)).replace(tzinfo=timezone.utc)  # stored as naive UTC
+    etag = f"cp{cp.id}-v{cp.version}-{int(stamp.timestamp() * 1_000_000)}-{variant}"
+    last_modified = stamp.replace(microsecond=0)
+
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = bool(request.if_modified_since and last_modified <= request.if_modified_since)
+
+    resp = Response(status=304) if fresh else jsonify(build())
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    # Let the browser keep a copy but always revalidate it
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+@bp.route("/class_profile/<int:cp_id>", methods=["GET"])
+@login_required
+def get_class_profile_header(cp_id):
+    cp = ClassProfile.query.filter_by(id=cp_id, user_id=current_user.id).first_or_404()
+    return _conditional_profile(cp, "header", lambda: _profile_to_dict(cp, include_rows=False))
+
+
+@bp.route("/class_profile/<int:cp_id>/full", methods=["GET"])
+@login_required
+def get_class_profile_full(cp_id):
+    cp = ClassProfile.query.filter_by(id=cp_id, user_id=current_user.id).first_or_404()
+    # Build using helper so both storage modes are supported
+    return _conditional_profile(cp, "full", lambda: _profile_to_dict(cp, include_rows=True))
+
+
+@bp.route("/class_profile/<int:cp_id>/export.<fmt>", methods=["GET"])
+@login_required
+def export_class_profile(cp_id, fmt):
+    """Stream a saved class as CSV or XLSX, straight from the stored rows."""
+    if fmt not in exports.MIMETYPES:
+        return jsonify(error="Format must be csv or xlsx"), 400
+    cp = ClassProfile.query.filter_by(id=cp_id, user_id=current_user.id).first_or_404()
+    columns = exports.FULL_COLUMNS if request.args.get("full") in ("1", "true") else exports.BASIC_COLUMNS
+    filename = secure_filename(f"{cp.class_name}_{cp.subject}.{fmt}") or f"export.{fmt}"
+
+    stmt = (select(*(getattr(ClassRow, key) for _, key in columns))
+            .where(ClassRow.profile_id == cp.id)
+            .order_by(ClassRow.position)
+            .execution_options(yield_per=exports.CHUNK_ROWS))
+    rows = (r._asdict() for r in db.session.execute(stmt))
+
+    resp = Response(stream_with_context(exports.export_chunks(fmt, rows, columns, cp.class_name or "Reports")),
+                    mimetype=exports.MIMETYPES[fmt])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp.headers["Cache-Control"] = "private, no-store"
+    return resp
+
+
+@bp.route("/class_profile/<int:cp_id>/report_cards.zip", methods=["GET", "POST"])
+@login_required
+def export_report_cards(cp_id):
+    """Stream a ZIP with one PDF or DOCX report card per student (School plan)."""
+    if current_user.plan != "school":
+        return jsonify(error="Report cards are available on the School plan."), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    fmt = str(request.args.get("format") or data.get("format") or "pdf").lower()
+    if fmt not in report_cards.FORMATS:
+        return jsonify(error="Format must be pdf or docx"), 400
+    template = data.get("template") or report_cards.DEFAULT_TEMPLATE
+    problem = report_cards.check_template(template)
+    if problem:
+        return jsonify(error=problem), 400
+
+    cp = ClassProfile.query.filter_by(id=cp_id, user_id=current_user.id).first_or_404()
+    rows = [r for r in _profile_to_dict(cp, include_rows=True)["rows"] if (r.get("name") or "").strip()]
+    if not rows:
+        return jsonify(error="This class has no students"), 400
+    header = {"class_name": cp.class_name, "subject": cp.subject}
+
+    cards = report_cards.render_cards(fmt, rows, header, template)
+    filename = secure_filename(f"{cp.class_name}_{cp.subject}_report_cards.zip") or "report_cards.zip"
+    resp = Response(stream_with_context(exports.zip_chunks(cards)), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp.headers["Cache-Control"] = "private, no-store"
+    return resp
+
+
+# ---------- Roster import (CSV / XLSX, see roster.py) ----------
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "500"))
+IMPORT_MAX_ERRORS = 200   # lines reported back; the rest are only counted
+
+
+def _import_target(user_id, class_name, subject, max_words, replace):
+    """Upsert one class the first time the roster mentions it; where its rows start.
+
+    `max_words` None keeps an existing class's setting (new ones get 50).
+    """
+    cp = _upsert_profile(user_id, class_name, subject, max_words or 50,
+                         keep_max_words=max_words is None)
+    created = cp.version == 1
+    if created:
+        start = 0
+    elif replace:
+        db.session.execute(delete(ClassRow).where(ClassRow.profile_id == cp.id))
+        start = 0
+    else:
+        start = db.session.execute(
+            select(func.coalesce(func.max(ClassRow.position), -1))
+            .where(ClassRow.profile_id == cp.id)
+        ).scalar() + 1
+    return {"id": cp.id, "class_name": cp.class_name, "subject": cp.subject,
+            "max_words": cp.max_words, "version": cp.version, "created": created, "rows": 0, "next": start}
+
+
+def _import_roster(user_id, records, defaults, max_words, replace=True):
+    """Write streamed roster rows as bulk INSERTs of IMPORT_CHUNK_ROWS.
+
+    Only the pending chunk and one entry per class are held, however long
+    the file. Returns (classes, errors, skipped); nothing is committed.
+    """
+    classes, errors, pending = {}, [], []
+    skipped = 0
+    for line, raw in records:
+        row, error = roster.normalize(raw, defaults)
+        if error:
+            skipped += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"line": line, "name": (raw.get("name") or "").strip(), "error": error})
+            continue
+
+        key = (row.pop("class_name"), row.pop("subject"))
+        target = classes.get(key)
+        if target is None:
+            target = classes[key] = _import_target(user_id, *key, max_words, replace)
+        pending.append(dict(_clean_row(row), profile_id=target["id"], position=target["next"]))
+        target["next"] += 1
+        target["rows"] += 1
+        if len(pending) >= IMPORT_CHUNK_ROWS:
+            db.session.execute(insert(ClassRow), pending)
+            pending.clear()
+    if pending:
+        db.session.execute(insert(ClassRow), pending)
+    for target in classes.values():
+        del target["next"]
+    return list(classes.values()), errors, skipped
+
+
+@bp.route("/class_profiles/import", methods=["POST"])
+@login_required
+def import_class_profiles():
+    """Create or refill saved classes from an uploaded roster.
+
+    multipart/form-data: file=<.csv|.xlsx>, plus optional class / subject
+    (used for rows without those columns), max_words (existing classes
+    keep theirs when it is left out), and mode=replace
+    (default: each class ends up with exactly the file's students) or
+    append. Bad lines are skipped and reported; the rest are saved in one
+    transaction.
+    """
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify(error="Choose a .csv or .xlsx file to import"), 400
+    mode = request.form.get("mode", "replace")
+    if mode not in ("replace", "append"):
+        return jsonify(error="mode must be replace or append"), 400
+    max_words = int_or_none(request.form.get("max_words"))
+    defaults = {field: (request.form.get(name) or "").strip()
+                for field, name in (("class_name", "class"), ("subject", "subject"))}
+
+    try:
+        ignored, records = roster.read(upload.stream, upload.filename)
+        classes, errors, skipped = _import_roster(
+            current_user.id, records, {k: v for k, v in defaults.items() if v},
+            max_words, replace=mode == "replace")
+    except roster.RosterError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+
+    report = dict(imported=sum(c["rows"] for c in classes), skipped=skipped, errors=errors,
+                  errors_truncated=skipped > len(errors), ignored_columns=ignored)
+    if not classes:
+        db.session.rollback()
+        return jsonify(error="No rows could be imported", classes=[], **report), 400
+    db.session.commit()
+    return jsonify(classes=classes, **report)
+
+
+# ---------- Background generation jobs (see worker.py) ----------
+@bp.route("/class_profile/<int:cp_id>/generate_job", methods=["POST"])
+@login_required
+def submit_generation_job(cp_id):
+    """Queue generation for a saved class; returns immediately with a job id."""
+    cp = ClassProfile.query.filter_by(id=cp_id, user_id=current_user.id).first_or_404()
+    data = request.get_json(silent=True) or {}
+
+    rows = _profile_to_dict(cp, include_rows=True)["rows"]
+    # By default only rows without a report; {"all": true} regenerates everything
+    todo = [(i, r) for i, r in enumerate(rows)
+            if r.get("name") and (data.get("all") or not r.get("report"))]
+    if not todo:
+        return jsonify(error="Nothing to generate"), 400
+
+    # The job holds its reservation; the worker refunds what it doesn't use
+    over = reserve_reports(len(todo))
+    if over:
+        return over
+
+    job = jobs.submit_job(current_user.id, cp, todo, fresh=wants_fresh(data))
+    return jsonify(jobs.job_to_dict(job)), 202
+
+
+@bp.route("/generation_jobs/<int:job_id>", methods=["GET"])
+@login_required
+def get_generation_job(job_id):
+    job = GenerationJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    include_tasks = request.args.get("tasks", "").lower() in ("1", "true", "yes")
+    return jsonify(jobs.job_to_dict(job, include_tasks=include_tasks))
+
+
+@bp.route("/generation_jobs/<int:job_id>/cancel", methods=["POST"])
+@login_required
+def cancel_generation_job(job_id):
+    job = GenerationJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(jobs.job_to_dict(jobs.cancel_job(job)))
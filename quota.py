@@ -0,0 +1,80 @@
+# quota.py
+# -----------------------------------------
+# Report Rocket – atomic report quota
+#
+# Reservations are one conditional UPDATE … RETURNING, so concurrent
+# requests from the same account can never push reports_used past
+# reports_limit. Callers reserve up front and refund whatever they didn't
+# actually generate (failures, cache hits, cancelled rows).
+# -----------------------------------------
+from sqlalchemy import case, or_, select, update
+
+import metrics
+from models import db, User
+
+
+class QuotaExceeded(Exception):
+    """Raised when a reservation would pass the user's reports_limit."""
+
+    def __init__(self, requested, remaining):
+        self.requested = requested
+        self.remaining = remaining
+        super().__init__(f"{requested} requested, {remaining} remaining")
+
+
+def reserve(user_id, n=1, commit=True):
+    """Reserve `n` reports for `user_id`; returns the new reports_used.
+
+    With commit=False the charge joins the caller's transaction, so it
+    lands (or rolls back) together with whatever it pays for.
+
+    Single statement:
+        UPDATE users SET reports_used = reports_used + :n
+        WHERE id = :id AND (reports_limit IS NULL OR reports_used + :n <= reports_limit)
+        RETURNING reports_used
+    """
+    if n <= 0:
+        return None
+    stmt = (
+        update(User)
+        .where(User.id == user_id,
+               or_(User.reports_limit.is_(None),
+                   User.reports_used + n <= User.reports_limit))
+        .values(reports_used=User.reports_used + n)
+        .returning(User.reports_used)
+        .execution_options(synchronize_session=False)
+    )
+    used = db.session.execute(stmt).scalar()
+    if commit:
+        db.session.commit()
+    if used is None:
+        metrics.QUOTA.labels("rejected").inc(n)
+        raise QuotaExceeded(n, remaining(user_id))
+    metrics.QUOTA.labels("reserved").inc(n)
+    return used
+
+
+def refund(user_id, n, commit=True):
+    """Give back `n` reserved reports (never below zero); commit as in reserve()."""
+    if n <= 0:
+        return
+    metrics.QUOTA.labels("refunded").inc(n)
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(reports_used=case((User.reports_used >= n, User.reports_used - n),
+                                  else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        db.session.commit()
+
+
+def remaining(user_id):
+    """Reports left for `user_id`, or None when unlimited."""
+    row = db.session.execute(
+        select(User.reports_used, User.reports_limit).where(User.id == user_id)
+    ).first()
+    if row is None or row.reports_limit is None:
+        return None
+    return max(row.reports_limit - (row.reports_used or 0), 0)
@@ -0,0 +1,228 @@
+# ratelimit.py
+# -----------------------------------------
+# Report Rocket – org-wide limiter for outbound LLM calls
+#
+# Token buckets live in the rate_buckets table, so every gunicorn worker,
+# thread and worker.py process draws from the same budget. Taking tokens
+# is one conditional UPDATE per bucket (refill + check + debit), the same
+# shape as quota.reserve:
+#
+#   UPDATE rate_buckets
+#      SET tokens = min(capacity, tokens + elapsed * rate) - :cost, updated_at = :now
+#    WHERE key = :key AND min(capacity, tokens + elapsed * rate) - :cost >= :floor
+#
+# Every call takes from four buckets in one transaction: the global RPM/TPM
+# buckets (our OpenAI org limits) and the caller's own RPM/TPM buckets,
+# which refill in proportion to the plan weight. Free-plan calls must also leave
+# LLM_PAID_RESERVE of the global buckets untouched, so a burst of free
+# traffic can never starve paying accounts. A caller that doesn't fit
+# sleeps until its bucket will have refilled (no polling), and gives up
+# with RateLimited after LLM_LIMIT_MAX_WAIT seconds.
+#
+# The caller is carried in a context variable: wrap generation in
+# `with ratelimit.tenant(user_id, plan):`.
+# -----------------------------------------
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import case, select, update
+
+from models import RateBucket
+
+RPM = float(os.getenv("LLM_RPM", "500"))              # 0 disables the limiter
+TPM = float(os.getenv("LLM_TPM", "200000"))
+USER_RPM = float(os.getenv("LLM_USER_RPM", "30"))     # per unit of plan weight
+USER_TPM = float(os.getenv("LLM_USER_TPM", "15000"))
+BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "10"))
+PAID_RESERVE = float(os.getenv("LLM_PAID_RESERVE", "0.3"))
+MAX_WAIT = float(os.getenv("LLM_LIMIT_MAX_WAIT", "20"))
+PLAN_WEIGHTS = {
+    plan.strip(): float(weight)
+    for plan, weight in (item.split("=") for item in
+                         os.getenv("LLM_PLAN_WEIGHTS", "free=1,teacher=4,school=8").split(",")
+                         if "=" in item)
+}
+UNLIMITED_PLANS = ("teacher", "school")   # plans allowed into the paid reserve
+
+
+class RateLimited(Exception):
+    """The call would have had to wait longer than its allowed maximum."""
+
+    def __init__(self, retry_after):
+        self.retry_after = max(int(retry_after + 0.999), 1)
+        super().__init__(f"Too many AI requests right now; try again in {self.retry_after}s.")
+
+
+_tenant = contextvars.ContextVar("llm_tenant", default=None)
+_engine = None
+
+_stats_lock = threading.Lock()
+stats = {"granted": 0, "waited": 0, "rejected": 0, "wait_seconds": 0.0}
+
+
+def init_app(app, db):
+    """Bind to the app's engine so pool threads (no app context) can use it."""
+    global _engine
+    with app.app_context():
+        _engine = db.engine
+
+
+@contextmanager
+def tenant(user_id, plan, max_wait=None):
+    """Attribute LLM calls made inside the block to `user_id` on `plan`."""
+    token = _tenant.set((user_id, plan or "free", max_wait))
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def estimate_tokens(prompt):
+    """Prompt tokens plus the most the reply should use (~4 chars/token)."""
+    m = re.search(r"up to (\d+) words", prompt)
+    words = int(m.group(1)) if m else 50
+    students = max(len(re.findall(r"^\[s\d+\] ", prompt, re.M)), 1)
+    return len(prompt) / 4 + 20 + students * (words * 1.4 + 15)
+
+
+# =========================================
+# Buckets
+# =========================================
+def _specs(cost_tokens):
+    """`[(key, capacity, rate_per_s, cost, floor)]` for the current tenant."""
+    user_id, plan, _ = _tenant.get() or (None, None, None)
+    reserve = PAID_RESERVE if user_id is not None and plan not in UNLIMITED_PLANS else 0.0
+    specs = [
+        ("global:rpm", RPM / 60, 1.0, reserve),
+        ("global:tpm", TPM / 60, cost_tokens, reserve),
+    ]
+    if user_id is not None:
+        weight = PLAN_WEIGHTS.get(plan, 1.0)
+        specs = [(f"user:{user_id}:rpm", USER_RPM * weight / 60, 1.0, 0.0),
+                 (f"user:{user_id}:tpm", USER_TPM * weight / 60, cost_tokens, 0.0)] + specs
+    out = []
+    for key, rate, cost, reserve_frac in specs:
+        capacity = rate * BURST_SECONDS
+        floor = capacity * reserve_frac
+        # A call bigger than the bucket takes all of it rather than never fitting
+        out.append((key, capacity, rate, min(cost, capacity - floor), floor))
+    return out
+
+
+def _available(now, capacity, rate):
+    elapsed = case((now > RateBucket.updated_at, now - RateBucket.updated_at), else_=0.0)
+    refilled = RateBucket.tokens + elapsed * rate
+    return case((refilled > capacity, capacity), else_=refilled)
+
+
+def _take(conn, key, capacity, rate, cost, floor, now):
+    avail = _available(now, capacity, rate)
+    return conn.execute(
+        update(RateBucket)
+        .where(RateBucket.key == key, avail - cost >= floor)
+        .values(tokens=avail - cost, capacity=capacity, rate=rate,
+                updated_at=case((now > RateBucket.updated_at, now), else_=RateBucket.updated_at))
+        .returning(RateBucket.tokens)
+    ).first()
+
+
+def _insert_full(conn, key, capacity, rate, now):
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    conn.execute(upsert(RateBucket).values(key=key, tokens=capacity, capacity=capacity,
+                                           rate=rate, updated_at=now)
+                 .on_conflict_do_nothing(index_elements=[RateBucket.key]))
+
+
+def _wait_for(conn, key, capacity, rate, cost, floor, now):
+    """Seconds until `key` will hold `cost` above its floor."""
+    current = conn.execute(
+        select(RateBucket.tokens, RateBucket.updated_at).where(RateBucket.key == key)
+    ).first()
+    avail = 0.0
+    if current is not None:
+        avail = min(capacity, current.tokens + max(now - current.updated_at, 0) * rate)
+    return max((cost + floor - avail) / rate, 0.01)
+
+
+def _try_all(specs):
+    """Take from every bucket or none; returns None, or seconds to wait.
+
+    All buckets are debited in one transaction, committed only when every
+    one had room. Specs always list the user's buckets before the global
+    ones, so concurrent callers lock rows in the same order.
+    """
+    now = time.time()
+    with _engine.connect() as conn:
+        for key, capacity, rate, cost, floor in specs:
+            row = _take(conn, key, capacity, rate, cost, floor, now)
+            if row is None:
+                # First use of the bucket (or a racing caller just created it)
+                _insert_full(conn, key, capacity, rate, now)
+                row = _take(conn, key, capacity, rate, cost, floor, now)
+            if row is None:
+                wait = _wait_for(conn, key, capacity, rate, cost, floor, now)
+                conn.rollback()   # undo the buckets already taken
+                return wait
+        conn.commit()
+    return None
+
+
+def acquire(cost_tokens):
+    """Block until the current tenant may make one call of ~`cost_tokens`."""
+    if _engine is None or RPM <= 0:
+        return
+    _, _, max_wait = _tenant.get() or (None, None, None)
+    limit = MAX_WAIT if max_wait is None else max_wait
+    started = time.monotonic()
+    specs = _specs(cost_tokens)
+    waited = 0.0
+    while True:
+        wait = _try_all(specs)
+        if wait is None:
+            with _stats_lock:
+                stats["granted"] += 1
+                stats["waited"] += bool(waited)
+                stats["wait_seconds"] += waited
+            return
+        if time.monotonic() - started + wait > limit:
+            with _stats_lock:
+                stats["rejected"] += 1
+            raise RateLimited(wait)
+        # A little jitter so waiters that computed the same instant don't collide
+        pause = wait + random.uniform(0, 0.05)
+        time.sleep(pause)
+        waited += pause
+
+
+def settle(estimated, usage):
+    """Correct the TPM buckets once the real `(prompt, completion)` usage is known."""
+    if _engine is None or RPM <= 0 or not usage:
+        return
+    delta = sum(usage) - estimated
+    if abs(delta) < 1:
+        return
+    with _engine.begin() as conn:
+        for key, capacity, _, _, _ in _specs(0):
+            if not key.endswith(":tpm"):
+                continue
+            # May go negative: the next callers wait off the debt
+            adjusted = RateBucket.tokens - delta
+            conn.execute(update(RateBucket).where(RateBucket.key == key)
+                         .values(tokens=case((adjusted > capacity, capacity), else_=adjusted)))
+
+
+def snapshot():
+    with _stats_lock:
+        out = dict(stats)
+    out["wait_seconds"] = round(out["wait_seconds"], 2)
+    out.update(enabled=_engine is not None and RPM > 0, rpm=RPM, tpm=TPM,
+               plan_weights=PLAN_WEIGHTS, paid_reserve=PAID_RESERVE)
+    return out
@@ -0,0 +1,214 @@
+# report_cache.py
+# -----------------------------------------
+# Report Rocket – content-addressed cache for generated reports
+#
+# Two tiers: a per-process LRU in front of the `generation_cache` table.
+# Keys hash the account id and the prompt with the student's name swapped
+# for a placeholder, so one teacher's rows that share ratings/comments
+# share one cached report; the stored text keeps placeholders and is
+# re-personalised on every hit. Nothing is shared between accounts.
+#
+# A first name that is also an everyday word ("Will", "Grace", "May") can't
+# be told apart from that word in the text, so it is never swapped: its
+# key keeps the literal name and its report is only reused, verbatim, for
+# the same name.
+# -----------------------------------------
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+import metrics
+from models import db, GenerationCache
+
+STUDENT = "{{student}}"
+FIRST_NAME = "{{first_name}}"
+
+CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+MEMORY_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "2048"))              # LRU entries
+TTL = timedelta(seconds=int(os.getenv("REPORT_CACHE_TTL", str(30 * 24 * 3600))))
+DB_MAX_ROWS = int(os.getenv("REPORT_CACHE_DB_MAX_ROWS", "50000"))
+SWEEP_EVERY = int(os.getenv("REPORT_CACHE_SWEEP_EVERY", "500"))         # stores between sweeps
+
+# Given names that double as words a report is likely to use (checked lowercase)
+WORD_NAMES = frozenset("""
+    amber april art august autumn bill bob brook chance chase christian dawn daisy don
+    drew faith frank gene good grace great guy harmony heather holly honor honour hope
+    hunter iris ivy jack joy journey june justice liberty lily lucky major mark max may
+    miles noble ok page pat patience pearl prince ray reed rich river rocky rose royal
+    ruby sandy skye sky star sterling storm sue summer sunny true victor wade will win
+    winter young
+""".split())
+
+_lock = threading.Lock()
+_memory = OrderedDict()   # key -> (report, expires_at)
+_stores_since_sweep = 0
+stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+
+def _count(name, n=1):
+    with _lock:
+        stats[name] += n
+    if n:
+        metrics.CACHE.labels(name).inc(n)
+
+
+def snapshot():
+    """Counters plus current LRU size, for /cache/stats."""
+    with _lock:
+        out = dict(stats)
+        out["memory_entries"] = len(_memory)
+    lookups = out["memory_hits"] + out["db_hits"] + out["misses"]
+    out["hit_ratio"] = round((out["memory_hits"] + out["db_hits"]) / lookups, 4) if lookups else 0.0
+    return out
+
+
+# =========================================
+# Keys & (de)personalisation
+# =========================================
+def _normalize(prompt):
+    return "\n".join(" ".join(line.split()) for line in (prompt or "").strip().splitlines())
+
+
+def make_key(neutral_prompt, model, temperature, max_words, scope=None):
+    """sha256 over the owner (`scope`), the name-neutral prompt and the generation settings."""
+    payload = json.dumps([scope, _normalize(neutral_prompt), model, float(temperature),
+                          str(max_words or "").strip()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def swappable(name):
+    """True when `name` can be replaced by placeholders without touching ordinary words."""
+    name = " ".join((name or "").split())
+    first = name.split(" ")[0]
+    return len(first) > 2 and first.lower() not in WORD_NAMES
+
+
+def _name_forms(name):
+    name = " ".join((name or "").split())
+    if not name or not swappable(name):
+        return []
+    forms = [(name, STUDENT)]
+    first = name.split(" ")[0]
+    if first != name:
+        forms.append((first, FIRST_NAME))
+    return forms
+
+
+def neutralize(report, name):
+    """Swap the student's name (full, then first) for placeholders; see swappable()."""
+    for form, token in _name_forms(name):
+        report = re.sub(rf"(?<!\w){re.escape(form)}(?!\w)", token, report)
+    return report
+
+
+def personalize(report, name):
+    """Fill the placeholders back in for a (possibly different) student."""
+    name = " ".join((name or "").split()) or "The student"
+    return report.replace(STUDENT, name).replace(FIRST_NAME, name.split(" ")[0])
+
+
+# =========================================
+# Lookup & store
+# =========================================
+def get_many(keys):
+    """Return {key: neutral_report} for every key found in either tier."""
+    if not CACHE_ENABLED or not keys:
+        return {}
+    keys = set(keys)
+    now = datetime.utcnow()
+    found = {}
+
+    with _lock:
+        for key in keys:
+            entry = _memory.get(key)
+            if entry and entry[1] > now:
+                _memory.move_to_end(key)
+                found[key] = entry[0]
+            elif entry:
+                del _memory[key]
+    _count("memory_hits", len(found))
+
+    missing = keys - found.keys()
+    if missing:
+        rows = db.session.execute(
+            select(GenerationCache.key, GenerationCache.report, GenerationCache.created_at)
+            .where(GenerationCache.key.in_(missing),
+                   GenerationCache.created_at > now - TTL)
+        ).all()
+        for key, report, created_at in rows:
+            found[key] = report
+            _remember(key, report, created_at + TTL)
+        _count("db_hits", len(rows))
+        _count("misses", len(missing) - len(rows))
+    return found
+
+
+def _remember(key, report, expires_at):
+    with _lock:
+        _memory[key] = (report, expires_at)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+def store_many(items, model):
+    """Persist {key: neutral_report} in both tiers."""
+    global _stores_since_sweep
+    if not CACHE_ENABLED or not items:
+        return
+    now = datetime.utcnow()
+    for key, report in items.items():
+        _remember(key, report, now + TTL)
+
+    rows = [{"key": k, "model": model, "report": r, "created_at": now}
+            for k, r in items.items()]
+    try:
+        # Replace rather than skip: a force-fresh regeneration should win
+        db.session.execute(delete(GenerationCache).where(GenerationCache.key.in_(items.keys())))
+        db.session.execute(GenerationCache.__table__.insert(), rows)
+        db.session.commit()
+    except Exception:
+        # A concurrent writer beat us to the same key; the cache is best-effort
+        db.session.rollback()
+        return
+    _count("stores", len(items))
+
+    with _lock:
+        _stores_since_sweep += len(items)
+        due = _stores_since_sweep >= SWEEP_EVERY
+        if due:
+            _stores_since_sweep = 0
+    if due:
+        sweep()
+
+
+def sweep(now=None):
+    """Drop expired rows, then the oldest rows beyond DB_MAX_ROWS."""
+    now = now or datetime.utcnow()
+    removed = db.session.execute(
+        delete(GenerationCache).where(GenerationCache.created_at <= now - TTL)
+    ).rowcount or 0
+
+    total = db.session.execute(select(func.count()).select_from(GenerationCache)).scalar() or 0
+    if total > DB_MAX_ROWS:
+        oldest = (select(GenerationCache.key)
+                  .order_by(GenerationCache.created_at)
+                  .limit(total - DB_MAX_ROWS)
+                  .scalar_subquery())
+        removed += db.session.execute(
+            delete(GenerationCache).where(GenerationCache.key.in_(oldest))
+        ).rowcount or 0
+    db.session.commit()
+    _count("evicted", removed)
+    return removed
+
+
+def clear_memory():
+    with _lock:
+        _memory.clear()
@@ -0,0 +1,295 @@
+# report_cards.py
+# -----------------------------------------
+# Report Rocket – printable per-student report cards (PDF / DOCX)
+#
+# A card is a small text template filled from one ClassRow, then laid out
+# as a single-font PDF or a minimal .docx. Both writers are pure stdlib.
+# Rendering is CPU-bound, so render_cards() fans batches out to a process
+# pool and hands back the documents in row order; the web tier only
+# streams the resulting ZIP.
+#
+# Template mini-format (string.Template placeholders):
+#   "# text"   title          "## text"  section heading
+#   blank line paragraph gap  "Label:"   lines left empty are dropped
+# -----------------------------------------
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from string import Template
+from xml.sax.saxutils import escape
+
+FORMATS = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+DEFAULT_TEMPLATE = """\
+# $name
+$class_name · $subject · $date
+
+Class tests: $tests
+Homework: $homework
+Organisation: $organisation
+Participation: $participation
+
+## Teacher's report
+$report
+"""
+
+CARD_WORKERS = int(os.getenv("REPORT_CARD_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Cards per pool task: large enough to amortize pickling, small enough to stream
+CARD_BATCH = int(os.getenv("REPORT_CARD_BATCH", "25"))
+MAX_TEMPLATE_CHARS = 4000
+
+ROW_FIELDS = ("name", "gender", "tests", "homework", "organisation",
+              "participation", "comments", "report")
+
+
+# =========================================
+# Template → blocks
+# =========================================
+def check_template(text):
+    """Return an error message for an unusable template, else None."""
+    if not isinstance(text, str):
+        return "Template must be text"
+    if len(text) > MAX_TEMPLATE_CHARS:
+        return f"Template is limited to {MAX_TEMPLATE_CHARS} characters"
+    try:
+        Template(text).substitute({k: "" for k in ROW_FIELDS + ("first_name", "class_name",
+                                                                  "subject", "date")})
+    except (KeyError, ValueError) as e:
+        return f"Unknown or malformed placeholder in template: {e}"
+    return None
+
+
+def card_blocks(template, header, row):
+    """Fill `template` for one row; returns [(style, text)] with style title/heading/body/gap."""
+    name = (row.get("name") or "").strip()
+    values = {k: (row.get(k) or "").strip() for k in ROW_FIELDS}
+    values.update(first_name=name.split(" ")[0] if name else "",
+                  class_name=header.get("class_name", ""),
+                  subject=header.get("subject", ""),
+                  date=header.get("date", ""))
+    blocks = []
+    for line in Template(template).safe_substitute(values).splitlines():
+        line = line.rstrip()
+        if not line:
+            if blocks and blocks[-1][0] != "gap":
+                blocks.append(("gap", ""))
+        elif line.startswith("## "):
+            blocks.append(("heading", line[3:].strip()))
+        elif line.startswith("# "):
+            blocks.append(("title", line[2:].strip()))
+        elif not line.endswith(":"):
+            blocks.append(("body", line))
+    while blocks and blocks[-1][0] == "gap":
+        blocks.pop()
+    return blocks
+
+
+# =========================================
+# PDF
+# =========================================
+# Helvetica advance widths (1/1000 em) for ASCII 32..126, from the AFM
+_HELV = [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+         556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+         1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+         667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+         333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+         556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+_STYLES = {  # font resource, size, leading, space before
+    "title": ("F2", 18, 24, 0),
+    "heading": ("F2", 12, 17, 4),
+    "body": ("F1", 11, 15, 0),
+}
+PAGE_W, PAGE_H, MARGIN = 595, 842, 56  # A4 in points
+
+
+def _text_width(text, size, bold=False):
+    units = sum(_HELV[ord(c) - 32] if 32 <= ord(c) <= 126 else 556 for c in text)
+    return units * size / 1000 * (1.05 if bold else 1.0)
+
+
+def _wrap(text, size, bold, width):
+    lines, current = [], ""
+    for word in text.split(" "):
+        candidate = f"{current} {word}" if current else word
+        if current and _text_width(candidate, size, bold) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    lines.append(current)
+    return lines
+
+
+def _pdf_string(text):
+    raw = text.encode("cp1252", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def render_pdf(blocks):
+    """Lay `blocks` out on A4 pages; returns the PDF bytes."""
+    width = PAGE_W - 2 * MARGIN
+    pages, ops, y = [], [], PAGE_H - MARGIN
+    for style, text in blocks:
+        if style == "gap":
+            y -= 8
+            continue
+        font, size, leading, before = _STYLES[style]
+        y -= before
+        for line in _wrap(text, size, font == "F2", width):
+            if y - leading < MARGIN:
+                pages.append(ops)
+                ops, y = [], PAGE_H - MARGIN
+            y -= leading
+            ops.append(b"BT /%s %d Tf %d %.1f Td %s Tj ET"
+                       % (font.encode(), size, MARGIN, y, _pdf_string(line)))
+    pages.append(ops)
+
+    # 1 catalog, 2 pages, 3/4 fonts, then (page, contents) per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (5 + 2 * i) for i in range(len(pages))), len(pages)),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, page_ops in enumerate(pages):
+        stream = zlib.compress(b"\n".join(page_ops))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                       b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                       % (PAGE_W, PAGE_H, 6 + 2 * i))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+                       % (len(stream), stream))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for n, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (n, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % off for off in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+# =========================================
+# DOCX
+# =========================================
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_DOCX_PARTS = (
+    ("[Content_Types].xml",
+     _XML_HEAD +
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/word/document.xml" ContentType="application/'
+     'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+     '</Types>'),
+    ("_rels/.rels",
+     _XML_HEAD +
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+     'relationships/officeDocument" Target="word/document.xml"/>'
+     '</Relationships>'),
+)
+_RUN_PROPS = {"title": "<w:b/><w:sz w:val=\"36\"/>", "heading": "<w:b/><w:sz w:val=\"24\"/>",
+              "body": ""}
+
+
+def render_docx(blocks):
+    """Write `blocks` as a single-section .docx; returns the file bytes."""
+    paras = []
+    for style, text in blocks:
+        if style == "gap":
+            paras.append("<w:p/>")
+            continue
+        props = _RUN_PROPS[style]
+        paras.append(f'<w:p><w:r>{f"<w:rPr>{props}</w:rPr>" if props else ""}'
+                     f'<w:t xml:space="preserve">{escape(_ILLEGAL_XML.sub("", text))}</w:t></w:r></w:p>')
+    document = (_XML_HEAD + f'<w:document xmlns:w="{_W}"><w:body>' + "".join(paras)
+                + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/></w:sectPr></w:body></w:document>')
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _DOCX_PARTS:
+            zf.writestr(name, xml)
+        zf.writestr("word/document.xml", document)
+    return out.getvalue()
+
+
+# =========================================
+# Process pool fan-out
+# =========================================
+_RENDERERS = {"pdf": render_pdf, "docx": render_docx}
+
+
+def _safe_name(text):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text).strip("._") or "student"
+
+
+def render_batch(fmt, template, header, batch):
+    """Pool task: render `[(position, row)]`; returns `[(filename, bytes)]`."""
+    render = _RENDERERS[fmt]
+    return [(f"{pos + 1:04d}_{_safe_name(row.get('name') or '')}.{fmt}",
+             render(card_blocks(template, header, row)))
+            for pos, row in batch]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """One pool per web process, created on first use.
+
+    Workers start via forkserver/spawn rather than fork: forking a threaded
+    gunicorn worker could copy held locks into the children.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=CARD_WORKERS, mp_context=ctx)
+        return _pool
+
+
+def render_cards(fmt, rows, header, template=DEFAULT_TEMPLATE, pool=None):
+    """Yield `(filename, bytes)` for every row, in order.
+
+    At most two batches per worker are in flight, so a large class never
+    piles finished documents up in memory ahead of the ZIP stream.
+    """
+    if fmt not in _RENDERERS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    header = dict(header, date=header.get("date") or date.today().strftime("%d %B %Y"))
+    rows = [{k: r.get(k, "") for k in ROW_FIELDS} for r in rows]
+    numbered = list(enumerate(rows))
+    batches = [numbered[i:i + CARD_BATCH] for i in range(0, len(numbered), CARD_BATCH)]
+    pool = pool or _get_pool()
+
+    window = max(2 * CARD_WORKERS, 1)
+    pending = []
+    try:
+        for batch in batches:
+            pending.append(pool.submit(render_batch, fmt, template, header, batch))
+            if len(pending) >= window:
+                yield from pending.pop(0).result()
+        while pending:
+            yield from pending.pop(0).result()
+    finally:
+        # Client went away mid-stream: drop batches that haven't started
+        for fut in pending:
+            fut.cancel()
@@ -0,0 +1,331 @@
+# roster.py
+# -----------------------------------------
+# Report Rocket – CSV / XLSX roster parsing
+#
+# A roster is one student per row under a header row. Headers are matched
+# loosely ("Student name", "Class tests", "Organization", …), so a sheet
+# exported from a saved class (exports.py) imports as-is. Rows are read as
+# a stream: CSV line by line, XLSX by feeding the sheet XML to expat in
+# 64 KB chunks straight out of the zip, building only the current row.
+#
+# The one thing held whole is an XLSX's shared-strings table: Excel stores
+# most text cells (every name) there, and a row may point anywhere in it,
+# so it is loaded before the sheet. It is capped at IMPORT_MAX_SHARED_CHARS
+# characters (4M by default, far above a 20,000-student roster); larger
+# workbooks are rejected rather than read.
+#
+# normalize() turns a raw row into ClassRow fields, or a per-line error:
+# ratings accept any case, 1-4 and the usual synonyms, and end up as the
+# Low / Ok / Good / Great the report table uses.
+#
+# profiles.py (POST /class_profiles/import) groups the rows into
+# ClassProfiles and writes them.
+# -----------------------------------------
+import csv
+import io
+import itertools
+import os
+import posixpath
+import re
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "20000"))
+# Ceiling on any single XML part we inflate (zip-bomb guard)
+MAX_PART_BYTES = int(os.getenv("IMPORT_MAX_PART_BYTES", str(100 * 1024 * 1024)))
+MAX_SHARED_CHARS = int(os.getenv("IMPORT_MAX_SHARED_CHARS", str(4_000_000)))
+NAME_LIMITS = {"class_name": 120, "subject": 120}
+
+RATING_FIELDS = ("tests", "homework", "organisation", "participation")
+RATINGS = ("Low", "Ok", "Good", "Great")
+_RATING_ALIASES = {
+    "low": "Low", "1": "Low", "poor": "Low", "weak": "Low",
+    "ok": "Ok", "2": "Ok", "okay": "Ok", "fair": "Ok", "average": "Ok", "satisfactory": "Ok",
+    "good": "Good", "3": "Good",
+    "great": "Great", "4": "Great", "excellent": "Great", "outstanding": "Great",
+}
+
+# Normalized header -> field ("Class tests" -> "classtests" -> "tests")
+_HEADERS = {
+    "name": "name", "student": "name", "studentname": "name", "pupil": "name",
+    "pupilname": "name", "fullname": "name",
+    "gender": "gender", "sex": "gender",
+    "tests": "tests", "test": "tests", "classtests": "tests", "classtest": "tests",
+    "homework": "homework",
+    "organisation": "organisation", "organization": "organisation",
+    "participation": "participation",
+    "comments": "comments", "comment": "comments", "notes": "comments",
+    "report": "report", "reportgenerated": "report",
+    "class": "class_name", "classname": "class_name", "form": "class_name",
+    "group": "class_name",
+    "subject": "subject",
+}
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_NS_DOC_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_CELL_REF = re.compile(r"([A-Z]+)")
+
+
+class RosterError(Exception):
+    """The file as a whole can't be read (bad format, no header, too big)."""
+
+
+# =========================================
+# Rows
+# =========================================
+def header_fields(header):
+    """Column index -> field for a header row, plus the headers we ignored."""
+    fields, ignored = {}, []
+    for i, title in enumerate(header):
+        key = re.sub(r"[^a-z]", "", (title or "").lower())
+        field = _HEADERS.get(key)
+        if field and field not in fields.values():
+            fields[i] = field
+        elif (title or "").strip():
+            ignored.append(title.strip())
+    if "name" not in fields.values():
+        raise RosterError("The header row needs a Name column")
+    return fields, ignored
+
+
+def _rating(value):
+    value = value.strip()
+    if not value:
+        return ""
+    return _RATING_ALIASES.get(value.lower().rstrip("."))
+
+
+def normalize(raw, defaults=None):
+    """`(row, error)` for one `{field: text}` row; `row` has class_name/subject too."""
+    row = dict(defaults or {})
+    row.update({k: v.strip() for k, v in raw.items() if v and v.strip()})
+    if not row.get("name"):
+        return None, "Missing student name"
+    for field, limit in NAME_LIMITS.items():
+        label = field.replace("_", " ")
+        if not row.get(field):
+            return None, f"Missing {label}"
+        if len(row[field]) > limit:
+            return None, f"{label.capitalize()} is longer than {limit} characters"
+    for field in RATING_FIELDS:
+        rating = _rating(row.get(field, ""))
+        if rating is None:
+            return None, f"{field}: {row[field]!r} is not one of {', '.join(RATINGS)}"
+        row[field] = rating
+    return row, None
+
+
+def _blank(cells):
+    return not any((c or "").strip() for c in cells)
+
+
+def read(stream, filename):
+    """`(ignored_headers, rows)`; `rows` yields `(line number, {field: text})` lazily.
+
+    The header row is read here, so a file without one fails up front.
+    """
+    ext = posixpath.splitext((filename or "").lower())[1]
+    if ext == ".csv":
+        table = _csv_rows(stream)
+    elif ext in (".xlsx", ".xlsm"):
+        table = _xlsx_rows(stream)
+    else:
+        raise RosterError("Upload a .csv or .xlsx file")
+
+    for _, cells in table:
+        if not _blank(cells):
+            fields, ignored = header_fields(cells)
+            break
+    else:
+        raise RosterError("The file is empty")
+    return ignored, _records(table, fields)
+
+
+def _records(table, fields):
+    count = 0
+    for line, cells in table:
+        if _blank(cells):
+            continue
+        count += 1
+        if count > MAX_ROWS:
+            raise RosterError(f"Rosters are limited to {MAX_ROWS} students per upload")
+        yield line, {field: cells[i] if i < len(cells) else "" for i, field in fields.items()}
+
+
+# =========================================
+# CSV
+# =========================================
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        first = text.readline()
+        try:
+            dialect = csv.Sniffer().sniff(first, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(itertools.chain([first], text), dialect)
+        for cells in reader:
+            yield reader.line_num, cells
+    except UnicodeDecodeError:
+        raise RosterError("CSV files must be UTF-8 (in Excel: Save As → CSV UTF-8)")
+    except csv.Error as e:
+        raise RosterError(f"CSV line {reader.line_num}: {e}")
+
+
+# =========================================
+# XLSX
+# =========================================
+def _open_part(zf, name):
+    try:
+        info = zf.getinfo(name)
+    except KeyError:
+        return None
+    if info.file_size > MAX_PART_BYTES:
+        raise RosterError("The spreadsheet is too large to import")
+    return zf.open(info)
+
+
+def _first_sheet(zf):
+    """Path of the workbook's first sheet (sheet1.xml when the package is minimal)."""
+    default = "xl/worksheets/sheet1.xml"
+    if not {"xl/workbook.xml", "xl/_rels/workbook.xml.rels"} <= set(zf.namelist()):
+        return default
+    with _open_part(zf, "xl/workbook.xml") as workbook:
+        sheet = ET.parse(workbook).getroot().find(f"{_NS}sheets/{_NS}sheet")
+    with _open_part(zf, "xl/_rels/workbook.xml.rels") as rels:
+        targets = {r.get("Id"): r.get("Target")
+                   for r in ET.parse(rels).getroot().iter(f"{_NS_REL}Relationship")}
+    target = targets.get(sheet.get(f"{_NS_DOC_REL}id")) if sheet is not None else None
+    if not target:
+        return default
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+
+def _shared_strings(zf):
+    part = _open_part(zf, "xl/sharedStrings.xml")
+    if part is None:
+        return []
+    strings = []
+    chars = 0
+    with part:
+        for _, elem in ET.iterparse(part):
+            if elem.tag == f"{_NS}si":
+                # Plain <si><t>, or rich text runs <si><r><t>; phonetic <rPh> is skipped
+                runs = elem.findall(f"{_NS}t") or elem.findall(f"{_NS}r/{_NS}t")
+                text = "".join(t.text or "" for t in runs)
+                chars += len(text) + 1
+                if chars > MAX_SHARED_CHARS:
+                    raise RosterError("The spreadsheet has too much text to import; "
+                                      "split it or save it as CSV")
+                strings.append(text)
+                elem.clear()
+    return strings
+
+
+def _column(ref):
+    letters = _CELL_REF.match(ref or "")
+    if not letters:
+        return None
+    n = 0
+    for ch in letters.group(1):
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def _cell_text(kind, value, strings):
+    if kind == "s":
+        try:
+            return strings[int(value)]
+        except (ValueError, IndexError):
+            return ""
+    if kind in (None, "n") and value.endswith(".0"):
+        return value[:-2]   # 3.0 -> "3" (ratings typed as numbers)
+    return value
+
+
+class _SheetHandler:
+    """expat callbacks that collect finished rows as `(line, cells)`.
+
+    Plain expat costs a fraction of iterparse's per-element events, and
+    nothing but the current row is ever built.
+    """
+
+    def __init__(self, strings):
+        self.strings = strings
+        self.rows = []
+        self.line = 0
+        self.cells = None   # the open <row>
+        self.cell = None    # (column, type) of the open <c>
+        self.text = None    # text parts while inside <v> / <t>
+        self.phonetic = 0   # inside <rPh> (reading hints, not cell text)
+
+    def start(self, name, attrs):
+        tag = name.rpartition(" ")[2]
+        if tag == "row":
+            self.line = int(attrs.get("r") or self.line + 1)
+            self.cells = []
+        elif tag == "c" and self.cells is not None:
+            col = _column(attrs.get("r"))
+            self.cell = (len(self.cells) if col is None else col, attrs.get("t"))
+            self.value = []
+        elif tag in ("v", "t") and self.cell is not None and not self.phonetic:
+            self.text = self.value
+        elif tag == "rPh":
+            self.phonetic += 1
+
+    def end(self, name):
+        tag = name.rpartition(" ")[2]
+        if tag in ("v", "t"):
+            self.text = None
+        elif tag == "rPh":
+            self.phonetic -= 1
+        elif tag == "c" and self.cell is not None:
+            col, kind = self.cell
+            self.cells.extend([""] * (col - len(self.cells) + 1))
+            self.cells[col] = _cell_text(kind, "".join(self.value), self.strings)
+            self.cell = None
+        elif tag == "row" and self.cells is not None:
+            self.rows.append((self.line, self.cells))
+            self.cells = None
+
+    def data(self, text):
+        if self.text is not None:
+            self.text.append(text)
+
+
+def _sheet_rows(sheet, strings):
+    handler = _SheetHandler(strings)
+    parser = expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.data
+    while True:
+        chunk = sheet.read(64 * 1024)
+        parser.Parse(chunk, not chunk)
+        rows, handler.rows = handler.rows, []
+        yield from rows
+        if not chunk:
+            return
+
+
+def _xlsx_rows(stream):
+    try:
+        zf = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise RosterError("That .xlsx file is not a valid spreadsheet")
+    with zf:
+        try:
+            strings = _shared_strings(zf)
+            sheet = _open_part(zf, _first_sheet(zf))
+            if sheet is None:
+                raise RosterError("The spreadsheet has no worksheet")
+            with sheet:
+                yield from _sheet_rows(sheet, strings)
+        except (ET.ParseError, expat.ExpatError, zipfile.BadZipFile, zlib.error, ValueError) as e:
+            raise RosterError(f"The spreadsheet could not be read ({e})")
@@ -0,0 +1,350 @@
+// static/js/report.js
+// Report table UI for templates/report.html (served through asset_url, see assets.py)
+(() => {
+  /* ------- DOM refs ------- */
+  const tbody    = document.getElementById('reportTbody');
+  const tpl      = document.getElementById('rowTemplate');
+  const range    = document.getElementById('wordCountRange');
+  const wordLbl  = document.getElementById('wordCountLabel');
+  const savedSel = document.getElementById('savedClassSelect');
+
+  /* ------- header helpers ------- */
+  function updateWordLabel(){ wordLbl.textContent = range.value; }
+  range.addEventListener('input', updateWordLabel);
+
+  /* ------- radios (single select per column per row) ------- */
+  let rowCounter = 1;
+  function setRadioGroupNames(row){
+    const id = 'r' + (rowCounter++);
+    [{i:2,n:`tests-${id}`},{i:3,n:`homework-${id}`},{i:4,n:`organisation-${id}`},{i:5,n:`participation-${id}`}]
+      .forEach(g => row.cells[g.i].querySelectorAll('input[type="radio"]').forEach(r => r.name = g.n));
+  }
+  function getSelected(cell){
+    const x = cell.querySelector('input[type="radio"]:checked');
+    return x ? x.value : '';
+  }
+
+  /* ------- NDJSON streaming ------- */
+  async function streamNdjson(url, payload, onEvent){
+    const res = await fetch(url, {
+      method:'POST',
+      headers:{'Content-Type':'application/json', 'Accept':'application/x-ndjson'},
+      body: JSON.stringify(payload)
+    });
+    if(!(res.headers.get('Content-Type') || '').includes('ndjson')){
+      // validation / quota errors come back as a plain JSON body
+      const js = await res.json().catch(()=>({error:'Request failed'}));
+      throw new Error(js.error || 'Request failed');
+    }
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = '';
+    for(;;){
+      const {value, done} = await reader.read();
+      if(done) break;
+      buf += decoder.decode(value, {stream:true});
+      let nl;
+      while((nl = buf.indexOf('\n')) >= 0){
+        const line = buf.slice(0, nl).trim();
+        buf = buf.slice(nl + 1);
+        if(line) onEvent(JSON.parse(line));
+      }
+    }
+    if(buf.trim()) onEvent(JSON.parse(buf));
+  }
+
+  /* ------- row lifecycle ------- */
+  function attachRowEvents(row){
+    const genBtn = row.querySelector('.generate-btn');
+    const copyBtn= row.querySelector('.copy-btn');
+
+    genBtn.onclick = async () => {
+      const tr = genBtn.closest('tr'); // ensure we target the <tr>
+      const payload = {
+        name: tr.querySelector('.name-cell').textContent.trim(),
+        gender: tr.querySelector('.gender-cell').textContent.trim(),
+        tests: getSelected(tr.cells[2]),
+        homework: getSelected(tr.cells[3]),
+        organisation: getSelected(tr.cells[4]),
+        participation: getSelected(tr.cells[5]),
+        comments: tr.querySelector('.comments-cell').textContent.trim(),
+        class: document.getElementById('classInput').value,
+        subject: document.getElementById('subjectInput').value,
+        max_words: range.value
+      };
+      const cell = tr.querySelector('.report-cell');
+      try{
+        cell.textContent = '';
+        let failed = null;
+        await streamNdjson('/generate_report', payload, ev => {
+          if(ev.error) failed = ev.error;
+          else if(ev.delta) cell.textContent += ev.delta;        // tokens as they arrive
+          else if(ev.done) cell.textContent = ev.report || cell.textContent;
+        });
+        if(failed) throw new Error(failed);
+
+        tr.classList.add('row-completed'); // ✅ turn this row light green
+        addRow(); // convenience: add a fresh empty row
+      }catch(err){
+        alert('Generate failed: ' + err.message);
+      }
+    };
+
+    copyBtn.onclick = () => {
+      navigator.clipboard.writeText(row.querySelector('.report-cell').textContent.trim());
+    };
+  }
+
+  function addRow(prefill=null){
+    const frag = tpl.content.cloneNode(true);
+    tbody.appendChild(frag);
+    const row = tbody.lastElementChild;
+
+    // clear & prefill
+    row.classList.remove('row-completed');
+    row.querySelectorAll('td[contenteditable="true"]').forEach(td => td.textContent='');
+    row.querySelectorAll('input[type="radio"]').forEach(r => r.checked=false);
+    row.querySelector('.report-cell').textContent='';
+
+    if(prefill){
+      if(prefill.id) row.dataset.rowId = prefill.id;   // lets saves diff by row id
+      row.querySelector('.name-cell').textContent   = prefill.name   || '';
+      row.querySelector('.gender-cell').textContent = prefill.gender || '';
+      ['tests','homework','organisation','participation'].forEach((k,offset)=>{
+        const v = (prefill[k]||'').toLowerCase();
+        if(v) row.cells[2+offset].querySelectorAll('input[type="radio"]').forEach(r=>{
+          if(r.value.toLowerCase()===v) r.checked=true;
+        });
+      });
+      row.querySelector('.comments-cell').textContent = prefill.comments || '';
+      if (prefill.report){
+        row.querySelector('.report-cell').textContent = prefill.report;
+        row.classList.add('row-completed');
+      }
+    }
+
+    setRadioGroupNames(row);
+    attachRowEvents(row);
+    return row;
+  }
+
+  /* ------- bulk actions ------- */
+  document.getElementById('addRow').onclick = () => addRow();
+
+  document.getElementById('genAll').onclick = async () => {
+    const cls = document.getElementById('classInput').value;
+    const sub = document.getElementById('subjectInput').value;
+    const max = range.value;
+
+    // one batched request; the server fans out completions concurrently
+    const pending = Array.from(tbody.querySelectorAll('tr'))
+      .filter(row => !row.querySelector('.report-cell').textContent.trim());
+    if(!pending.length) return;
+
+    const rows = pending.map(row => ({
+      name: row.querySelector('.name-cell').textContent.trim(),
+      gender: row.querySelector('.gender-cell').textContent.trim(),
+      tests: getSelected(row.cells[2]),
+      homework: getSelected(row.cells[3]),
+      organisation: getSelected(row.cells[4]),
+      participation: getSelected(row.cells[5]),
+      comments: row.querySelector('.comments-cell').textContent.trim()
+    }));
+    try{
+      // each row is filled in as soon as the server finishes it
+      await streamNdjson('/generate_reports_batch', {class: cls, subject: sub, max_words: max, rows}, ev => {
+        if(ev.done) return;
+        const row = pending[ev.index];
+        if(!row) return;
+        if(ev.error){ console.warn('Bulk row failed:', ev.error); return; }
+        row.querySelector('.report-cell').textContent = ev.report || '';
+        row.classList.add('row-completed');
+      });
+    }catch(e){
+      alert('Generate failed: ' + e.message);
+      return;
+    }
+    addRow();
+  };
+
+  document.getElementById('copyAll').onclick = () => {
+    let txt = 'Name\tGender\tReport Generated\n';
+    tbody.querySelectorAll('tr').forEach(r=>{
+      txt += [
+        r.querySelector('.name-cell').textContent.trim(),
+        r.querySelector('.gender-cell').textContent.trim(),
+        r.querySelector('.report-cell').textContent.trim()
+      ].join('\t') + '\n';
+    });
+    navigator.clipboard.writeText(txt);
+  };
+
+  /* ------- save/load profiles (with rows) ------- */
+  // The profile last loaded/saved: lets Save send row-level deltas (PATCH)
+  // instead of re-posting the whole class. `snapshot` maps row id -> values.
+  let loaded = null;
+  const ROW_KEYS = ['name','gender','tests','homework','organisation','participation','comments','report'];
+
+  function readRow(r){
+    return {
+      name: r.querySelector('.name-cell').textContent.trim(),
+      gender: r.querySelector('.gender-cell').textContent.trim(),
+      tests: getSelected(r.cells[2]),
+      homework: getSelected(r.cells[3]),
+      organisation: getSelected(r.cells[4]),
+      participation: getSelected(r.cells[5]),
+      comments: r.querySelector('.comments-cell').textContent.trim(),
+      report: r.querySelector('.report-cell').textContent.trim()
+    };
+  }
+
+  function rememberLoaded(cp){
+    const snapshot = new Map();
+    tbody.querySelectorAll('tr').forEach(tr => {
+      if(tr.dataset.rowId) snapshot.set(tr.dataset.rowId, readRow(tr));
+    });
+    loaded = {id: cp.id, class_name: cp.class_name, subject: cp.subject,
+              max_words: String(cp.max_words), version: cp.version, snapshot};
+  }
+
+  async function patchRows(trs, max){
+    const ops = [], addedTrs = [], present = new Set();
+    trs.forEach(tr => {
+      const row = readRow(tr), id = tr.dataset.rowId;
+      if(!id){ ops.push({op:'add', row}); addedTrs.push(tr); return; }
+      present.add(id);
+      const prev = loaded.snapshot.get(id) || {};
+      const fields = {};
+      ROW_KEYS.forEach(k => { if(row[k] !== (prev[k] || '')) fields[k] = row[k]; });
+      if(Object.keys(fields).length) ops.push({op:'update', id: Number(id), fields});
+    });
+    loaded.snapshot.forEach((_, id) => { if(!present.has(id)) ops.push({op:'delete', id: Number(id)}); });
+
+    const body = {version: loaded.version, ops};
+    if(max !== loaded.max_words) body.max_words = max;
+    if(!ops.length && !body.max_words) return {ok:true};
+
+    const res = await fetch(`/class_profile/${loaded.id}/rows`, {
+      method:'PATCH', headers:{'Content-Type':'application/json'}, body: JSON.stringify(body)
+    });
+    const js = await res.json().catch(()=>({error:'Save failed'}));
+    if(!res.ok) return {ok:false, status:res.status, error:js.error};
+    (js.added_ids || []).forEach((id, i) => { addedTrs[i].dataset.rowId = id; });
+    rememberLoaded({...loaded, max_words: max, version: js.version});
+    return {ok:true};
+  }
+
+  async function refreshSavedClasses(){
+    try{
+      // keyset-paginated: follow X-Next-Cursor until the last page
+      const list = [];
+      let url = '/class_profiles';
+      while(url){
+        const res = await fetch(url);
+        if(!res.ok) return;
+        list.push(...await res.json());
+        const next = res.headers.get('X-Next-Cursor');
+        url = next ? `/class_profiles?cursor=${encodeURIComponent(next)}` : null;
+      }
+      savedSel.innerHTML = '<option value="">— Select saved class —</option>';
+      list.forEach(it=>{
+        const opt = document.createElement('option');
+        opt.value = it.id;
+        opt.textContent = `${it.class_name} — ${it.subject} (${it.max_words})`;
+        savedSel.appendChild(opt);
+      });
+    }catch(e){ console.warn('list load failed', e); }
+  }
+
+  async function loadSelectedClassProfile(id){
+    if(!id) return;
+    try{
+      const res = await fetch(`/class_profile/${id}/full`);
+      if(!res.ok) return;
+      const cp = await res.json();
+
+      // header
+      document.getElementById('classInput').value   = cp.class_name || '';
+      document.getElementById('subjectInput').value = cp.subject    || '';
+      range.value = cp.max_words || 100; updateWordLabel();
+
+      // rows
+      while(tbody.firstChild) tbody.removeChild(tbody.firstChild);
+      if(cp.rows && cp.rows.length){
+        cp.rows.forEach(r => addRow({
+          id:r.id, name:r.name, gender:r.gender, tests:r.tests, homework:r.homework,
+          organisation:r.organisation, participation:r.participation,
+          comments:r.comments, report:r.report
+        }));
+      }else{
+        addRow();
+      }
+      rememberLoaded(cp);
+    }catch(e){ console.warn('load failed', e); }
+  }
+
+  document.getElementById('saveClassBtn').onclick = async () => {
+    const cls = document.getElementById('classInput').value.trim();
+    const sub = document.getElementById('subjectInput').value.trim();
+    const max = range.value;
+    if(!cls || !sub) return alert('Please fill Class and Subject.');
+
+    const trs  = Array.from(tbody.querySelectorAll('tr'));
+
+    try{
+      // Same class still open: send only the rows that changed
+      if(loaded && loaded.class_name === cls && loaded.subject === sub){
+        const r = await patchRows(trs, max);
+        if(!r.ok){
+          if(r.status === 409) return alert('This class was changed in another tab or by a background job. Reload it before saving.');
+          return alert(r.error || 'Save failed.');
+        }
+        return alert('Class saved.');
+      }
+
+      const rows = trs.map(r => ({id: r.dataset.rowId ? Number(r.dataset.rowId) : undefined, ...readRow(r)}));
+      const res = await fetch('/class_profile/save', {
+        method:'POST', headers:{'Content-Type':'application/json'},
+        body: JSON.stringify({ class: cls, subject: sub, max_words: max, rows })
+      });
+      if(!res.ok){
+        const err = await res.json().catch(()=>({error:'Save failed'}));
+        return alert(err.error || 'Save failed.');
+      }
+      const saved = await res.json();
+      (saved.row_ids || []).forEach((id, i) => { if(trs[i]) trs[i].dataset.rowId = id; });
+      rememberLoaded(saved);
+      await refreshSavedClasses();
+      alert('Class saved.');
+    }catch(e){ alert('Save failed.'); }
+  };
+
+  document.getElementById('newClassBtn').onclick = () => {
+    document.getElementById('classInput').value = '';
+    document.getElementById('subjectInput').value = '';
+    range.value = 100; updateWordLabel();
+    while(tbody.firstChild) tbody.removeChild(tbody.firstChild);
+    loaded = null;
+    addRow(); // ensure one editable row
+  };
+
+  // Exports are built server-side from the saved class, so save first
+  const exportSaved = fmt => {
+    if(!loaded){ alert('Save or load a class first.'); return; }
+    window.location.href = `/class_profile/${loaded.id}/export.${fmt}`;
+  };
+  document.getElementById('exportCsv').onclick = () => exportSaved('csv');
+  document.getElementById('exportXlsx').onclick = () => exportSaved('xlsx');
+  const cardsBtn = document.getElementById('exportCards');
+  if(cardsBtn) cardsBtn.onclick = () => {
+    if(!loaded){ alert('Save or load a class first.'); return; }
+    window.location.href = `/class_profile/${loaded.id}/report_cards.zip?format=pdf`;
+  };
+
+  savedSel.addEventListener('change', e => loadSelectedClassProfile(e.target.value));
+
+  /* ------- initial boot ------- */
+  updateWordLabel();
+  addRow();            // ensure a row is visible immediately after login
+  refreshSavedClasses();
+})();
@@ -0,0 +1,94 @@
+# tests/conftest.py
+# -----------------------------------------
+# Report Rocket – shared pytest fixtures
+#
+#   python -m pytest -q
+#   TEST_DATABASE_URL=postgresql://... python -m pytest -q
+#
+# Tests run against a throwaway SQLite file unless TEST_DATABASE_URL is
+# set (DATABASE_URL is never used, so a shell pointed at a real database
+# can't be written to). LLM calls go to bench/fake_openai.py on a free
+# local port.
+# -----------------------------------------
+import itertools
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+os.environ["DATABASE_URL"] = (os.getenv("TEST_DATABASE_URL")
+                              or f"sqlite:///{tempfile.mkdtemp(prefix='rr-tests-')}/test.db")
+
+_emails = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app
+    from models import db
+
+    app = create_app({"TESTING": True, "WTF_CSRF_ENABLED": False})
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def make_user(app):
+    """`make_user(plan, reports_limit)` -> id of a fresh account."""
+    from models import db, User
+
+    def make(plan="free", reports_limit=None, reports_used=0):
+        with app.app_context():
+            user = User(email=f"user{next(_emails)}-{os.getpid()}@test-school.org",
+                        password_hash="!", plan=plan,
+                        reports_used=reports_used, reports_limit=reports_limit)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """`login(user_id)` -> a test client with that account's session."""
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+        return client
+    return client_for
+
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    from fake_openai import make_server
+
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def llm(fake_openai, monkeypatch):
+    """The fake server behind llm_client.get_client(), errors off, limiter off."""
+    import llm_client
+    import ratelimit
+
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{fake_openai.server_port}/v1")
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "_client_pid", None)
+    monkeypatch.setattr(ratelimit, "RPM", 0)
+    fake_openai.error_rate = 0.0
+    fake_openai.error_statuses = (429, 500)
+    fake_openai.calls = fake_openai.errors = 0
+    return fake_openai
@@ -0,0 +1,98 @@
+import pytest
+
+import quota
+from models import db, User
+
+
+def _used(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).reports_used
+
+
+@pytest.fixture
+def reserves(monkeypatch):
+    """Every quota.reserve(user_id, n) call, recorded."""
+    calls = []
+    real = quota.reserve
+
+    def spy(user_id, n=1, commit=True):
+        calls.append(n)
+        return real(user_id, n, commit)
+    monkeypatch.setattr(quota, "reserve", spy)
+    return calls
+
+
+def _rows(tag, n):
+    return [{"name": f"Pupil {i}", "tests": "Good", "comments": f"{tag} {i}"} for i in range(n)]
+
+
+def test_results_in_input_order_with_one_reservation(app, make_user, login, llm, reserves):
+    user_id = make_user(reports_limit=20)
+    r = login(user_id).post("/generate_reports_batch",
+                            json={"class": "7A", "subject": "English", "rows": _rows("order", 5)})
+    body = r.get_json()
+    assert r.status_code == 200
+    assert [x["index"] for x in body["results"]] == list(range(5))
+    assert all(x["report"].startswith(f"Pupil {i}") for i, x in enumerate(body["results"]))
+    assert (body["generated"], body["failed"]) == (5, 0)
+    assert reserves == [5]
+    assert _used(app, user_id) == 5
+
+
+def test_cached_and_failed_rows_are_refunded(app, make_user, login, llm, reserves):
+    user_id = make_user(reports_limit=20)
+    client = login(user_id)
+    warm = {"name": "Ana Silva", "tests": "Great", "comments": "refund warm"}
+    client.post("/generate_reports_batch", json={"rows": [warm], "pack": 1})
+    assert _used(app, user_id) == 1
+
+    llm.error_rate, llm.error_statuses = 1.0, (400,)   # not retried
+    rows = [{"name": "Ben Cole", "tests": "Ok", "comments": "refund miss 1"},
+            dict(warm, name="Cara Diaz"),
+            {"name": "Dan Eze", "tests": "Low", "comments": "refund miss 2"}]
+    body = client.post("/generate_reports_batch", json={"rows": rows, "pack": 1}).get_json()
+
+    assert [x["index"] for x in body["results"]] == [0, 1, 2]
+    assert "error" in body["results"][0] and "error" in body["results"][2]
+    assert body["results"][1]["cached"] is True
+    assert body["results"][1]["report"].startswith("Cara Diaz")
+    assert (body["generated"], body["failed"]) == (1, 2)
+    assert reserves == [1, 3]
+    assert _used(app, user_id) == 1   # the cache hit and both failures were refunded
+
+
+def test_over_quota_is_rejected_before_generating(app, make_user, login, llm):
+    user_id = make_user(reports_limit=3)
+    r = login(user_id).post("/generate_reports_batch", json={"rows": _rows("quota", 4)})
+    assert r.status_code == 402
+    assert llm.calls == 0
+    assert _used(app, user_id) == 0
+
+
+@pytest.mark.parametrize("body", [
+    {"rows": ["x", 5]},
+    {"rows": [{"name": "Ok"}, None]},
+    {"rows": [{"name": 5, "tests": "Good"}]},
+    ["not", "an", "object"],
+    {"rows": []},
+    {"rows": {"name": "A"}},
+])
+def test_malformed_rows_are_400_without_charge(app, make_user, login, llm, reserves, body):
+    user_id = make_user(reports_limit=5)
+    r = login(user_id).post("/generate_reports_batch", json=body)
+    assert r.status_code == 400
+    assert reserves == []
+    assert _used(app, user_id) == 0
+
+
+def test_too_many_rows(app, make_user, login, llm):
+    from generation import MAX_BATCH_ROWS
+    r = login(make_user()).post("/generate_reports_batch", json={"rows": _rows("max", MAX_BATCH_ROWS + 1)})
+    assert r.status_code == 400
+
+
+@pytest.mark.parametrize("name", [5, ["Ana"], {"first": "Ana"}])
+def test_single_report_rejects_non_text_names(app, make_user, login, llm, reserves, name):
+    r = login(make_user(reports_limit=5)).post("/generate_report", json={"name": name})
+    assert r.status_code == 400
+    assert reserves == [] and llm.calls == 0
@@ -0,0 +1,119 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+
+import llm_client
+import metrics
+import ratelimit
+from generation import complete_stream
+from models import db, User
+
+
+def _events(response):
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _used(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).reports_used
+
+
+def test_single_stream_sends_deltas_then_done(app, make_user, login, llm):
+    user_id = make_user(reports_limit=5)
+    client = login(user_id)
+    row = {"name": "Ana Silva", "tests": "Good", "comments": "stream single", "max_words": 20}
+
+    events = _events(client.post("/generate_report?stream=1", json=row))
+    deltas, done = events[:-1], events[-1]
+    assert deltas and all("delta" in e for e in deltas)
+    assert done["done"] is True and done["cached"] is False
+    assert done["report"].startswith("Ana Silva")
+    assert len(done["report"].split()) <= 20
+    assert _used(app, user_id) == 1
+
+    # Same inputs again: one delta with the whole cached report, refunded
+    events = _events(client.post("/generate_report", json=dict(row, name="Ben Cole"),
+                                 headers={"Accept": "application/x-ndjson"}))
+    assert [e.get("delta") for e in events[:-1]] == [events[-1]["report"]]
+    assert events[-1]["cached"] is True and events[-1]["report"].startswith("Ben Cole")
+    assert _used(app, user_id) == 1
+
+
+def test_single_stream_error_is_an_event_and_refunded(app, make_user, login, llm):
+    user_id = make_user(reports_limit=5)
+    llm.error_rate, llm.error_statuses = 1.0, (400,)
+    events = _events(login(user_id).post("/generate_report?stream=1",
+                                         json={"name": "Ana", "comments": "stream fail"}))
+    assert len(events) == 1 and events[0]["error"].startswith("AI error")
+    assert _used(app, user_id) == 0
+
+
+def test_batch_stream_one_event_per_row_then_summary(app, make_user, login, llm):
+    user_id = make_user(reports_limit=10)
+    client = login(user_id)
+    client.post("/generate_reports_batch", json={"rows": [{"name": "Ana", "comments": "warm"}], "pack": 1})
+
+    llm.error_rate, llm.error_statuses = 1.0, (400,)
+    rows = [{"name": "Ben", "comments": "new 1"}, {"name": "Cara", "comments": "warm"},
+            {"name": "Dan", "comments": "new 2"}]
+    events = _events(client.post("/generate_reports_batch?stream=1", json={"rows": rows, "pack": 1}))
+
+    *per_row, summary = events
+    assert sorted(e["index"] for e in per_row) == [0, 1, 2]
+    by_index = {e["index"]: e for e in per_row}
+    assert by_index[1]["cached"] is True and by_index[1]["report"].startswith("Cara")
+    assert "error" in by_index[0] and "error" in by_index[2]
+    # Cache hits are emitted before anything that needs a completion
+    assert per_row[0]["index"] == 1
+    assert summary == {"done": True, "generated": 1, "failed": 2}
+    assert _used(app, user_id) == 1   # only the warm-up was charged
+
+
+@pytest.fixture
+def observed(monkeypatch):
+    """Timer enter/exit and ratelimit.settle calls, in order, for complete_stream."""
+    events = []
+    real = metrics.llm_call
+
+    @contextmanager
+    def timed(model, call):
+        events.append("start")
+        with real(model, call) as record:
+            yield record
+        events.append(("stop", record.usage))
+    monkeypatch.setattr(metrics, "llm_call", timed)
+    monkeypatch.setattr(ratelimit, "settle", lambda estimate, usage: events.append(("settle", usage)))
+    return events
+
+
+def test_stream_is_timed_to_the_end_and_settled_with_usage(app, llm, observed):
+    with app.app_context():
+        deltas = []
+        for delta in complete_stream(llm_client.get_client(), "Write up to 12 words for student Ana.", 12):
+            deltas.append(delta)
+            observed.append("delta")
+    assert observed[0] == "start" and observed[1:-2] == ["delta"] * len(deltas)
+    (_, usage), settled = observed[-2], observed[-1]
+    assert usage and usage[1] > 0
+    assert settled == ("settle", usage)
+
+
+def test_stream_stopped_early_settles_an_estimate(app, llm, observed):
+    with app.app_context():
+        text = "".join(complete_stream(llm_client.get_client(), "Write up to 60 words for student Ana.", 5))
+    assert 5 < len(text.split()) < 60
+    assert observed[-2] == ("stop", None)
+    kind, (prompt_tokens, completion_tokens) = observed[-1]
+    assert kind == "settle" and prompt_tokens > 0
+    assert completion_tokens == pytest.approx(len(text) / 4)
+
+
+def test_abandoned_stream_is_still_settled(app, llm, observed):
+    with app.app_context():
+        stream = complete_stream(llm_client.get_client(), "Write up to 40 words for student Ana.", 40)
+        next(stream)
+        stream.close()
+    assert observed[-2] == ("stop", None)
+    assert observed[-1][0] == "settle"
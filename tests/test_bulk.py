@@ -0,0 +1,109 @@
+import io
+
+import pytest
+
+import bulk
+import llm_client
+from models import db, User, ClassRow, BulkBatch, BulkItem
+
+
+@pytest.fixture
+def batches(llm, monkeypatch):
+    """The fake's Batch API, finishing batches on the first poll."""
+    monkeypatch.setattr(llm, "batch_delay", 0.0)
+    monkeypatch.setattr(llm, "batch_fail_every", 0)
+    return llm
+
+
+def _school(make_user, login, rows):
+    user_id = make_user(plan="school", reports_limit=20)
+    r = login(user_id).post("/class_profile/save",
+                            json={"class": "11E", "subject": "Music", "rows": rows})
+    return user_id, r.get_json()["id"]
+
+
+def _reports(profile_id):
+    return [(r.name, r.report) for r in
+            ClassRow.query.filter_by(profile_id=profile_id).order_by(ClassRow.position)]
+
+
+ROWS = [{"name": "Ana Silva", "tests": "Good", "comments": "bulk shared"},
+        {"name": "Ben Cole", "tests": "Good", "comments": "bulk shared"},
+        {"name": "Cara Diaz", "tests": "Ok", "comments": "bulk c"},
+        {"name": "Dan Eze", "tests": "Low", "comments": "bulk d"},
+        {"name": "Eve Ford", "report": "Already written."}]
+
+
+def test_batch_applies_reports_and_refunds_failures(app, make_user, login, batches):
+    batches.batch_fail_every = 2          # the second request (Cara) fails
+    user_id, profile_id = _school(make_user, login, ROWS)
+    with app.app_context():
+        batch = bulk.create_batch(llm_client.get_client(), user_ids=[user_id])
+        assert (batch.status, batch.requests, batch.total) == ("applied", 3, 4)
+        assert (batch.completed, batch.failed) == (3, 1)
+
+        reports = _reports(profile_id)
+        assert reports[0][1].startswith("Ana Silva") and reports[1][1].startswith("Ben Cole")
+        assert not reports[2][1] and reports[3][1].startswith("Dan Eze")
+        assert reports[4][1] == "Already written."
+        # Three requests charged (Ana and Ben share one), Cara's refunded
+        assert db.session.get(User, user_id).reports_used == 2
+        assert [r["name"] for r in bulk.pending_rows([user_id])] == ["Cara Diaz"]
+
+
+def test_reapplying_a_batch_changes_nothing(app, make_user, login, batches):
+    user_id, profile_id = _school(make_user, login, ROWS[:3])
+    with app.app_context():
+        client = llm_client.get_client()
+        batch = bulk.create_batch(client, user_ids=[user_id])
+        before = (_reports(profile_id), batch.completed, batch.failed,
+                  db.session.get(User, user_id).reports_used)
+
+        batch.status = "completed"
+        db.session.commit()
+        assert bulk.advance(client, batch) == "applied"
+        db.session.expire_all()
+        assert (_reports(profile_id), batch.completed, batch.failed,
+                db.session.get(User, user_id).reports_used) == before
+
+
+def test_rows_in_an_open_batch_are_not_collected_again(app, make_user, login, batches):
+    batches.batch_delay = 3600
+    user_id, _ = _school(make_user, login, ROWS[2:4])
+    with app.app_context():
+        batch = bulk.create_batch(llm_client.get_client(), user_ids=[user_id])
+        assert batch.status == "submitted"
+        assert bulk.pending_rows([user_id]) == []
+        assert bulk.create_batch(llm_client.get_client(), user_ids=[user_id]) is None
+
+
+def test_resume_finds_a_batch_created_before_a_crash(app, make_user, login, batches):
+    user_id, profile_id = _school(make_user, login, ROWS[2:4])
+    with app.app_context():
+        client = llm_client.get_client()
+        # create_batch() stopped after recording the items...
+        batch = BulkBatch(status="building", model=bulk.MODEL, total=2, requests=2)
+        db.session.add(batch)
+        db.session.flush()
+        db.session.execute(BulkItem.__table__.insert(), [
+            {"batch_id": batch.id, "user_id": user_id, "profile_id": profile_id,
+             "row_id": r["id"], "custom_id": f"bulk{batch.id}-{n}", "cache_key": f"resume-{r['id']}",
+             "row_json": r, "status": "pending"}
+            for n, r in enumerate(bulk.pending_rows([user_id]), 1)
+        ])
+        db.session.commit()
+        # ...and the upload and remote create went through without being saved
+        fh = io.BytesIO()
+        bulk._write_jsonl(batch, fh)
+        fh.seek(0)
+        batch.input_file_id = client.files.create(file=("resume.jsonl", fh), purpose="batch").id
+        db.session.commit()
+        remote = client.batches.create(input_file_id=batch.input_file_id,
+                                       endpoint="/v1/chat/completions", completion_window="24h",
+                                       metadata={"bulk_batch_id": str(batch.id)})
+        created = len(batches.batches)
+
+        assert bulk.advance(client, batch) == "applied"
+        assert batch.openai_batch_id == remote.id
+        assert len(batches.batches) == created
+        assert all(report.startswith(name) for name, report in _reports(profile_id))
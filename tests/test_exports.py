@@ -0,0 +1,93 @@
+import csv
+import io
+import os
+import time
+import zipfile
+
+import pytest
+
+import exports
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    """Stored copies go to a temp dir; no background sweeper."""
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(exports, "start_sweeper", lambda logger=None: None)
+    return tmp_path
+
+
+def _profile(client, rows):
+    r = client.post("/class_profile/save", json={"class": "10D", "subject": "Drama", "rows": rows})
+    return r.get_json()["id"]
+
+
+ROWS = [{"name": "Ana", "gender": "F", "tests": "Good", "report": "Ana shines."},
+        {"name": "Ben", "gender": "M", "tests": "Ok", "report": "Ben tries."}]
+
+
+def test_csv_export_streams_stored_rows(make_user, login):
+    client = login(make_user())
+    cp_id = _profile(client, ROWS)
+
+    r = client.get(f"/class_profile/{cp_id}/export.csv")
+    assert r.status_code == 200 and r.mimetype == "text/csv"
+    assert "10D_Drama.csv" in r.headers["Content-Disposition"]
+    assert r.headers["Cache-Control"] == "private, no-store"
+    table = list(csv.reader(io.StringIO(r.get_data(as_text=True).lstrip("﻿"))))
+    assert table == [["Name", "Gender", "Report Generated"],
+                     ["Ana", "F", "Ana shines."], ["Ben", "M", "Ben tries."]]
+
+    full = client.get(f"/class_profile/{cp_id}/export.csv?full=1").get_data(as_text=True)
+    assert "Class tests" in full.splitlines()[0]
+
+
+def test_xlsx_export_is_a_workbook(make_user, login):
+    client = login(make_user())
+    cp_id = _profile(client, ROWS)
+    r = client.get(f"/class_profile/{cp_id}/export.xlsx")
+    assert r.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(r.data)) as z:
+        assert z.testzip() is None
+        sheets = [n for n in z.namelist() if n.startswith("xl/worksheets/")]
+        assert sheets and "Ben tries." in z.read(sheets[0]).decode("utf-8")
+
+
+def test_export_is_scoped_to_its_owner(make_user, login):
+    cp_id = _profile(login(make_user()), ROWS)
+    other = login(make_user())
+    assert other.get(f"/class_profile/{cp_id}/export.csv").status_code == 404
+    assert other.get(f"/class_profile/{cp_id}/export.xlsx").status_code == 404
+    assert other.get(f"/class_profile/{cp_id}/export.pdf").status_code == 400
+
+
+def test_stored_copies_are_per_user_and_deduplicated(make_user, login, export_dir):
+    owner_id = make_user()
+    owner, other = login(owner_id), login(make_user())
+    body = {"class": "10D", "subject": "Drama", "rows": ROWS}
+
+    first = owner.post("/save_report", json=body).get_json()["url"]
+    second = owner.post("/save_report", json=body).get_json()["url"]
+    stored = os.listdir(export_dir / str(owner_id))
+    assert len(stored) == 1 and first.split("?")[0] == second.split("?")[0]
+
+    r = owner.get(first)
+    assert r.status_code == 200 and b"Ana shines." in r.data
+    r.close()
+    assert other.get(first).status_code == 404
+    assert other.get(f"/download/..%2F{owner_id}%2F{stored[0]}").status_code == 404
+
+
+def test_sweep_enforces_ttl_then_size_cap(export_dir):
+    now = time.time()
+    folder = export_dir / "1"
+    folder.mkdir()
+    for name, age, size in (("old.csv", 100, 10), ("mid.csv", 20, 30), ("new.csv", 10, 30)):
+        path = folder / name
+        path.write_bytes(b"x" * size)
+        os.utime(path, (now - age, now - age))
+
+    assert exports.sweep(now=now, ttl=50, max_bytes=1000) == 1
+    assert sorted(os.listdir(folder)) == ["mid.csv", "new.csv"]
+    assert exports.sweep(now=now, ttl=50, max_bytes=40) == 1
+    assert os.listdir(folder) == ["new.csv"]
@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import jobs
+import llm_client
+import ratelimit
+from models import db, User, ClassRow, GenerationJob, GenerationTask
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(app):
+    """claim_tasks() takes any pending task, so start every test with none."""
+    with app.app_context():
+        db.session.execute(
+            update(GenerationTask)
+            .where(GenerationTask.status.in_(("pending", "running")))
+            .values(status="cancelled")
+        )
+        db.session.commit()
+
+
+def _submit(login, user_id, names):
+    client = login(user_id)
+    saved = client.post("/class_profile/save", json={
+        "class": "8B", "subject": "Science",
+        "rows": [{"name": n, "tests": "Good", "comments": f"jobs {n}"} for n in names],
+    }).get_json()
+    r = client.post(f"/class_profile/{saved['id']}/generate_job", json={})
+    assert r.status_code == 202
+    return saved["id"], r.get_json()["id"]
+
+
+def _used(user_id):
+    return db.session.get(User, user_id).reports_used
+
+
+def _tasks(job_id):
+    return (GenerationTask.query.filter_by(job_id=job_id)
+            .order_by(GenerationTask.row_index).all())
+
+
+def test_claim_marks_tasks_and_job_running(app, make_user, login):
+    user_id = make_user(reports_limit=10)
+    _, job_id = _submit(login, user_id, ["Ana", "Ben", "Cara"])
+    with app.app_context():
+        claimed = jobs.claim_tasks(2)
+        assert [t.row_index for t in claimed] == [0, 1]
+        assert all(t.status == "running" and t.attempts == 1 and t.claim_token for t in claimed)
+        assert db.session.get(GenerationJob, job_id).status == "running"
+        assert [t.row_index for t in jobs.claim_tasks(5)] == [2]
+        assert jobs.claim_tasks(5) == []
+        assert _used(user_id) == 3
+
+
+def test_work_once_writes_reports_back(app, make_user, login, llm):
+    user_id = make_user(reports_limit=10)
+    profile_id, job_id = _submit(login, user_id, ["Ana Silva", "Ben Cole"])
+    with app.app_context():
+        assert jobs.work_once(llm_client.get_client(), 8) == 2
+        job = db.session.get(GenerationJob, job_id)
+        assert (job.status, job.completed, job.failed) == ("done", 2, 0)
+        rows = ClassRow.query.filter_by(profile_id=profile_id).order_by(ClassRow.id).all()
+        assert rows[0].report.startswith("Ana Silva")
+        assert rows[1].report.startswith("Ben Cole")
+        assert _used(user_id) == 2
+
+
+def test_renamed_rows_are_not_overwritten(app, make_user, login, llm):
+    user_id = make_user(reports_limit=10)
+    profile_id, job_id = _submit(login, user_id, ["Ana Silva", "Ben Cole"])
+    with app.app_context():
+        row = ClassRow.query.filter_by(profile_id=profile_id, name="Ben Cole").one()
+        row.name = "Benjamin Cole"
+        db.session.commit()
+        jobs.work_once(llm_client.get_client(), 8)
+        db.session.refresh(row)
+        assert not row.report
+        assert _tasks(job_id)[1].report.startswith("Ben Cole")
+
+
+def test_failed_and_cached_rows_are_refunded(app, make_user, login, llm):
+    user_id = make_user(reports_limit=10)
+    _submit(login, user_id, ["Dan Eze"])
+    with app.app_context():
+        jobs.work_once(llm_client.get_client(), 8)
+        assert _used(user_id) == 1
+
+    # The same row again is a cache hit, a new one is rejected by the fake
+    llm.error_rate, llm.error_statuses = 1.0, (400,)
+    _, job_id = _submit(login, user_id, ["Dan Eze", "Eve Ford"])
+    with app.app_context():
+        assert _used(user_id) == 3
+        jobs.work_once(llm_client.get_client(), 8)
+        hit, miss = _tasks(job_id)
+        assert hit.status == "done" and hit.cached
+        assert miss.status == "failed" and miss.error
+        job = db.session.get(GenerationJob, job_id)
+        assert (job.completed, job.failed) == (1, 1)
+        assert _used(user_id) == 1
+
+
+def test_requeue_stale_retries_then_gives_up(app, make_user, login):
+    user_id = make_user(reports_limit=10)
+    _, job_id = _submit(login, user_id, ["Ana", "Ben"])
+    with app.app_context():
+        jobs.claim_tasks(8)
+        first, second = _tasks(job_id)
+        second.attempts = jobs.MAX_ATTEMPTS
+        db.session.commit()
+
+        later = datetime.utcnow() + jobs.LEASE + timedelta(seconds=1)
+        assert jobs.requeue_stale(now=later) == (1, 1)
+        db.session.refresh(first)
+        db.session.refresh(second)
+        assert (first.status, first.claim_token) == ("pending", None)
+        assert second.status == "failed"
+        assert _used(user_id) == 1
+
+
+def test_rate_limited_batch_goes_back_to_pending(app, make_user, login, monkeypatch):
+    def limited(*args, **kwargs):
+        raise ratelimit.RateLimited(30)
+        yield
+    monkeypatch.setattr(jobs, "generate_many", limited)
+
+    user_id = make_user(reports_limit=10)
+    _, job_id = _submit(login, user_id, ["Ana", "Ben"])
+    with app.app_context():
+        assert jobs.work_once(None, 8) == 2
+        assert [(t.status, t.claim_token) for t in _tasks(job_id)] == [("pending", None)] * 2
+        assert _used(user_id) == 2
+
+        # Out of attempts: fail with the limiter's message and refund
+        for t in _tasks(job_id):
+            t.attempts = jobs.MAX_ATTEMPTS - 1
+        db.session.commit()
+        jobs.work_once(None, 8)
+        tasks = _tasks(job_id)
+        assert all(t.status == "failed" and "try again" in t.error for t in tasks)
+        job = db.session.get(GenerationJob, job_id)
+        assert (job.status, job.failed) == ("done", 2)
+        assert _used(user_id) == 0
+
+
+def test_rows_finished_before_an_error_are_kept(app, make_user, login, monkeypatch):
+    def partial(client, rows, header, **kwargs):
+        yield 0, "Ana did well.", None, False
+        raise RuntimeError("worker lost its connection")
+    monkeypatch.setattr(jobs, "generate_many", partial)
+
+    user_id = make_user(reports_limit=10)
+    profile_id, job_id = _submit(login, user_id, ["Ana", "Ben"])
+    with app.app_context():
+        jobs.work_once(None, 8)
+        done, retry = _tasks(job_id)
+        assert (done.status, done.report) == ("done", "Ana did well.")
+        assert retry.status == "pending"
+        assert ClassRow.query.filter_by(profile_id=profile_id, name="Ana").one().report \
+            == "Ana did well."
+        assert _used(user_id) == 2
@@ -0,0 +1,33 @@
+import pytest
+
+import length_control
+from length_control import EmptyReport, fit
+
+
+def test_in_limit_reply_is_kept():
+    assert fit("  Ana reads widely.  ", 10) == ("Ana reads widely.", False)
+
+
+def test_over_long_reply_ends_on_last_sentence():
+    text = "Ana reads widely. She asks good questions and helps others in class."
+    assert fit(text, 6) == ("Ana reads widely.", True)
+
+
+def test_truncated_reply_without_sentence_end_gets_a_full_stop():
+    assert fit("Ana reads widely and asks good,", 10, truncated=True) == (
+        "Ana reads widely and asks good.", True)
+
+
+@pytest.mark.parametrize("text, truncated", [
+    ("", False), ("   ", False), (None, True), ("", True), ("—", True), ("- ...", False),
+])
+def test_empty_reply_is_an_error(text, truncated):
+    with pytest.raises(EmptyReport):
+        fit(text, 50, truncated)
+
+
+def test_finish_does_not_record_empty_replies():
+    before = length_control.snapshot().get("test-model", {}).get("reports", 0)
+    with pytest.raises(EmptyReport):
+        length_control.finish("test-model", "", 50, truncated=True)
+    assert length_control.snapshot().get("test-model", {}).get("reports", 0) == before
@@ -0,0 +1,162 @@
+import socket
+import time
+
+import httpx
+import openai
+import pytest
+
+import llm_client
+from llm_client import CircuitBreaker, ResilientTransport
+
+BODY = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "Write up to 20 words"}]}
+
+
+@pytest.fixture
+def fake(fake_openai, monkeypatch):
+    """The shared fake server with errors off and counters zeroed."""
+    fake_openai.error_rate = 0.0
+    fake_openai.error_statuses = (429, 500)
+    fake_openai.calls = fake_openai.errors = 0
+    # Keep the jittered backoff to milliseconds
+    monkeypatch.setattr(llm_client, "BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(llm_client, "BACKOFF_MAX", 0.01)
+    return fake_openai
+
+
+def _failing(server, *statuses):
+    server.error_rate = 1.0
+    server.error_statuses = statuses
+
+
+def _client(server, breaker, max_retries=3, port=None):
+    transport = ResilientTransport(httpx.HTTPTransport(), breaker,
+                                   max_retries=max_retries, deadline=10)
+    base = f"http://127.0.0.1:{port or server.server_port}/v1"
+    return httpx.Client(transport=transport, base_url=base, timeout=5)
+
+
+def _post(client):
+    return client.post("/chat/completions", json=BODY)
+
+
+def test_success_is_one_attempt(fake):
+    breaker = CircuitBreaker(failures=3, cooldown=60)
+    with _client(fake, breaker) as client:
+        assert _post(client).status_code == 200
+    assert fake.calls == 1
+    assert breaker.state == "closed"
+
+
+@pytest.mark.parametrize("status", [500, 429])
+def test_retries_up_to_max_then_returns_last_response(fake, status):
+    _failing(fake, status)
+    breaker = CircuitBreaker(failures=100, cooldown=60)
+    with _client(fake, breaker, max_retries=2) as client:
+        response = _post(client)
+    assert response.status_code == status
+    assert fake.calls == 3   # first attempt + 2 retries
+    assert breaker.state == "closed"
+
+
+def test_429_honours_retry_after_ms_and_never_trips_breaker(fake):
+    _failing(fake, 429)   # the fake sends retry-after-ms: 200
+    breaker = CircuitBreaker(failures=1, cooldown=60)
+    started = time.monotonic()
+    with _client(fake, breaker, max_retries=2) as client:
+        assert _post(client).status_code == 429
+    assert time.monotonic() - started >= 0.4
+    assert breaker.state == "closed" and breaker.consecutive == 0
+
+
+def test_client_errors_are_not_retried(fake):
+    breaker = CircuitBreaker(failures=1, cooldown=60)
+    with _client(fake, breaker) as client:
+        assert client.post("/no/such/endpoint", json=BODY).status_code == 404
+    assert breaker.state == "closed"
+
+
+def test_breaker_opens_after_consecutive_failures_and_short_circuits(fake):
+    _failing(fake, 500)
+    breaker = CircuitBreaker(failures=2, cooldown=60)
+    with _client(fake, breaker, max_retries=5) as client:
+        response = _post(client)
+        # Two real attempts open the breaker; the third is answered locally
+        assert fake.calls == 2
+        assert breaker.state == "open"
+        assert response.status_code == 503
+        assert response.headers[llm_client.CIRCUIT_HEADER] == "1"
+
+        response = _post(client)
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) > 0
+    assert fake.calls == 2
+
+
+def test_half_open_probe_success_closes_breaker(fake):
+    _failing(fake, 500)
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    with _client(fake, breaker, max_retries=0) as client:
+        assert _post(client).status_code == 500
+        assert breaker.state == "open"
+
+        fake.error_rate = 0.0
+        time.sleep(0.1)
+        assert _post(client).status_code == 200
+    assert breaker.state == "closed" and breaker.consecutive == 0
+    assert fake.calls == 2
+
+
+def test_half_open_probe_failure_reopens_breaker(fake):
+    _failing(fake, 502)
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    with _client(fake, breaker, max_retries=0) as client:
+        _post(client)
+        time.sleep(0.1)
+        assert _post(client).status_code == 502
+        assert breaker.state == "open"
+        # Cooling down again: nothing reaches the server
+        assert _post(client).headers.get(llm_client.CIRCUIT_HEADER) == "1"
+    assert fake.calls == 2
+
+
+def test_breaker_trips_are_counted_once_per_opening(monkeypatch):
+    events = []
+
+    class Recorder:
+        def labels(self, event):
+            self.event = event
+            return self
+
+        def inc(self, amount=1):
+            events.append((self.event, amount))
+    monkeypatch.setattr(llm_client.metrics, "LLM_HTTP", Recorder())
+    opened = llm_client.stats["breaker_opened"]
+
+    breaker = CircuitBreaker(failures=2, cooldown=0)
+    breaker.failure()
+    breaker.failure()
+    breaker.failure()       # already open: not a new trip
+    assert breaker.allow()  # cooled down: half-open probe
+    breaker.failure()
+    assert llm_client.stats["breaker_opened"] == opened + 2
+    assert events == [("breaker_opened", 1)] * 2
+
+
+def test_connection_errors_are_retried_then_raised(fake):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed_port = s.getsockname()[1]
+    breaker = CircuitBreaker(failures=100, cooldown=60)
+    with _client(fake, breaker, max_retries=2, port=closed_port) as client:
+        with pytest.raises(httpx.ConnectError):
+            _post(client)
+    assert breaker.consecutive == 3
+
+
+def test_sdk_retries_do_not_stack(fake, monkeypatch):
+    monkeypatch.setattr(llm_client, "breaker", CircuitBreaker(failures=100, cooldown=60))
+    _failing(fake, 500)
+    client = llm_client.build_client("fake", f"http://127.0.0.1:{fake.server_port}/v1")
+    with pytest.raises(openai.InternalServerError):
+        client.chat.completions.create(**BODY)
+    assert fake.calls == llm_client.MAX_RETRIES + 1
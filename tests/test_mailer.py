@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+import mailer
+from models import db, EmailOutbox
+
+
+class ScriptedSender:
+    """Records every send; `fail(recipients)` returns a SendError to raise, or None."""
+
+    def __init__(self, fail=lambda recipients: None):
+        self.calls = []
+        self.fail = fail
+
+    def send(self, recipients, subject, html):
+        self.calls.append(list(recipients))
+        error = self.fail(recipients)
+        if error:
+            raise error
+
+
+@pytest.fixture
+def outbox(app):
+    with app.app_context():
+        db.session.execute(delete(EmailOutbox))
+        db.session.commit()
+        yield
+        db.session.rollback()
+
+
+def _queue(*emails, subject="Welcome", html="<p>Hi</p>"):
+    ids = [mailer.enqueue(e, subject, html) for e in emails]
+    db.session.commit()
+    return [m.id for m in ids]
+
+
+def _get(message_id):
+    return db.session.get(EmailOutbox, message_id)
+
+
+def test_identical_messages_go_out_as_one_request(outbox):
+    _queue("a@school.org", "b@school.org", "c@school.org")
+    _queue("d@school.org", subject="Receipt")
+    sender = ScriptedSender()
+
+    assert mailer.deliver_once(sender) == 4
+    assert sorted(sender.calls) == [["a@school.org", "b@school.org", "c@school.org"],
+                                    ["d@school.org"]]
+    assert mailer.counts() == {"sent": 4}
+    assert mailer.deliver_once(sender) == 0
+
+
+def test_retryable_failure_backs_off(outbox, monkeypatch):
+    monkeypatch.setattr(mailer.random, "uniform", lambda lo, hi: hi)
+    (message_id,) = _queue("a@school.org")
+    sender = ScriptedSender(lambda r: mailer.SendError("SendGrid 503: busy"))
+
+    before = datetime.utcnow()
+    mailer.deliver_once(sender)
+    m = _get(message_id)
+    assert (m.status, m.attempts, m.claim_token) == ("queued", 1, None)
+    assert m.last_error == "SendGrid 503: busy"
+    delay = (m.next_attempt_at - before).total_seconds()
+    assert mailer.BACKOFF_BASE - 1 <= delay <= mailer.BACKOFF_BASE + 1
+
+    # Not due yet, so nothing is claimed until the backoff has passed
+    assert mailer.deliver_once(sender) == 0
+    assert mailer.claim(now=m.next_attempt_at + timedelta(seconds=1))[0].id == message_id
+
+
+def test_backoff_grows_with_attempts_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(mailer, "BACKOFF_BASE", 30.0)
+    monkeypatch.setattr(mailer, "BACKOFF_MAX", 200.0)
+    monkeypatch.setattr(mailer.random, "uniform", lambda lo, hi: (lo, hi))
+    assert [mailer._backoff(n) for n in (1, 2, 3, 4, 5)] == [
+        (15.0, 30.0), (15.0, 60.0), (15.0, 120.0), (15.0, 200.0), (15.0, 200.0)]
+
+
+def test_gives_up_after_max_attempts(outbox, monkeypatch):
+    monkeypatch.setattr(mailer, "MAX_ATTEMPTS", 2)
+    (message_id,) = _queue("a@school.org")
+    sender = ScriptedSender(lambda r: mailer.SendError("SendGrid unreachable: timeout"))
+
+    mailer.deliver_once(sender)
+    _get(message_id).next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    mailer.deliver_once(sender)
+    m = _get(message_id)
+    assert (m.status, m.attempts) == ("failed", 2)
+
+
+def test_permanent_failure_isolates_the_bad_address(outbox):
+    ids = _queue("a@school.org", "bad@", "c@school.org")
+    sender = ScriptedSender(lambda r: "bad@" in r and mailer.SendError("SendGrid 400: bad", retryable=False))
+
+    mailer.deliver_once(sender)
+    assert sender.calls[0] == ["a@school.org", "bad@", "c@school.org"]
+    assert [_get(i).status for i in ids] == ["sent", "failed", "sent"]
+    assert _get(ids[1]).attempts == 1
+
+
+def test_stale_sends_are_requeued(outbox):
+    (message_id,) = _queue("a@school.org")
+    mailer.claim()
+    assert mailer.requeue_stale() == 0
+    assert mailer.requeue_stale(now=datetime.utcnow() + mailer.LEASE + timedelta(seconds=1)) == 1
+    assert (_get(message_id).status, _get(message_id).claim_token) == ("queued", None)
@@ -0,0 +1,21 @@
+import pytest
+
+import metrics
+
+STATS = ["/cache/stats", "/llm/stats", "/auth/stats"]
+
+
+@pytest.mark.parametrize("path", STATS)
+def test_stats_need_the_metrics_token(app, make_user, login, monkeypatch, path):
+    monkeypatch.setattr(metrics, "TOKEN", "s3cret")
+    client = login(make_user(plan="school"))
+
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert app.test_client().get(path, headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+@pytest.mark.parametrize("path", STATS)
+def test_stats_open_without_a_token(app, monkeypatch, path):
+    monkeypatch.setattr(metrics, "TOKEN", "")
+    assert app.test_client().get(path).status_code == 200
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from generation import parse_packed
+
+ROWS = [{"name": "Ana Silva"}, {"name": "Ben Cole"}, {"name": "Cara Diaz"}]
+HEADER = {"max_words": 20}
+
+
+def _reply(*entries):
+    return json.dumps({"reports": [{"id": i, "report": t} for i, t in entries]})
+
+
+def test_good_entries_map_to_positions():
+    got = parse_packed(_reply(("s2", "Ben Cole works steadily."), ("s1", "Ana Silva leads well.")),
+                       ROWS, HEADER)
+    assert got == {0: "Ana Silva leads well.", 1: "Ben Cole works steadily."}
+
+
+@pytest.mark.parametrize("content", [
+    None, "", "not json", "[]", '"reports"', json.dumps({"reports": "Ana"}),
+    json.dumps({"students": []}),
+])
+def test_unparseable_replies_yield_nothing(content):
+    assert parse_packed(content, ROWS, HEADER) == {}
+
+
+@pytest.mark.parametrize("entry", [
+    "s1",                                           # not an object
+    {"id": 1, "report": "Ana Silva is kind."},      # id not a string
+    {"id": "x1", "report": "Ana Silva is kind."},   # wrong prefix
+    {"id": "s0", "report": "Ana Silva is kind."},   # ids are 1-based
+    {"id": "s4", "report": "Ana Silva is kind."},   # past the pack
+    {"id": "s-1", "report": "Ana Silva is kind."},
+    {"id": "s1", "report": None},
+    {"id": "s1", "report": "   "},
+    {"id": "s1", "report": "word " * 50},           # far over the 20-word limit
+    {"id": "s1", "report": "Ana Silva helps Ben Cole."},  # names another student
+])
+def test_bad_entries_are_dropped(entry):
+    content = json.dumps({"reports": [entry, {"id": "s3", "report": "Cara Diaz is curious."}]})
+    assert parse_packed(content, ROWS, HEADER) == {2: "Cara Diaz is curious."}
+
+
+def test_repeated_id_keeps_the_first_entry():
+    got = parse_packed(_reply(("s1", "Ana Silva first."), ("s1", "Ana Silva second.")), ROWS, HEADER)
+    assert got == {0: "Ana Silva first."}
+
+
+def test_kept_entries_are_held_to_the_limit():
+    long = " ".join(["Ana Silva tries hard."] * 7)   # 28 words: over 20, under the reject bound
+    got = parse_packed(_reply(("s1", long)), ROWS, HEADER)
+    assert 0 < len(got[0].split()) <= 20
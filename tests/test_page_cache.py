@@ -0,0 +1,47 @@
+import pytest
+
+import page_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    page_cache.clear()
+    yield
+    page_cache.clear()
+
+
+def test_forged_host_is_not_served_to_other_visitors(app):
+    client = app.test_client()
+    forged = client.get("/school", headers={"Host": "evil.example"})
+    assert b"http://evil.example/school" in forged.data
+
+    page = client.get("/school")
+    assert b"evil.example" not in page.data
+    assert b"http://localhost/school" in page.data
+    # ... and the genuine copy is now served from the cache
+    again = client.get("/school")
+    assert page_cache.stats["hits"] >= 1
+    assert again.data == page.data
+
+
+def test_scheme_is_part_of_the_key(app):
+    client = app.test_client()
+    secure = client.get("/school", base_url="https://localhost")
+    assert b"https://localhost/school" in secure.data
+    page = client.get("/school")
+    assert b"https://localhost/school" not in page.data
+    assert b"http://localhost/school" in page.data
+
+
+def test_entries_are_capped(app, monkeypatch):
+    monkeypatch.setattr(page_cache, "MAX_ENTRIES", 2)
+    client = app.test_client()
+    for i in range(5):
+        assert client.get("/", headers={"Host": f"host{i}.example"}).status_code == 200
+    assert page_cache.snapshot()["entries"] == 2
+
+
+def test_etag_revalidates_with_304(app):
+    client = app.test_client()
+    etag = client.get("/pricing").headers["ETag"]
+    assert client.get("/pricing", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,112 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+from models import db, User
+
+
+@pytest.fixture
+def cheap_hashes(monkeypatch):
+    """A fast hash method so tests don't pay for scrypt."""
+    monkeypatch.setattr(passwords, "METHOD", "pbkdf2:sha256:1000")
+    monkeypatch.setattr(passwords, "_prefix", None)
+
+
+@pytest.fixture
+def tiny_pool(monkeypatch):
+    """One hashing thread and no queue; `hold()` occupies it until released."""
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(passwords, "_pool", pool)
+    monkeypatch.setattr(passwords, "_slots", threading.BoundedSemaphore(1))
+    gate = threading.Event()
+    started = threading.Event()
+
+    def busy():
+        started.set()
+        gate.wait(5)
+
+    def hold():
+        threading.Thread(target=passwords._run, args=(busy,), daemon=True).start()
+        assert started.wait(5)
+    yield hold
+    gate.set()
+    pool.shutdown(wait=True)
+
+
+def test_hash_round_trip(cheap_hashes):
+    stored = passwords.hash_password("correct horse")
+    assert stored.startswith("pbkdf2:sha256:1000$")
+    assert passwords.verify_password(stored, "correct horse")
+    assert not passwords.verify_password(stored, "wrong horse")
+    assert not passwords.verify_password("", "correct horse")
+    assert not passwords.verify_password(None, "correct horse")
+
+
+def test_only_other_parameters_need_a_rehash(cheap_hashes):
+    assert not passwords.needs_rehash(passwords.hash_password("pw"))
+    old = generate_password_hash("pw", "pbkdf2:sha256:500")
+    assert passwords.needs_rehash(old)
+    assert passwords.rehash_if_needed(old, "pw").startswith("pbkdf2:sha256:1000$")
+    assert passwords.rehash_if_needed(passwords.hash_password("pw"), "pw") is None
+    assert not passwords.needs_rehash("")
+
+
+def test_full_pool_sheds_instead_of_queueing(cheap_hashes, tiny_pool):
+    shed = passwords.stats["shed"]
+    tiny_pool()
+    with pytest.raises(passwords.Overloaded) as busy:
+        passwords.hash_password("pw")
+    assert busy.value.retry_after >= 1
+    assert passwords.stats["shed"] == shed + 1
+
+
+def test_slow_hash_times_out(cheap_hashes, monkeypatch):
+    monkeypatch.setattr(passwords, "WAIT_SECONDS", 0.05)
+    gate = threading.Event()
+    timeouts = passwords.stats["timeouts"]
+    try:
+        with pytest.raises(passwords.Overloaded):
+            passwords._run(gate.wait, 5)
+    finally:
+        gate.set()
+    assert passwords.stats["timeouts"] == timeouts + 1
+
+
+def _account(app, password_hash):
+    with app.app_context():
+        user = User(email=f"pw-{uuid.uuid4().hex[:12]}@test-school.org", password_hash=password_hash)
+        db.session.add(user)
+        db.session.commit()
+        return user.id, user.email
+
+
+def _stored(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+
+def test_login_upgrades_an_old_hash(app, cheap_hashes):
+    old = generate_password_hash("s3cret-pass", "pbkdf2:sha256:500")
+    user_id, email = _account(app, old)
+    client = app.test_client()
+
+    r = client.post("/login", data={"email": email, "password": "wrong-pass"})
+    assert r.status_code == 200 and _stored(app, user_id) == old
+
+    rehashed = passwords.stats["rehashed"]
+    r = client.post("/login", data={"email": email, "password": "s3cret-pass"})
+    assert r.status_code == 302
+    assert _stored(app, user_id).startswith("pbkdf2:sha256:1000$")
+    assert passwords.stats["rehashed"] == rehashed + 1
+
+
+def test_login_answers_503_while_overloaded(app, cheap_hashes, tiny_pool):
+    user_id, email = _account(app, generate_password_hash("s3cret-pass", "pbkdf2:sha256:500"))
+    tiny_pool()
+    r = app.test_client().post("/login", data={"email": email, "password": "s3cret-pass"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "2"
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+from models import db, ClassProfile
+
+
+def _save(client, class_name, rows=()):
+    r = client.post("/class_profile/save",
+                    json={"class": class_name, "subject": "Art", "rows": list(rows)})
+    assert r.status_code in (200, 201)
+    return r.get_json()["id"]
+
+
+def _walk(client, limit):
+    ids, url, pages = [], f"/class_profiles?limit={limit}", 0
+    while url:
+        r = client.get(url)
+        assert r.status_code == 200
+        ids += [p["id"] for p in r.get_json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        url = f"/class_profiles?limit={limit}&cursor={cursor}" if cursor else None
+        pages += 1
+    return ids, pages
+
+
+def test_cursor_walks_every_profile_once_newest_first(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    ids = [_save(client, f"Set {n}") for n in range(5)]
+    # Two profiles created in the same instant are ordered by id
+    with app.app_context():
+        db.session.execute(update(ClassProfile).where(ClassProfile.id.in_(ids[1:3]))
+                           .values(created_at=datetime(2030, 1, 1)))
+        db.session.commit()
+
+    expected = [ids[2], ids[1], ids[4], ids[3], ids[0]]
+    assert _walk(client, 2) == (expected, 3)
+    assert _walk(client, 5) == (expected, 1)
+    assert "rel=\"next\"" in client.get("/class_profiles?limit=1").headers["Link"]
+
+
+def test_list_is_scoped_and_rejects_bad_cursors(make_user, login):
+    mine = login(make_user())
+    _save(login(make_user()), "Not mine")
+    own = _save(mine, "Mine")
+    assert [p["id"] for p in mine.get("/class_profiles").get_json()] == [own]
+    assert mine.get("/class_profiles?cursor=not-a-cursor").status_code == 400
+
+
+def test_etag_revalidation_returns_304_until_the_profile_changes(make_user, login):
+    client = login(make_user())
+    cp_id = _save(client, "Etag", [{"name": "Ana"}])
+    url = f"/class_profile/{cp_id}/full"
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.get_json()["rows"][0]["name"] == "Ana"
+    assert client.get(f"/class_profile/{cp_id}").headers["ETag"] != etag
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+
+    _save(client, "Etag", [{"name": "Ana"}, {"name": "Ben"}])
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.get_json()["rows"]) == 2
+
+
+def test_if_modified_since(make_user, login):
+    client = login(make_user())
+    cp_id = _save(client, "Since")
+    url = f"/class_profile/{cp_id}"
+    last_modified = client.get(url).headers["Last-Modified"]
+
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(url, headers={
+        "If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    # A non-matching If-None-Match overrides a fresh If-Modified-Since
+    assert client.get(url, headers={"If-Modified-Since": last_modified,
+                                    "If-None-Match": '"stale"'}).status_code == 200
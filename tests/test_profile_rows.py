@@ -0,0 +1,55 @@
+from models import db, ClassRow
+
+
+def _save(client, rows, **extra):
+    r = client.post("/class_profile/save",
+                    json=dict({"class": "9C", "subject": "History", "rows": rows}, **extra))
+    assert r.status_code in (200, 201)
+    return r.get_json()
+
+
+def test_resave_keeps_row_ids(make_user, login):
+    client = login(make_user())
+    first = _save(client, [{"name": "Ana"}, {"name": "Ben"}, {"name": "Cara"}])
+    ana, ben, cara = first["row_ids"]
+
+    # Reordered and edited rows keep their ids; a new row gets a fresh one
+    second = _save(client, [{"id": cara, "name": "Cara"},
+                            {"id": ana, "name": "Ana"},
+                            {"id": ben, "name": "Ben", "comments": "Much improved"},
+                            {"name": "Dan"}])
+    assert second["row_ids"][:3] == [cara, ana, ben]
+    assert second["row_ids"][3] not in first["row_ids"]
+
+    rows = client.get(f"/class_profile/{first['id']}/full").get_json()["rows"]
+    assert [(r["id"], r["name"]) for r in rows] == list(zip(second["row_ids"],
+                                                            ["Cara", "Ana", "Ben", "Dan"]))
+    assert rows[2]["comments"] == "Much improved"
+
+
+def test_rows_without_ids_match_by_position(make_user, login):
+    client = login(make_user())
+    first = _save(client, [{"name": "Ana"}, {"name": "Ben"}])
+    second = _save(client, [{"name": "Ana"}, {"name": "Benjamin"}, {"name": "Cara"}])
+    assert second["row_ids"][:2] == first["row_ids"]
+
+
+def test_removed_rows_are_deleted(app, make_user, login):
+    client = login(make_user())
+    first = _save(client, [{"name": "Ana"}, {"name": "Ben"}, {"name": "Cara"}])
+    ana, ben, cara = first["row_ids"]
+    second = _save(client, [{"id": cara, "name": "Cara"}, {"id": ana, "name": "Ana"}])
+    assert second["row_ids"] == [cara, ana]
+    with app.app_context():
+        assert db.session.get(ClassRow, ben) is None
+        assert ClassRow.query.filter_by(profile_id=first["id"]).count() == 2
+
+
+def test_unchanged_save_keeps_reports(make_user, login):
+    client = login(make_user())
+    first = _save(client, [{"name": "Ana", "report": "Ana works hard."}])
+    rows = client.get(f"/class_profile/{first['id']}/full").get_json()["rows"]
+    second = _save(client, rows)
+    assert second["row_ids"] == first["row_ids"]
+    rows = client.get(f"/class_profile/{first['id']}/full").get_json()["rows"]
+    assert rows[0]["report"] == "Ana works hard."
@@ -0,0 +1,46 @@
+import pytest
+
+from models import db, ClassProfile
+
+
+def _count(app, user_id):
+    with app.app_context():
+        return ClassProfile.query.filter_by(user_id=user_id).count()
+
+
+@pytest.mark.parametrize("body", [
+    {"class": "7A", "subject": "Maths", "max_words": "abc", "rows": []},
+    {"class": "7A", "subject": "Maths", "max_words": [50], "rows": []},
+    {"class": "7A", "subject": "Maths", "rows": ["Ana"]},
+    {"class": "7A", "subject": "Maths", "rows": [{"name": "Ana"}, 5]},
+    {"class": "7A", "subject": "Maths", "rows": {"name": "Ana"}},
+    {"class": "", "subject": "Maths", "rows": []},
+    ["7A", "Maths"],
+])
+def test_save_rejects_malformed_bodies(app, make_user, login, body):
+    user_id = make_user()
+    assert login(user_id).post("/class_profile/save", json=body).status_code == 400
+    assert _count(app, user_id) == 0
+
+
+def test_save_accepts_numeric_strings(make_user, login):
+    r = login(make_user()).post("/class_profile/save",
+                                json={"class": "7A", "subject": "Maths", "max_words": "80",
+                                      "rows": [{"name": "Ana"}]})
+    assert r.status_code == 201 and r.get_json()["max_words"] == 80
+
+
+@pytest.mark.parametrize("body", [
+    {"version": 1, "max_words": "abc", "ops": []},
+    {"version": 1, "ops": [{"op": "add", "row": "Ana"}]},
+    {"version": 1, "ops": [{"op": "update", "id": "x", "fields": {}}]},
+    {"version": 1, "ops": ["delete"]},
+    {"ops": []},
+])
+def test_patch_rejects_bad_ops_without_bumping_version(app, make_user, login, body):
+    client = login(make_user())
+    cp = client.post("/class_profile/save", json={"class": "7B", "subject": "Art",
+                                                   "rows": [{"name": "Ana"}]}).get_json()
+    assert client.patch(f"/class_profile/{cp['id']}/rows", json=body).status_code == 400
+    with app.app_context():
+        assert db.session.get(ClassProfile, cp["id"]).version == cp["version"]
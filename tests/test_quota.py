@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+import quota
+from models import db, User
+
+
+def _reserve_concurrently(app, user_id, n_callers):
+    """Fire `n_callers` single reservations at once; returns how many succeeded."""
+    start = threading.Barrier(n_callers)
+    results = []
+    lock = threading.Lock()
+
+    def call():
+        with app.app_context():
+            start.wait()
+            try:
+                quota.reserve(user_id)
+                ok = True
+            except quota.QuotaExceeded:
+                ok = False
+            finally:
+                db.session.remove()
+        with lock:
+            results.append(ok)
+
+    threads = [threading.Thread(target=call) for _ in range(n_callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert len(results) == n_callers
+    return sum(results)
+
+
+@pytest.mark.parametrize("n_callers, limit", [(20, 7), (12, 12), (5, 10), (16, 1)])
+def test_concurrent_reserve_never_passes_limit(app, make_user, n_callers, limit):
+    user_id = make_user(plan="free", reports_limit=limit)
+
+    granted = _reserve_concurrently(app, user_id, n_callers)
+
+    with app.app_context():
+        used = db.session.get(User, user_id).reports_used
+    assert granted == min(n_callers, limit)
+    assert used == granted
+    assert used <= limit
+
+
+def test_concurrent_reserve_unlimited(app, make_user):
+    user_id = make_user(plan="school", reports_limit=None)
+
+    assert _reserve_concurrently(app, user_id, 10) == 10
+    with app.app_context():
+        assert db.session.get(User, user_id).reports_used == 10
+
+
+def test_exceeded_reports_remaining(app, make_user):
+    user_id = make_user(reports_limit=5, reports_used=3)
+    with app.app_context():
+        with pytest.raises(quota.QuotaExceeded) as e:
+            quota.reserve(user_id, 4)
+        assert (e.value.requested, e.value.remaining) == (4, 2)
+        assert quota.reserve(user_id, 2) == 5
+        quota.refund(user_id, 9)
+        assert quota.remaining(user_id) == 5
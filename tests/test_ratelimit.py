@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import delete, select
+
+import ratelimit
+from models import db, User, RateBucket
+
+
+@pytest.fixture
+def limiter(app, monkeypatch):
+    """Limiter on with empty buckets: globals of 10 calls, users of 1 call per weight."""
+    monkeypatch.setattr(ratelimit, "RPM", 60.0)
+    monkeypatch.setattr(ratelimit, "TPM", 1e9)
+    monkeypatch.setattr(ratelimit, "USER_RPM", 6.0)
+    monkeypatch.setattr(ratelimit, "USER_TPM", 1e9)
+    monkeypatch.setattr(ratelimit, "BURST_SECONDS", 10.0)
+    monkeypatch.setattr(ratelimit, "PAID_RESERVE", 0.3)
+    monkeypatch.setattr(ratelimit, "PLAN_WEIGHTS", {"free": 1.0, "school": 8.0})
+    with app.app_context():
+        db.session.execute(delete(RateBucket))
+        db.session.commit()
+    return ratelimit
+
+
+def _tokens(app, key):
+    with app.app_context():
+        return db.session.execute(select(RateBucket.tokens).where(RateBucket.key == key)).scalar()
+
+
+def test_user_bucket_denies_with_retry_after(limiter):
+    with ratelimit.tenant(101, "free", max_wait=0):
+        ratelimit.acquire(10)
+        with pytest.raises(ratelimit.RateLimited) as denied:
+            ratelimit.acquire(10)
+    # One call per 10s refills in ~10s
+    assert 9 <= denied.value.retry_after <= 11
+    assert f"{denied.value.retry_after}s" in str(denied.value)
+
+    # Another tenant has its own bucket
+    with ratelimit.tenant(102, "free", max_wait=0):
+        ratelimit.acquire(10)
+
+
+def test_short_waits_sleep_instead_of_failing(limiter, monkeypatch):
+    slept = []
+    monkeypatch.setattr(ratelimit.time, "sleep", slept.append)
+    waits = iter([0.5, None])
+    monkeypatch.setattr(ratelimit, "_try_all", lambda specs: next(waits))
+    with ratelimit.tenant(103, "free", max_wait=5):
+        ratelimit.acquire(10)
+    assert len(slept) == 1 and 0.5 <= slept[0] < 0.6
+
+
+def test_free_plans_leave_the_paid_reserve(limiter):
+    granted = 0
+    for user_id in range(200, 215):
+        with ratelimit.tenant(user_id, "free", max_wait=0):
+            try:
+                ratelimit.acquire(10)
+                granted += 1
+            except ratelimit.RateLimited:
+                pass
+    assert granted == 7                   # 10 global calls less the 30% reserve
+    with ratelimit.tenant(300, "school", max_wait=0):
+        ratelimit.acquire(10)
+
+
+def test_settle_charges_the_real_usage(app, limiter, monkeypatch):
+    monkeypatch.setattr(ratelimit, "USER_TPM", 6000.0)   # bucket of 1000 tokens
+    with ratelimit.tenant(400, "free"):
+        ratelimit.acquire(100)
+        assert _tokens(app, "user:400:tpm") == pytest.approx(900, abs=1)
+        ratelimit.settle(100, (200, 150))
+    assert _tokens(app, "user:400:tpm") == pytest.approx(650, abs=1)
+
+
+def test_endpoint_answers_429_with_retry_after(app, make_user, login, llm, limiter, monkeypatch):
+    monkeypatch.setattr(ratelimit, "MAX_WAIT", 0)
+    user_id = make_user(reports_limit=10)
+    client = login(user_id)
+
+    ok = client.post("/generate_report", json={"name": "Ana Silva", "comments": "limit one"})
+    assert ok.status_code == 200
+    r = client.post("/generate_report", json={"name": "Ben Cole", "comments": "limit two"})
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert "try again" in r.get_json()["error"]
+    with app.app_context():
+        assert db.session.get(User, user_id).reports_used == 1
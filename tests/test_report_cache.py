@@ -0,0 +1,45 @@
+import pytest
+
+import report_cache
+from generation import cache_key, generate_many
+import llm_client
+
+ROW = {"name": "Olivia Brown", "tests": "Good", "homework": "Ok", "comments": "Keen reader"}
+
+
+@pytest.mark.parametrize("name", ["Will", "Grace Lee", "may", "Jo", "An Nguyen"])
+def test_word_names_are_never_swapped(name):
+    report = f"{name.split()[0]} has worked hard. Will she keep it up? We hope she may."
+    assert not report_cache.swappable(name)
+    assert report_cache.neutralize(report, name) == report
+
+
+def test_ordinary_names_round_trip():
+    neutral = report_cache.neutralize("Olivia Brown reads widely. Olivia is keen.", "Olivia Brown")
+    assert neutral == f"{report_cache.STUDENT} reads widely. {report_cache.FIRST_NAME} is keen."
+    assert report_cache.personalize(neutral, "Noah Green") == "Noah Green reads widely. Noah is keen."
+
+
+def test_keys_are_scoped_per_account():
+    assert cache_key(ROW, user_id=1) != cache_key(ROW, user_id=2)
+    assert cache_key(ROW, user_id=1) == cache_key(dict(ROW, name="Noah Green"), user_id=1)
+
+
+def test_word_names_only_share_with_the_same_name():
+    will = dict(ROW, name="Will Jones")
+    assert cache_key(will, user_id=1) != cache_key(ROW, user_id=1)
+    assert cache_key(will, user_id=1) != cache_key(dict(ROW, name="Grace"), user_id=1)
+    assert cache_key(will, user_id=1) == cache_key(dict(will), user_id=1)
+
+
+def test_generated_reports_are_not_served_to_other_accounts(app, fake_openai):
+    client = llm_client.build_client("fake", f"http://127.0.0.1:{fake_openai.server_port}/v1")
+    fake_openai.error_rate = 0.0
+    row = dict(ROW, comments="Scoped per account")
+    with app.app_context():
+        report_cache.clear_memory()
+        [(_, _, _, cached_first)] = generate_many(client, [row], {}, pack=1, user_id=101)
+        [(_, _, _, cached_same)] = generate_many(client, [dict(row, name="Noah Green")], {},
+                                                  pack=1, user_id=101)
+        [(_, _, _, cached_other)] = generate_many(client, [row], {}, pack=1, user_id=102)
+    assert (cached_first, cached_same, cached_other) == (False, True, False)
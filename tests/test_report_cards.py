@@ -0,0 +1,59 @@
+import io
+import zipfile
+
+import pytest
+
+ROWS = [{"name": "Ana Silva", "tests": "Good", "report": "Ana works hard."},
+        {"name": "Ben Cole", "tests": "Ok", "report": "Ben is improving."},
+        {"name": "", "report": "no name, no card"}]
+
+
+@pytest.fixture
+def school(make_user, login):
+    client = login(make_user(plan="school"))
+    r = client.post("/class_profile/save", json={"class": "7A", "subject": "English", "rows": ROWS})
+    return client, r.get_json()["id"]
+
+
+def _members(response):
+    assert response.status_code == 200 and response.mimetype == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        return [(info.filename, zf.read(info)) for info in zf.infolist()]
+
+
+def test_pdf_cards_one_per_named_student_in_order(school):
+    client, cp_id = school
+    members = _members(client.get(f"/class_profile/{cp_id}/report_cards.zip"))
+    assert len(members) == 2
+    assert "Ana" in members[0][0] and "Ben" in members[1][0]
+    assert all(name.endswith(".pdf") and data.startswith(b"%PDF") for name, data in members)
+
+
+def test_docx_cards_use_the_template(school):
+    client, cp_id = school
+    r = client.post(f"/class_profile/{cp_id}/report_cards.zip?format=docx",
+                    json={"template": "# $name\n$subject report: $report"})
+    members = _members(r)
+    assert [name.endswith(".docx") for name, _ in members] == [True, True]
+    with zipfile.ZipFile(io.BytesIO(members[1][1])) as doc:
+        xml = doc.read("word/document.xml").decode()
+    assert "Ben Cole" in xml and "English report: Ben is improving." in xml
+
+
+@pytest.mark.parametrize("body, query", [
+    ({"template": 5}, ""),
+    ({"template": ["# $name"]}, ""),
+    ({"template": "# $bogus"}, ""),
+    ({"template": "x" * 5000}, ""),
+    ({"format": 5}, ""),
+    ({}, "?format=rtf"),
+])
+def test_bad_requests_are_400(school, body, query):
+    client, cp_id = school
+    assert client.post(f"/class_profile/{cp_id}/report_cards.zip{query}", json=body).status_code == 400
+
+
+def test_school_plan_and_owner_only(school, make_user, login):
+    _, cp_id = school
+    assert login(make_user(plan="teacher")).get(f"/class_profile/{cp_id}/report_cards.zip").status_code == 403
+    assert login(make_user(plan="school")).get(f"/class_profile/{cp_id}/report_cards.zip").status_code == 404
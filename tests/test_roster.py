@@ -0,0 +1,121 @@
+import io
+
+import pytest
+
+import exports
+import roster
+
+
+DEFAULTS = {"class_name": "7A", "subject": "Maths"}
+
+
+@pytest.mark.parametrize("given, expected", [
+    ("good", "Good"), (" GREAT ", "Great"), ("3", "Good"), ("1", "Low"),
+    ("Excellent.", "Great"), ("okay", "Ok"), ("", ""),
+])
+def test_ratings_are_normalized(given, expected):
+    row, error = roster.normalize({"name": "Ana", "tests": given}, DEFAULTS)
+    assert error is None and row["tests"] == expected
+
+
+def test_normalize_trims_and_uses_defaults():
+    row, error = roster.normalize({"name": "  Ana Silva ", "subject": "Science", "comments": "  "},
+                                  DEFAULTS)
+    assert error is None
+    assert row == {"name": "Ana Silva", "class_name": "7A", "subject": "Science",
+                   "tests": "", "homework": "", "organisation": "", "participation": ""}
+
+
+@pytest.mark.parametrize("raw, defaults, error", [
+    ({"name": " "}, DEFAULTS, "Missing student name"),
+    ({"name": "Ana"}, {"subject": "Maths"}, "Missing class name"),
+    ({"name": "Ana", "class_name": "7A"}, {}, "Missing subject"),
+    ({"name": "Ana", "class_name": "x" * 121}, DEFAULTS, "Class name is longer than 120 characters"),
+    ({"name": "Ana", "homework": "meh"}, DEFAULTS, "homework: 'meh' is not one of Low, Ok, Good, Great"),
+])
+def test_normalize_reports_line_errors(raw, defaults, error):
+    assert roster.normalize(raw, defaults) == (None, error)
+
+
+def test_headers_match_loosely():
+    fields, ignored = roster.header_fields(
+        ["Student Name", "Class tests", "Organization", "Notes", "Name", "Favourite colour", ""])
+    assert fields == {0: "name", 1: "tests", 2: "organisation", 3: "comments"}
+    assert ignored == ["Name", "Favourite colour"]
+    with pytest.raises(roster.RosterError):
+        roster.header_fields(["Pupil id", "Tests"])
+
+
+def test_csv_rows_keep_their_line_numbers():
+    data = "﻿Name;Tests;Extra\n\nAna;good;x\n;;\nBen;4\n".encode("utf-8")
+    ignored, records = roster.read(io.BytesIO(data), "Class.CSV")
+    assert ignored == ["Extra"]
+    assert list(records) == [(3, {"name": "Ana", "tests": "good"}),
+                             (5, {"name": "Ben", "tests": "4"})]
+
+
+def test_exported_workbook_imports_as_is():
+    rows = [{"name": "Ana", "tests": "Good", "report": "Ana shines."},
+            {"name": "Ben", "tests": "Low", "report": ""}]
+    data = b"".join(exports.xlsx_chunks(rows, exports.FULL_COLUMNS))
+    ignored, records = roster.read(io.BytesIO(data), "class.xlsx")
+    assert ignored == []
+    records = list(records)
+    assert [r["name"] for _, r in records] == ["Ana", "Ben"]
+    assert records[0][1]["report"] == "Ana shines."
+
+
+@pytest.mark.parametrize("data, filename", [
+    (b"Name\nAna\n", "class.txt"),
+    (b"", "class.csv"),
+    (b"not a zip", "class.xlsx"),
+    ("Name\nAn\xe9\n".encode("latin-1"), "class.csv"),
+])
+def test_unreadable_files_are_rejected(data, filename):
+    with pytest.raises(roster.RosterError):
+        _, records = roster.read(io.BytesIO(data), filename)
+        list(records)
+
+
+def _upload(client, text, **form):
+    form["file"] = (io.BytesIO(text.encode("utf-8")), "roster.csv")
+    return client.post("/class_profiles/import", data=form, content_type="multipart/form-data")
+
+
+def test_import_skips_bad_lines_and_reports_them(make_user, login):
+    client = login(make_user())
+    r = _upload(client, "Name,Class,Tests\nAna,7A,good\n,7A,ok\nBen,7B,meh\nCara,7A,4\n",
+                subject="History")
+    body = r.get_json()
+    assert r.status_code == 200
+    assert (body["imported"], body["skipped"], body["errors_truncated"]) == (2, 2, False)
+    assert body["errors"] == [
+        {"line": 3, "name": "", "error": "Missing student name"},
+        {"line": 4, "name": "Ben", "error": "tests: 'meh' is not one of Low, Ok, Good, Great"},
+    ]
+    (cls,) = body["classes"]
+    assert (cls["class_name"], cls["subject"], cls["rows"]) == ("7A", "History", 2)
+
+    rows = client.get(f"/class_profile/{cls['id']}/full").get_json()["rows"]
+    assert [(r["name"], r["tests"]) for r in rows] == [("Ana", "Good"), ("Cara", "Great")]
+
+
+def test_replace_and_append_modes(make_user, login):
+    client = login(make_user())
+    csv_text = "Name\nAna\nBen\n"
+    first = _upload(client, csv_text, **{"class": "8A", "subject": "Art"}).get_json()["classes"][0]
+    again = _upload(client, "Name\nCara\n", **{"class": "8A", "subject": "Art"})
+    assert again.get_json()["classes"][0]["id"] == first["id"]
+    more = _upload(client, csv_text, mode="append", **{"class": "8A", "subject": "Art"})
+    assert more.status_code == 200
+    rows = client.get(f"/class_profile/{first['id']}/full").get_json()["rows"]
+    assert [r["name"] for r in rows] == ["Cara", "Ana", "Ben"]
+
+
+def test_import_with_no_good_rows_saves_nothing(make_user, login):
+    client = login(make_user())
+    r = _upload(client, "Name,Class\nAna,\n", subject="Art")
+    assert r.status_code == 400
+    assert r.get_json()["errors"][0]["error"] == "Missing class name"
+    assert client.get("/class_profiles").get_json() == []
+    assert _upload(client, "Name\nAna\n", mode="merge").status_code == 400
@@ -0,0 +1,95 @@
+import pytest
+
+import user_cache
+from models import db, User
+
+
+@pytest.fixture
+def cache(app, monkeypatch):
+    monkeypatch.setattr(user_cache, "TTL", 60.0)
+    user_cache.clear()
+    with app.app_context():
+        yield user_cache
+    user_cache.clear()
+
+
+def _set_plan(user_id, plan):
+    db.session.get(User, user_id).plan = plan
+    db.session.commit()
+
+
+def test_second_load_is_a_hit(cache, make_user):
+    user_id = make_user(plan="teacher")
+    hits, misses = cache.stats["hits"], cache.stats["misses"]
+    assert cache.load(user_id).plan == "teacher"
+    db.session.remove()
+    user = cache.load(user_id)
+    assert (user.id, user.plan) == (user_id, "teacher")
+    assert (cache.stats["hits"], cache.stats["misses"]) == (hits + 1, misses + 1)
+    assert cache.load(10 ** 9) is None
+
+
+def test_committed_update_invalidates(cache, make_user):
+    user_id = make_user(plan="free")
+    cache.load(user_id)
+    invalidations = cache.stats["invalidations"]
+    _set_plan(user_id, "school")
+    assert cache.stats["invalidations"] == invalidations + 1
+    assert cache.load(user_id).plan == "school"
+
+
+def test_rolled_back_update_keeps_the_entry(cache, make_user):
+    user_id = make_user(plan="free")
+    cache.load(user_id)
+    invalidations = cache.stats["invalidations"]
+    db.session.get(User, user_id).plan = "school"
+    db.session.flush()
+    db.session.rollback()
+    assert cache.stats["invalidations"] == invalidations
+    assert cache.load(user_id).plan == "free"
+
+
+def test_deleted_user_is_dropped(cache, make_user):
+    user_id = make_user()
+    cache.load(user_id)
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+    assert cache.load(user_id) is None
+
+
+def test_other_attributes_come_from_the_row(cache, make_user):
+    user_id = make_user(reports_used=3)
+    cache.load(user_id)
+    db.session.remove()
+    user = cache.load(user_id)
+    loads = cache.stats["row_loads"]
+    assert user.reports_used == 3
+    assert user.password_hash == "!"
+    assert cache.stats["row_loads"] == loads + 1
+
+
+def test_expired_and_evicted_entries_reload(cache, make_user, monkeypatch):
+    first, second, third = make_user(), make_user(), make_user()
+    monkeypatch.setattr(user_cache, "MAX_ENTRIES", 2)
+    for user_id in (first, second, third):
+        cache.load(user_id)
+    assert first not in cache._entries and cache.snapshot()["entries"] == 2
+
+    cache.clear()
+    monkeypatch.setattr(user_cache, "TTL", -1.0)
+    misses = cache.stats["misses"]
+    cache.load(third)
+    cache.load(third)
+    assert cache.stats["misses"] == misses + 2
+
+
+def test_plan_change_applies_to_the_next_request(app, make_user, login):
+    # Requests need their own app context here, so no `cache` fixture
+    user_cache.clear()
+    user_id = make_user(plan="free")
+    client = login(user_id)
+    url = "/class_profile/999999/report_cards.zip"
+    assert client.get(url).status_code == 403
+    with app.app_context():
+        _set_plan(user_id, "school")
+    assert client.get(url).status_code == 404
@@ -0,0 +1,118 @@
+# user_cache.py
+# -----------------------------------------
+# Report Rocket – per-process identity cache for Flask-Login
+#
+# Every authenticated request used to start with SELECT … FROM users.
+# The loader now answers from a small TTL'd LRU of the fields routes
+# actually read (id, email, plan, reports_limit) and only hits the DB on
+# a miss, after USER_CACHE_TTL seconds, or when a route reaches for some
+# other attribute (AuthUser loads the real row lazily for that request).
+#
+# Entries are dropped as soon as a User row is updated or deleted through
+# the ORM in this process (plan/password/limit changes all go that way).
+# Other workers notice within the TTL; code that changes these columns
+# with a Core UPDATE must call invalidate() itself. reports_used is never
+# cached: quota.py reads and writes it atomically in the DB.
+# -----------------------------------------
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, User
+
+TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+MAX_ENTRIES = int(os.getenv("USER_CACHE_SIZE", "2048"))
+CLAIMS = ("id", "email", "plan", "reports_limit")
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # user_id -> (expires_at, claims)
+stats = {"hits": 0, "misses": 0, "invalidations": 0, "row_loads": 0}
+
+
+class AuthUser(UserMixin):
+    """Request-scoped view of a cached user; anything else comes from the row."""
+
+    def __init__(self, claims):
+        self.__dict__.update(claims)
+
+    def __getattr__(self, name):
+        # Only reached for attributes that aren't cached claims
+        if name.startswith("__"):
+            raise AttributeError(name)
+        row = self.__dict__.get("_row")
+        if row is None:
+            row = self.__dict__["_row"] = db.session.get(User, self.id)
+            with _lock:
+                stats["row_loads"] += 1
+        if row is None:
+            raise AttributeError(name)
+        return getattr(row, name)
+
+
+def load(user_id):
+    """Flask-Login user_loader: AuthUser for `user_id`, or None."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(user_id)
+            stats["hits"] += 1
+            return AuthUser(entry[1])
+        stats["misses"] += 1
+
+    row = db.session.get(User, user_id)
+    if row is None:
+        return None
+    claims = {k: getattr(row, k) for k in CLAIMS}
+    with _lock:
+        _entries[user_id] = (now + TTL, claims)
+        _entries.move_to_end(user_id)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    user = AuthUser(claims)
+    user.__dict__["_row"] = row
+    return user
+
+
+def invalidate(user_id):
+    with _lock:
+        if _entries.pop(user_id, None) is not None:
+            stats["invalidations"] += 1
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def snapshot():
+    with _lock:
+        out = dict(stats, entries=len(_entries), ttl=TTL, max_entries=MAX_ENTRIES)
+    lookups = out["hits"] + out["misses"]
+    out["hit_ratio"] = round(out["hits"] / lookups, 3) if lookups else None
+    return out
+
+
+# =========================================
+# Invalidation on commit
+# =========================================
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_dirty(mapper, connection, target):
+    Session.object_session(target).info.setdefault("user_cache_dirty", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for user_id in session.info.pop("user_cache_dirty", ()):
+        invalidate(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back(session, previous_transaction):
+    session.info.pop("user_cache_dirty", None)
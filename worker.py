@@ -0,0 +1,80 @@
+# worker.py
+# -----------------------------------------
+# Report Rocket – background generation worker
+#
+#   python worker.py            (Render: a separate "worker" service)
+#
+# Claims queued GenerationTasks (see jobs.py) so long class-wide runs never
+# occupy gunicorn request threads. Any number of workers may run at once.
+# Every BULK_POLL_SECONDS it also advances open Batch API runs (bulk.py),
+# and each pass delivers due messages from the email outbox (mailer.py).
+# -----------------------------------------
+import logging
+import os
+import signal
+import time
+
+from app import create_app
+from models import db
+import jobs
+import bulk
+import llm_client
+import mailer
+
+log = logging.getLogger("worker")
+
+POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1.0"))
+BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "8"))
+REQUEUE_EVERY = float(os.getenv("WORKER_REQUEUE_SECONDS", "60"))
+BULK_POLL_EVERY = float(os.getenv("BULK_POLL_SECONDS", "300"))
+
+_stopping = False
+
+
+def _stop(signum, frame):
+    global _stopping
+    _stopping = True
+    log.info("Worker received signal %s; finishing current batch", signum)
+
+
+def run():
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    app = create_app()
+    client = llm_client.get_client()
+    if not client:
+        raise SystemExit("Server missing OPENAI_API_KEY")
+
+    app.logger.info("Generation worker started (batch=%s)", BATCH_SIZE)
+    last_requeue = last_bulk = 0.0
+    with app.app_context():
+        while not _stopping:
+            # Email has its own guard so a SendGrid problem never stalls generation
+            try:
+                emailed = mailer.deliver_once()
+            except Exception:
+                app.logger.exception("Email delivery failed")
+                db.session.rollback()
+                emailed = 0
+            try:
+                if time.monotonic() - last_requeue >= REQUEUE_EVERY:
+                    jobs.requeue_stale()
+                    mailer.requeue_stale()
+                    last_requeue = time.monotonic()
+                if time.monotonic() - last_bulk >= BULK_POLL_EVERY:
+                    bulk.advance_open(client, app.logger)
+                    last_bulk = time.monotonic()
+                handled = jobs.work_once(client, BATCH_SIZE)
+            except Exception:
+                app.logger.exception("Worker batch failed")
+                db.session.rollback()
+                handled = 0
+            finally:
+                # Don't hold a connection / stale identity map between polls
+                db.session.remove()
+            if not (handled or emailed):
+                time.sleep(POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    run()